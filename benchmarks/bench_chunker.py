@@ -0,0 +1,128 @@
+"""Pages/sec of the token-sized chunker, with checks on the chunks it makes
+
+Pages are label-like text from benchmarks/fixtures.py with a dosing table,
+some tables longer than chunk_size, cleaned by AdvancedPDFParser.clean_text
+as the parser would. Every chunk is re-counted with the tokenizer to check
+it fits the limit, and every table piece must start with the table's
+header row and hold whole rows only. Exits with status 1 if a check fails.
+    
+    python benchmarks/bench_chunker.py --pages 200
+    python benchmarks/bench_chunker.py --simple-tokenizer   # no model download
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fixtures
+from chunker import Chunker
+from config import add_config_arguments, get_config
+from pdf_parser import AdvancedPDFParser
+
+# Roughly WordPiece-sized pieces, for runs without the embedding model
+SIMPLE_TOKEN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def simple_count_tokens(texts):
+    return [len(SIMPLE_TOKEN.findall(text)) for text in texts]
+
+
+def table_text(rows):
+    return "\n[TABLE]\n" + "\n".join(" | ".join(row) for row in rows) + "\n[/TABLE]\n"
+
+
+def synthetic_pages(count, seed=0):
+    """Raw page text: paragraphs, then a dosing table (every fifth one long)"""
+    rng = random.Random(seed)
+    pages = []
+    for page_num in range(count):
+        drug = fixtures.DRUGS[page_num % len(fixtures.DRUGS)]
+        text = "\n".join(fixtures.text_lines(rng, drug, 30))
+        rows = 80 if page_num % 5 == 0 else rng.randint(4, 12)
+        pages.append(text + table_text(fixtures.dose_table(rng, drug, rows)))
+    return pages
+
+
+def check_chunks(chunks, count_tokens, max_tokens, headers):
+    """Problems found in one page's chunks (empty if none)
+    
+    A short table at the end of a page can open the next page's chunk, so
+    table pieces are checked against every known header.
+    """
+    problems = []
+    for chunk, tokens in zip(chunks, count_tokens([chunk.text for chunk in chunks])):
+        if tokens > max_tokens:
+            problems.append(f"{tokens} tokens > {max_tokens}: {chunk.text[:60]!r}")
+    
+    for chunk in chunks:
+        for block in re.findall(r"\[TABLE\](.*?)\[/TABLE\]", chunk.text, re.S):
+            rows = block.strip().split("\n")
+            cells = rows[0].count("|") + 1
+            if rows[0] not in headers:
+                problems.append(f"table piece without its header: {rows[0]!r}")
+            problems.extend(f"broken row: {row!r}" for row in rows if row.count("|") + 1 != cells)
+    return problems
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--pages", type=int, default=200, help="Pages in the corpus")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs (best is kept)")
+    arg_parser.add_argument("--simple-tokenizer", action="store_true",
+                            help="Count tokens with a regex instead of the embedding model")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    settings = get_config(args.profile, args.overrides)
+    config = settings['embedding']
+    if args.simple_tokenizer:
+        count_tokens, max_tokens = simple_count_tokens, config.get('chunk_size', 256)
+    else:
+        from embeddings import create_embedder
+        embedder = create_embedder(config)
+        count_tokens = embedder.count_tokens
+        max_tokens = min(config.get('chunk_size', 256), embedder.max_tokens)
+    chunker = Chunker(count_tokens, max_tokens=max_tokens,
+                      overlap_tokens=config.get('chunk_overlap', 32),
+                      min_tokens=config.get('chunk_min_tokens', 64),
+                      stitch_pages=config.get('stitch_pages', True))
+    
+    parser = AdvancedPDFParser(config=settings['parser'])
+    pages = [parser.clean_text(text) for text in synthetic_pages(args.pages)]
+    print(f"Corpus: {len(pages)} pages, chunks of at most {max_tokens} tokens")
+    
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        carry, carry_page, results = (), None, []
+        for page_num, text in enumerate(pages, 1):
+            chunks, carry_next = chunker.chunk_page(chunker.units(text), page_num, carry, carry_page,
+                                                    last_page=page_num == len(pages))
+            results.append(chunks)
+            carry, carry_page = carry_next, page_num
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    
+    n_chunks = sum(len(chunks) for chunks in results)
+    print(f"{len(pages) / best:.0f} pages/s, {n_chunks / best:.0f} chunks/s "
+          f"({n_chunks} chunks, {n_chunks / len(pages):.1f} per page)")
+    
+    # Every fixture table has the same header row
+    headers = {" | ".join(fixtures.dose_table(random.Random(0), "", 0)[0])}
+    problems = []
+    for chunks in results:
+        problems.extend(check_chunks(chunks, count_tokens, max_tokens, headers))
+    for problem in problems[:20]:
+        print(f"  ✗ {problem}")
+    print(f"{len(problems)} problem(s)")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
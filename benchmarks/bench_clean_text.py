@@ -0,0 +1,154 @@
+"""Pages/sec of AdvancedPDFParser.clean_text against the previous implementation
+
+The corpus is the page text of the parsed documents in the JSON folder, or
+with --synthetic (or no parsed documents) generated label-like pages with
+doses, NDC codes, tables and typical OCR noise. Also counts the dose
+strings ("10 mg", "0.5 mg/kg") that survive cleaning; the previous
+implementation turned every 0 into O. Also checks clean_text against a
+few expected outputs (artifact runs must not join the words around them).
+    
+    python benchmarks/bench_clean_text.py --repeat 5
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import page_store
+from config import add_config_arguments, get_config
+from pdf_parser import AdvancedPDFParser
+
+SENTENCES = [
+    "The recommended dose is 10 mg once daily, up to 40 mg in adults.",
+    "Reduce the dose to 0.5 mg/kg in patients with CrCl below 30 mL/min.",
+    "NDC 0002-3227-30: bottles of 30 tablets.",
+    "Store at 20 to 25 C (68 to 77 F); excursions permitted.",
+    "Adverse reactions (>= 10%): nausea, headache, dizziness.",
+    "C0VID-19 vaccines may be given at the same visit |n most cases.",
+    "Do not exceed 100 mcg per day. ___________ Page 12",
+    "|| ----- ~ Contraindications: known hypersensitivity to the d0se form.",
+]
+TABLE = "\n[TABLE]\nDose | Frequency | Route\n10 mg | q12h | PO\n0.25 mg | q24h | IV\n[/TABLE]\n"
+
+
+def legacy_clean_text(text):
+    """clean_text before the single-pass rewrite"""
+    if not text:
+        return ""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[|]{2,}', '', text)
+    text = re.sub(r'_{3,}', '', text)
+    text = re.sub(r'-{3,}', '', text)
+    text = text.replace('|', 'I')
+    text = text.replace('0', 'O')
+    text = re.sub(r'\s+[^a-zA-Z0-9\s]+\s+', ' ', text)
+    text = re.sub(r'\bPage\s+\d+\b', '', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+def synthetic_pages(count, seed=0):
+    rng = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        lines = [rng.choice(SENTENCES) for _ in range(rng.randint(30, 60))]
+        if rng.random() < 0.3:
+            lines.append(TABLE)
+        pages.append("\n".join(lines))
+    return pages
+
+
+def load_pages(json_folder, limit):
+    pages = []
+    for path in page_store.list_documents(json_folder):
+        for page in page_store.iter_pages(path):
+            if page.get("text"):
+                pages.append(page["text"])
+            if len(pages) >= limit:
+                return pages
+    return pages
+
+
+# (input, expected output): artifact removal must never join the words around it
+CASES = [
+    ("x ---y", "x y"),
+    ("a |||b", "a b"),
+    ("x --- y", "x y"),
+    ("x ___ y", "x y"),
+    ("word--- end", "word end"),
+    ("||| start", "start"),
+    ("Take 10 mg. Page 12 Next", "Take 10 mg. Next"),
+    ("the d0se |n adults", "the dOse In adults"),
+]
+
+
+def check_cases(func):
+    """Cases where func differs from the expected output, as (input, expected, got)"""
+    return [(text, expected, func(text)) for text, expected in CASES if func(text) != expected]
+
+
+def measure(func, pages, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in pages:
+            func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return len(pages) / best
+
+
+DOSE_PATTERN = re.compile(r"\b\d+(?:\.\d+)? ?(?:mg|mcg|g|mL)\b")
+
+
+def dose_count(text):
+    return len(DOSE_PATTERN.findall(text))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--pages", type=int, default=2000, help="Pages in the corpus")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (best is kept)")
+    arg_parser.add_argument("--synthetic", action="store_true",
+                            help="Use generated pages even if parsed documents exist")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    settings = get_config(args.profile, args.overrides)
+    parser = AdvancedPDFParser(config=settings['parser'])
+    
+    pages = [] if args.synthetic else load_pages(settings['paths']['json_folder'], args.pages)
+    source = settings['paths']['json_folder']
+    if not pages:
+        pages = synthetic_pages(args.pages)
+        source = "synthetic"
+    chars = sum(len(text) for text in pages)
+    print(f"Corpus: {len(pages)} pages, {chars / len(pages):.0f} chars/page ({source})")
+    
+    rows = [
+        ("before", legacy_clean_text),
+        ("after", parser.clean_text),
+    ]
+    results = {name: measure(func, pages, args.repeat) for name, func in rows}
+    
+    print(f"\n{'version':<8} {'pages/s':>10} {'MB/s':>8}")
+    for name, pages_per_second in results.items():
+        mb_per_second = pages_per_second * chars / len(pages) / 1e6
+        print(f"{name:<8} {pages_per_second:>10.0f} {mb_per_second:>8.1f}")
+    print(f"\nSpeed-up: {results['after'] / results['before']:.2f}x")
+    
+    failures = check_cases(parser.clean_text)
+    for text, expected, got in failures:
+        print(f"  ✗ clean_text({text!r}) = {got!r}, expected {expected!r}")
+    print(f"Equivalence cases: {len(CASES) - len(failures)}/{len(CASES)} pass")
+    
+    doses = sum(dose_count(text) for text in pages)
+    kept = {name: sum(dose_count(func(text)) for text in pages) for name, func in rows}
+    print(f"Dose strings kept: before {kept['before']}/{doses}, after {kept['after']}/{doses}")
+
+
+if __name__ == "__main__":
+    main()
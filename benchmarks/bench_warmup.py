@@ -0,0 +1,96 @@
+"""First-request vs steady-state latency with and without model warm-up
+
+Runs ChatBot against benchmarks/stub_ollama.py configured to behave like a
+CPU-only Ollama host: a cold model load on the first request, and prompt
+evaluation time per token that is not covered by the cached prefix. Each mode
+gets a fresh stub (model not loaded) and asks the same distinct questions.
+
+Needs an existing index (run src/indexer.py first); the LLM is never called
+for questions with no retrieved context.
+    
+    python benchmarks/bench_warmup.py --load-time 3 --prompt-token-delay 0.002
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from chatbot import ChatBot
+from config import add_config_arguments, get_config
+from stub_ollama import start_in_thread
+
+DEFAULT_QUERIES = [
+    "What is the recommended dose?",
+    "What are the contraindications?",
+    "Which adverse reactions are most common?",
+    "How should the dose be adjusted in renal impairment?",
+    "What drug interactions are listed?",
+    "How should the medication be stored?",
+]
+
+
+def run_mode(name, warmup, queries, args):
+    server, url = start_in_thread(ttft=args.ttft, token_delay=args.token_delay,
+                                  tokens=args.tokens, load_time=args.load_time,
+                                  prompt_token_delay=args.prompt_token_delay)
+    try:
+        overrides = list(args.overrides or []) + [
+            f'ollama.base_url="{url}"',
+            f'ollama.warmup={"true" if warmup else "false"}',
+            'response_cache.enabled=false',
+        ]
+        settings = get_config(args.profile, overrides)
+        
+        started = time.perf_counter()
+        bot = ChatBot(settings=settings)
+        startup = time.perf_counter() - started
+        
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            bot.chat(query)
+            latencies.append(time.perf_counter() - started)
+        
+        return {
+            "mode": name,
+            "startup_s": startup,
+            "first_s": latencies[0],
+            "steady_p50_s": statistics.median(latencies[1:]) if len(latencies) > 1 else None,
+            "prefix_hits": server.prefix_hits
+        }
+    finally:
+        server.shutdown()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("queries", nargs="*", help="Questions to ask (default: a built-in set)")
+    arg_parser.add_argument("--load-time", type=float, default=3.0,
+                            help="Simulated cold model load in seconds")
+    arg_parser.add_argument("--prompt-token-delay", type=float, default=0.002,
+                            help="Simulated seconds per uncached prompt token")
+    arg_parser.add_argument("--ttft", type=float, default=0.05)
+    arg_parser.add_argument("--token-delay", type=float, default=0.005)
+    arg_parser.add_argument("--tokens", type=int, default=40)
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    queries = args.queries or DEFAULT_QUERIES
+    rows = [
+        run_mode("no warm-up", False, queries, args),
+        run_mode("warm-up", True, queries, args),
+    ]
+    
+    print(f"\n{'mode':<12} {'startup':>9} {'first':>9} {'steady p50':>11} {'prefix hits':>12}")
+    for row in rows:
+        steady = f"{row['steady_p50_s']:.3f}s" if row['steady_p50_s'] is not None else "-"
+        print(f"{row['mode']:<12} {row['startup_s']:>8.3f}s {row['first_s']:>8.3f}s "
+              f"{steady:>11} {row['prefix_hits']:>12}")
+
+
+if __name__ == "__main__":
+    main()
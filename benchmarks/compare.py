@@ -0,0 +1,95 @@
+"""Compare two run_benchmarks.py result files and flag regressions
+
+Throughput metrics (*_per_s) regress when they drop, latency metrics (*_ms,
+*_s) when they grow, by more than --threshold. Exits with status 1 if any
+metric regressed, so it can gate a CI job.
+    
+    python benchmarks/compare.py results/before.json results/after.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(results, prefix=""):
+    """{"parse": {"native": {"pages_per_s": 3}}} -> {"parse.native.pages_per_s": 3}"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def direction(name):
+    """+1 if higher is better, -1 if lower is better, 0 if informational"""
+    metric = name.rsplit(".", 1)[-1]
+    if metric.endswith("_per_s"):
+        return 1
+    if metric.endswith("_ms") or metric.endswith("_s"):
+        return -1
+    return 0
+
+
+def compare(base, new, threshold):
+    """Rows of (name, base, new, relative change, status)"""
+    base_flat = flatten(base["results"])
+    new_flat = flatten(new["results"])
+    rows = []
+    for name in sorted(set(base_flat) | set(new_flat)):
+        old_value, new_value = base_flat.get(name), new_flat.get(name)
+        if old_value is None or new_value is None:
+            rows.append((name, old_value, new_value, None, "missing"))
+            continue
+        change = (new_value - old_value) / old_value if old_value else None
+        sign = direction(name)
+        status = ""
+        if sign and change is not None:
+            if change * sign < -threshold:
+                status = "REGRESSION"
+            elif change * sign > threshold:
+                status = "improved"
+        rows.append((name, old_value, new_value, change, status))
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("base", help="Baseline results JSON")
+    arg_parser.add_argument("new", help="Results JSON to check")
+    arg_parser.add_argument("--threshold", type=float, default=0.10,
+                            help="Relative change that counts (default 0.10 = 10%%)")
+    arg_parser.add_argument("--all", action="store_true", help="Also list informational metrics")
+    args = arg_parser.parse_args()
+    
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    
+    print(f"base: {base.get('git_commit')} ({base.get('created')}, profile {base.get('profile')})")
+    print(f"new:  {new.get('git_commit')} ({new.get('created')}, profile {new.get('profile')})")
+    if base.get("fixtures") != new.get("fixtures"):
+        print("Warning: the runs used different fixtures, numbers are not comparable")
+    
+    rows = compare(base, new, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'metric':<{width}} {'base':>12} {'new':>12} {'change':>8}")
+    regressions = 0
+    for name, old_value, new_value, change, status in rows:
+        if not args.all and not direction(name) and status != "missing":
+            continue
+        old_text = f"{old_value:.3f}" if old_value is not None else "-"
+        new_text = f"{new_value:.3f}" if new_value is not None else "-"
+        change_text = f"{change:+.1%}" if change is not None else "-"
+        print(f"{name:<{width}} {old_text:>12} {new_text:>12} {change_text:>8}  {status}")
+        regressions += status == "REGRESSION"
+    
+    print(f"\n{regressions} regression(s) beyond {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
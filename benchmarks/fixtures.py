@@ -0,0 +1,253 @@
+"""Synthetic PDF fixtures for the benchmarks
+
+Three kinds of document, generated deterministically from a seed so runs
+can be compared:
+
+- native:  text pages, written with a minimal PDF writer (no PDF library)
+- tables:  native pages dominated by ruled and whitespace-aligned tables
+- scanned: the native pages rasterized with PIL and saved as image-only
+           PDFs, so all text has to come from OCR
+    
+    python benchmarks/fixtures.py data/bench_pdfs --pages 20
+"""
+import argparse
+import random
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+KINDS = ("native", "tables", "scanned")
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter in points
+MARGIN = 54
+FONT_SIZE = 10
+LEADING = 13
+
+DRUGS = ["metformin", "warfarin", "amoxicillin", "lisinopril", "atorvastatin",
+         "levothyroxine", "omeprazole", "gabapentin", "sertraline", "apixaban"]
+SECTIONS = ["INDICATIONS AND USAGE", "DOSAGE AND ADMINISTRATION", "CONTRAINDICATIONS",
+            "WARNINGS AND PRECAUTIONS", "ADVERSE REACTIONS", "DRUG INTERACTIONS",
+            "USE IN SPECIFIC POPULATIONS", "HOW SUPPLIED/STORAGE AND HANDLING"]
+SENTENCES = [
+    "The recommended starting dose of {drug} is {dose} mg {freq}.",
+    "Reduce the dose to {small} mg/kg in patients with CrCl below {crcl} mL/min.",
+    "Do not exceed {maxdose} mg per day in adults or {small} mg/kg in children.",
+    "Monitor renal function before initiating {drug} and at least annually thereafter.",
+    "Coadministration with strong CYP3A4 inhibitors increases {drug} exposure by {pct}%.",
+    "The most common adverse reactions (incidence >= {pct}%) were nausea, headache and dizziness.",
+    "{drug} is contraindicated in patients with known hypersensitivity to any component.",
+    "Store at 20 to 25 C (68 to 77 F); excursions permitted between 15 and 30 C.",
+    "Supplied as {dose} mg tablets in bottles of {count} (NDC {ndc}).",
+]
+FREQUENCIES = ["once daily", "twice daily", "every 8 hours", "every 12 hours", "at bedtime"]
+
+
+def _sentence(rng, drug):
+    return rng.choice(SENTENCES).format(
+        drug=drug, dose=rng.choice([5, 10, 20, 25, 50, 100, 250, 500]),
+        freq=rng.choice(FREQUENCIES), small=rng.choice([0.25, 0.5, 1, 2.5]),
+        crcl=rng.choice([15, 30, 45, 60]), maxdose=rng.choice([200, 400, 1000, 2000]),
+        pct=rng.choice([2, 5, 10, 25, 40]), count=rng.choice([30, 90, 100, 500]),
+        ndc=f"{rng.randint(0, 99999):05d}-{rng.randint(0, 999):03d}-{rng.randint(0, 99):02d}")
+
+
+def _wrap(text, width=95):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def text_lines(rng, drug, max_lines):
+    """Lines of label-like text for one page: section headings and paragraphs"""
+    lines = []
+    while len(lines) < max_lines:
+        lines.append(rng.choice(SECTIONS))
+        paragraph = " ".join(_sentence(rng, drug) for _ in range(rng.randint(3, 7)))
+        lines.extend(_wrap(paragraph))
+        lines.append("")
+    return lines[:max_lines]
+
+
+def dose_table(rng, drug, rows):
+    header = ["Population", "Dose", "Frequency", "Max daily dose"]
+    body = [[rng.choice(["Adults", "Elderly", "Children 6-12 y", "CrCl 30-60", "CrCl < 30",
+                         "Hepatic impairment"]),
+             f"{rng.choice([2.5, 5, 10, 20, 50])} mg",
+             rng.choice(FREQUENCIES),
+             f"{rng.choice([20, 40, 100, 200])} mg"] for _ in range(rows)]
+    return [header] + body
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class PDFBuilder:
+    """Just enough of the PDF format for text, lines and rectangles in Helvetica"""
+    
+    def __init__(self):
+        self.pages = []
+    
+    def add_page(self, operations):
+        self.pages.append("\n".join(operations).encode("latin-1", "replace"))
+    
+    @staticmethod
+    def text(x, y, text, size=FONT_SIZE):
+        return f"BT /F1 {size} Tf {x:.1f} {y:.1f} Td ({_escape(text)}) Tj ET"
+    
+    @staticmethod
+    def rect(x, y, width, height):
+        return f"{x:.1f} {y:.1f} {width:.1f} {height:.1f} re S"
+    
+    def save(self, path):
+        n = len(self.pages)
+        font_id = 3 + 2 * n
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(n))}] "
+            f"/Count {n} >>".encode(),
+        ]
+        for i, stream in enumerate(self.pages):
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+            objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+                       b"/Encoding /WinAnsiEncoding >>")
+        
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+        xref = len(out)
+        out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+        for offset in offsets:
+            out += f"{offset:010d} 00000 n \n".encode()
+        out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+                f"startxref\n{xref}\n%%EOF\n").encode()
+        Path(path).write_bytes(bytes(out))
+
+
+def native_page_lines(rng, page_num):
+    drug = DRUGS[page_num % len(DRUGS)]
+    max_lines = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+    return text_lines(rng, drug, max_lines)
+
+
+def write_native(path, pages, seed=0):
+    rng = random.Random(seed)
+    builder = PDFBuilder()
+    for page_num in range(pages):
+        y = PAGE_HEIGHT - MARGIN
+        operations = []
+        for line in native_page_lines(rng, page_num):
+            if line:
+                operations.append(builder.text(MARGIN, y, line))
+            y -= LEADING
+        builder.add_page(operations)
+    builder.save(path)
+
+
+def write_tables(path, pages, seed=0):
+    """Pages with one ruled (lattice) table and one whitespace-aligned (stream) table"""
+    rng = random.Random(seed)
+    builder = PDFBuilder()
+    col_width, row_height = 126, 18
+    for page_num in range(pages):
+        drug = DRUGS[page_num % len(DRUGS)]
+        operations = []
+        y = PAGE_HEIGHT - MARGIN
+        for line in text_lines(rng, drug, 4):
+            if line:
+                operations.append(builder.text(MARGIN, y, line))
+            y -= LEADING
+        
+        # Ruled table: every cell has a border
+        y -= row_height
+        for row in dose_table(rng, drug, rng.randint(8, 14)):
+            for col, cell in enumerate(row):
+                x = MARGIN + col * col_width
+                operations.append(builder.rect(x, y - 5, col_width, row_height))
+                operations.append(builder.text(x + 4, y, cell))
+            y -= row_height
+        
+        # Stream table: columns aligned by position only
+        y -= 2 * LEADING
+        operations.append(builder.text(MARGIN, y, f"Table 2. Adverse reactions with {drug}"))
+        y -= LEADING
+        for row in [["Reaction", "Placebo (%)", f"{drug} (%)", "Discontinued (%)"]] + [
+                [rng.choice(["Nausea", "Headache", "Dizziness", "Diarrhea", "Rash", "Fatigue"]),
+                 str(rng.randint(1, 10)), str(rng.randint(2, 30)), str(rng.randint(0, 5))]
+                for _ in range(rng.randint(6, 10))]:
+            if y < MARGIN:
+                break
+            for col, cell in enumerate(row):
+                operations.append(builder.text(MARGIN + col * col_width, y, cell))
+            y -= LEADING
+        builder.add_page(operations)
+    builder.save(path)
+
+
+def _font(size):
+    for name in ("DejaVuSans.ttf", "Arial.ttf", "LiberationSans-Regular.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def write_scanned(path, pages, seed=0, dpi=150):
+    """Rasterized text pages with a little noise and skew, as image-only PDF pages"""
+    rng = random.Random(seed)
+    noise = np.random.default_rng(seed)
+    scale = dpi / 72
+    font = _font(round(FONT_SIZE * scale))
+    images = []
+    for page_num in range(pages):
+        image = Image.new("L", (round(PAGE_WIDTH * scale), round(PAGE_HEIGHT * scale)), 255)
+        draw = ImageDraw.Draw(image)
+        y = MARGIN
+        for line in native_page_lines(rng, page_num):
+            if line:
+                draw.text((MARGIN * scale, y * scale), line, font=font, fill=0)
+            y += LEADING
+        image = image.rotate(rng.uniform(-0.7, 0.7), fillcolor=255)
+        pixels = np.asarray(image, dtype=np.float32) + noise.normal(0, 12, (image.height, image.width))
+        images.append(Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)))
+    images[0].save(path, save_all=True, append_images=images[1:], resolution=dpi)
+
+
+WRITERS = {"native": write_native, "tables": write_tables, "scanned": write_scanned}
+
+
+def generate(folder, pages=10, kinds=KINDS, seed=0):
+    """Write one fixture PDF per kind into folder; returns {kind: path}"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for kind in kinds:
+        paths[kind] = folder / f"bench_{kind}.pdf"
+        WRITERS[kind](paths[kind], pages, seed=seed)
+    return paths
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("folder", help="Where to write the PDFs")
+    arg_parser.add_argument("--pages", type=int, default=10, help="Pages per document")
+    arg_parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    
+    for kind, path in generate(args.folder, args.pages, args.kinds, args.seed).items():
+        print(f"{kind:<8} {path}")
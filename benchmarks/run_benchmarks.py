@@ -0,0 +1,238 @@
+"""Ingestion and query benchmarks on synthetic fixtures, with JSON results
+
+Generates native, table-heavy and scanned PDFs (benchmarks/fixtures.py) in
+a work directory, then measures:
+
+- parse: pages/sec of AdvancedPDFParser.extract_text_from_pdf per fixture kind
+- index: chunks/sec of EmbeddingIndexer.index_documents (full rebuild of the
+         parsed fixtures into a fresh collection)
+- chat:  p50/p95 latency of ChatBot.chat against benchmarks/stub_ollama.py,
+         plus per-stage p50s from the request traces
+
+Results are written as JSON (with the git commit, profile and settings) so
+two runs can be compared with benchmarks/compare.py.
+    
+    python benchmarks/run_benchmarks.py --pages 20 --output results/before.json
+    python benchmarks/compare.py results/before.json results/after.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fixtures
+from config import add_config_arguments, get_config
+
+RESULTS_VERSION = 1
+
+QUERY_TEMPLATES = [
+    "What is the recommended dose of {drug}?",
+    "How should {drug} be adjusted in renal impairment?",
+    "What are the contraindications of {drug}?",
+    "Which adverse reactions are most common with {drug}?",
+    "What drug interactions are listed for {drug}?",
+    "How should {drug} be stored?",
+]
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.mean(seconds) * 1000, 3),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_parse(settings, pdf_paths, repeat):
+    """pages/sec per fixture kind; the last run's pages are saved for indexing"""
+    from pdf_parser import AdvancedPDFParser, limit_ocr_threads
+    
+    limit_ocr_threads()
+    parser = AdvancedPDFParser(
+        pdf_folder=settings['paths']['pdf_folder'],
+        json_folder=settings['paths']['json_folder'],
+        config=settings['parser']
+    )
+    results = {}
+    for kind, pdf_path in pdf_paths.items():
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pages = parser.extract_text_from_pdf(str(pdf_path))
+            times.append(time.perf_counter() - started)
+        parser.save_pdf_json(pdf_path, pages)
+        
+        best = min(times)
+        results[kind] = {
+            "pages": len(pages),
+            "seconds": round(best, 4),
+            "pages_per_s": round(len(pages) / best, 3) if best > 0 else None,
+            "chars": sum(len(page["text"]) for page in pages),
+            "ocr_pages": sum(1 for page in pages if page["extraction_method"] == "OCR"),
+        }
+    return results
+
+
+def bench_index(settings):
+    """chunks/sec for a full rebuild of the parsed fixtures"""
+    from indexer import EmbeddingIndexer
+    
+    started = time.perf_counter()
+    indexer = EmbeddingIndexer(
+        json_folder=settings['paths']['json_folder'],
+        db_path=settings['paths']['db_path'],
+        config=settings['embedding']
+    )
+    load_seconds = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    indexer.index_documents(full_rebuild=True)
+    seconds = time.perf_counter() - started
+    chunks = indexer.collection.count()
+    return {
+        "model_load_s": round(load_seconds, 4),
+        "chunks": chunks,
+        "seconds": round(seconds, 4),
+        "chunks_per_s": round(chunks / seconds, 3) if seconds > 0 else None,
+    }
+
+
+def bench_chat(settings, args):
+    """ChatBot.chat latency against a stub Ollama, distinct questions so no cache answers"""
+    from chatbot import ChatBot
+    from stub_ollama import start_in_thread
+    
+    server, url = start_in_thread(ttft=args.ttft, token_delay=args.token_delay,
+                                  tokens=args.tokens, prompt_token_delay=args.prompt_token_delay)
+    try:
+        settings = dict(settings)
+        settings['ollama'] = {**settings['ollama'], 'base_url': url}
+        settings['response_cache'] = {**settings['response_cache'], 'enabled': False}
+        bot = ChatBot(settings=settings)
+        
+        queries = [template.format(drug=drug)
+                   for drug in fixtures.DRUGS for template in QUERY_TEMPLATES][:args.queries]
+        latencies = []
+        stages = {}
+        for query in queries:
+            started = time.perf_counter()
+            bot.chat(query)
+            latencies.append(time.perf_counter() - started)
+            for name, seconds in bot.last_trace.stages.items():
+                stages.setdefault(name, []).append(seconds)
+        
+        return {
+            **latency_summary(latencies),
+            "stages_p50_ms": {name: round(percentile(values, 50) * 1000, 3)
+                              for name, values in stages.items()},
+        }
+    finally:
+        server.shutdown()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--pages", type=int, default=10, help="Pages per fixture PDF")
+    arg_parser.add_argument("--kinds", nargs="+", choices=fixtures.KINDS, default=list(fixtures.KINDS))
+    arg_parser.add_argument("--only", nargs="+", choices=["parse", "index", "chat"],
+                            default=["parse", "index", "chat"], help="Benchmarks to run")
+    arg_parser.add_argument("--repeat", type=int, default=1, help="Parse runs per fixture (best is kept)")
+    arg_parser.add_argument("--queries", type=int, default=30, help="Questions for the chat benchmark")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--workdir", help="Keep fixtures, page files and the index here "
+                                              "(default: a temporary directory)")
+    arg_parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>.json)")
+    arg_parser.add_argument("--ttft", type=float, default=0.05, help="Stub Ollama time to first token")
+    arg_parser.add_argument("--token-delay", type=float, default=0.005)
+    arg_parser.add_argument("--tokens", type=int, default=40)
+    arg_parser.add_argument("--prompt-token-delay", type=float, default=0.0)
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="pdf_chatbot_bench_"))
+    overrides = list(args.overrides) + [
+        f'paths.pdf_folder="{workdir / "pdfs"}"',
+        f'paths.json_folder="{workdir / "json"}"',
+        f'paths.db_path="{workdir / "db"}"',
+        f'response_cache.path="{workdir / "response_cache.sqlite"}"',
+    ]
+    settings = get_config(args.profile, overrides)
+    
+    print(f"Generating fixtures in {workdir} ({args.pages} pages each)...")
+    pdf_paths = fixtures.generate(workdir / "pdfs", args.pages, args.kinds, args.seed)
+    
+    results = {}
+    if "parse" in args.only or "index" in args.only:
+        print("\n== parse ==")
+        results["parse"] = bench_parse(settings, pdf_paths, args.repeat)
+    if "index" in args.only:
+        print("\n== index ==")
+        results["index"] = bench_index(settings)
+    if "chat" in args.only:
+        print("\n== chat ==")
+        results["chat"] = bench_chat(settings, args)
+    
+    report = {
+        "version": RESULTS_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "profile": settings['profile'],
+        "settings": {section: settings[section] for section in ("parser", "embedding", "ollama")},
+        "fixtures": {"pages": args.pages, "kinds": args.kinds, "seed": args.seed},
+        "stub": {"ttft": args.ttft, "token_delay": args.token_delay, "tokens": args.tokens,
+                 "prompt_token_delay": args.prompt_token_delay},
+        "results": results,
+    }
+    
+    output = Path(args.output or BENCH_DIR / "results" /
+                  f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    
+    print("\n== results ==")
+    for kind, row in results.get("parse", {}).items():
+        print(f"parse {kind:<8} {row['pages_per_s'] or 0:>9.2f} pages/s  "
+              f"({row['pages']} pages, {row['ocr_pages']} OCR)")
+    if "index" in results:
+        print(f"index          {results['index']['chunks_per_s'] or 0:>9.2f} chunks/s "
+              f"({results['index']['chunks']} chunks)")
+    if "chat" in results:
+        chat = results["chat"]
+        print(f"chat           p50 {chat['p50_ms']:.1f} ms, p95 {chat['p95_ms']:.1f} ms "
+              f"({chat['count']} questions)")
+    print(f"\nWrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Minimal stand-in for the Ollama HTTP API, for load tests and benchmarks
+
+Serves /api/chat (streaming and non-streaming), /api/tags and / with a
+configurable time-to-first-token and per-token delay, so the chatbot can be
+exercised without a model:
+
+    python benchmarks/stub_ollama.py --port 11435 --ttft 0.2 --tokens 50
+    python src/async_chatbot.py --set ollama.base_url=http://localhost:11435 ...
+
+Like Ollama, the stub can also model a cold start (load_time while the model
+is not loaded; it stays loaded for the request's keep_alive, default 5m) and
+prompt prefix caching (prompt_token_delay per prompt token not shared with
+the previous request).
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_keep_alive(value, default=300.0):
+    """Ollama keep_alive ("30m", "1h", 90, -1) in seconds; negative means forever"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"\s*(-?\d+(?:\.\d+)?)\s*(ms|s|m|h)?\s*", str(value))
+    if not match:
+        return default
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+    return float(match.group(1)) * scale
+
+
+def common_prefix_length(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    # Overridden per server in make_server()
+    ttft = 0.1
+    token_delay = 0.01
+    tokens = 20
+    load_time = 0.0
+    prompt_token_delay = 0.0
+    
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+    
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "stub:latest", "model": "stub:latest"}]})
+        else:
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        
+        if self.path != "/api/chat":
+            self._send_json({"error": f"unsupported endpoint {self.path}"}, status=404)
+            return
+        
+        model = request.get("model", "stub")
+        prompt_text = "".join(f"{m.get('role')}:{m.get('content', '')}\n"
+                              for m in request.get("messages", []))
+        tokens = min(self.tokens, (request.get("options") or {}).get("num_predict") or self.tokens)
+        started = time.perf_counter()
+        
+        # Requests arriving while the model loads all wait for it
+        with self.server.model_lock:
+            load_ns = 0
+            if self.server.loaded_until is None or time.monotonic() > self.server.loaded_until:
+                time.sleep(self.load_time)
+                self.server.cached_prompt = ""
+                load_ns = int((time.perf_counter() - started) * 1e9)
+            
+            reused = common_prefix_length(self.server.cached_prompt, prompt_text)
+            self.server.cached_prompt = prompt_text
+            self.server.prefix_hits += reused > 0
+            
+            keep_alive = parse_keep_alive(request.get("keep_alive"))
+            self.server.loaded_until = (float("inf") if keep_alive < 0
+                                        else time.monotonic() + keep_alive)
+        
+        new_tokens = (len(prompt_text) - reused) // 4
+        time.sleep(self.ttft + new_tokens * self.prompt_token_delay)
+        prompt_eval_ns = int((time.perf_counter() - started) * 1e9) - load_ns
+        words = [f"token{i} " for i in range(tokens)]
+        
+        def final_message(content):
+            total_ns = int((time.perf_counter() - started) * 1e9)
+            return {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": total_ns,
+                "load_duration": load_ns,
+                "prompt_eval_count": new_tokens,
+                "prompt_eval_duration": prompt_eval_ns,
+                "eval_count": tokens,
+                "eval_duration": total_ns - prompt_eval_ns - load_ns
+            }
+        
+        if not request.get("stream", True):
+            time.sleep(self.token_delay * tokens)
+            self._send_json(final_message("".join(words)))
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        
+        def write_chunk(payload):
+            data = (json.dumps(payload) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        
+        for word in words:
+            write_chunk({"model": model, "message": {"role": "assistant", "content": word},
+                         "done": False})
+            time.sleep(self.token_delay)
+        write_chunk(final_message(""))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=0, ttft=0.1, token_delay=0.01, tokens=20,
+                load_time=0.0, prompt_token_delay=0.0):
+    """Create a stub server; port=0 picks a free port (see server.server_address)"""
+    handler = type("Handler", (StubOllamaHandler,), {
+        "ttft": ttft, "token_delay": token_delay, "tokens": tokens,
+        "load_time": load_time, "prompt_token_delay": prompt_token_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.model_lock = threading.Lock()
+    server.loaded_until = None
+    server.cached_prompt = ""
+    server.prefix_hits = 0
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a stub server on a background thread, returning (server, base_url)"""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Stub Ollama server")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=11435)
+    arg_parser.add_argument("--ttft", type=float, default=0.1, help="Seconds before the first token")
+    arg_parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between tokens")
+    arg_parser.add_argument("--tokens", type=int, default=20, help="Tokens per answer")
+    arg_parser.add_argument("--load-time", type=float, default=0.0,
+                            help="Seconds to load the model when it is not loaded")
+    arg_parser.add_argument("--prompt-token-delay", type=float, default=0.0,
+                            help="Seconds per prompt token not covered by the cached prefix")
+    args = arg_parser.parse_args()
+    
+    server = make_server(args.host, args.port, args.ttft, args.token_delay, args.tokens,
+                         args.load_time, args.prompt_token_delay)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
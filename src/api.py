@@ -0,0 +1,315 @@
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+import metrics
+from async_chatbot import AsyncChatBot, ServerBusyError
+from catalog import filename_where
+from config import get_config
+
+
+# Largest n_results a request may ask for
+MAX_RESULTS = 100
+
+
+class SearchRequest(BaseModel):
+    query: str
+    n_results: int | None = Field(default=None, gt=0, le=MAX_RESULTS)
+    filenames: list[str] | None = None  # Search only these documents
+    drugs: list[str] | None = None      # Search only documents whose catalog lists these drugs
+
+
+class SearchBatcher:
+    """Micro-batches concurrent searches into one encode() and one collection.query()
+    
+    The first search to arrive waits up to max_wait_ms for others to join
+    (at most max_batch). Query embeddings and results go through the
+    ChatBot's caches, so repeated questions never reach the batch at all.
+    """
+    
+    def __init__(self, bot, max_batch=32, max_wait_ms=5):
+        self.bot = bot
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self._pending = set()  # Batch tasks; the loop itself keeps only weak references
+    
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect())
+    
+    async def stop(self):
+        """Stop collecting, let running batches finish and fail the queued searches"""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        while not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Search batcher stopped"))
+    
+    @staticmethod
+    def _fail(batch, error):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+    
+    async def search(self, query, n_results=None, where=None):
+        """Returns (results, query_embedding, timings)"""
+        n_results = n_results or self.bot.n_results
+        self.bot.check_index_version()
+        
+        key = (self.bot.normalize_query(query), n_results, self.bot.where_key(where))
+        cached = self.bot.retrieval_cache.get(key)
+        if cached is not None:
+            embedding = self.bot.embedding_cache.get(key[0])
+            if embedding is not None:
+                return cached, embedding, {"cached": True}
+        
+        if self._task is None:
+            raise RuntimeError("Search batcher is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((key, future, time.perf_counter()))
+        return await future
+    
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                except asyncio.CancelledError:
+                    self._fail(batch, RuntimeError("Search batcher stopped"))
+                    raise
+            # Run the batch without blocking collection of the next one
+            task = asyncio.create_task(self._process(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+    
+    async def _process(self, batch):
+        try:
+            outputs = await self.bot.run_in_executor(self._search_batch, batch)
+        except Exception as e:
+            self._fail(batch, e)
+            return
+        
+        for (_, future, _), output in zip(batch, outputs):
+            if not future.done():
+                future.set_result(output)
+    
+    def _search_batch(self, batch):
+        """Embed all uncached queries in one call, then one multi-query lookup"""
+        bot = self.bot
+        started = time.perf_counter()
+        
+        queries = [key[0] for key, _, _ in batch]
+        embeddings = [bot.embedding_cache.get(q) for q in queries]
+        missing = sorted({q for q, e in zip(queries, embeddings) if e is None})
+        if missing:
+            encoded = dict(zip(missing, bot.indexer.embedding_model.encode(missing).tolist()))
+            for query, embedding in encoded.items():
+                bot.embedding_cache.put(query, embedding)
+            embeddings = [e if e is not None else encoded[q] for q, e in zip(queries, embeddings)]
+        embedded = time.perf_counter()
+        
+        # One collection.query per distinct filter (almost always just one)
+        per_query = [None] * len(batch)
+        groups = {}
+        for i, (key, _, _) in enumerate(batch):
+            groups.setdefault(key[2], []).append(i)
+        for where_key, indexes in groups.items():
+            max_n = max(batch[i][0][1] for i in indexes)
+            group_results = bot.indexer.search_batch(
+                [embeddings[i] for i in indexes], n_results=max_n,
+                queries=[queries[i] for i in indexes],
+                where=json.loads(where_key) if where_key else None)
+            for i, results in zip(indexes, group_results):
+                per_query[i] = results
+        queried = time.perf_counter()
+        
+        outputs = []
+        for (key, _, enqueued), embedding, results in zip(batch, embeddings, per_query):
+            # Each caller gets only the top n_results it asked for
+            results = {k: [v[0][:key[1]]] for k, v in results.items()}
+            bot.retrieval_cache.put(key, results)
+            outputs.append((results, embedding, {
+                "queue_ms": round((started - enqueued) * 1000, 2),
+                "embed_ms": round((embedded - started) * 1000, 2),
+                "query_ms": round((queried - embedded) * 1000, 2),
+                "batch_size": len(batch)
+            }))
+        return outputs
+
+
+def search_trace(kind, timings):
+    """metrics.Trace seeded with the batcher's retrieval timings"""
+    trace = metrics.Trace(kind)
+    if timings.get("cached"):
+        trace.set(retrieval_cached=True)
+    for stage, key in (("search_queue", "queue_ms"), ("query_embed", "embed_ms"),
+                       ("retrieve", "query_ms")):
+        if key in timings:
+            trace.add(stage, timings[key] / 1000)
+    if "batch_size" in timings:
+        trace.set(batch_size=timings["batch_size"])
+    return trace
+
+
+def format_hits(results):
+    hits = []
+    for i, chunk_id in enumerate(results['ids'][0]):
+        metadata = results['metadatas'][0][i]
+        hits.append({
+            "id": chunk_id,
+            "text": results['documents'][0][i],
+            "filename": metadata['filename'],
+            "page": metadata['page'],
+            "page_start": metadata.get('page_start', metadata['page']),
+            "page_end": metadata.get('page_end', metadata['page']),
+            "chunk": metadata['chunk'],
+            "distance": results['distances'][0][i] if results.get('distances') else None
+        })
+    return hits
+
+
+def create_app(settings=None):
+    """FastAPI app wrapping one AsyncChatBot (and its indexer), loaded at startup"""
+    settings = settings or get_config()
+    api_config = settings['api']
+    state = {}
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        bot = AsyncChatBot(settings=settings)
+        batcher = SearchBatcher(bot, api_config['max_batch'], api_config['max_wait_ms'])
+        batcher.start()
+        state['bot'], state['batcher'] = bot, batcher
+        yield
+        await batcher.stop()
+        bot.close()
+    
+    app = FastAPI(title="PDF Chatbot API", lifespan=lifespan)
+    
+    @app.get("/health")
+    async def health():
+        bot = state['bot']
+        return {
+            "status": "ok",
+            "profile": settings['profile'],
+            "chunks": await bot.run_in_executor(bot.indexer.collection.count),
+            "load": bot.load(),
+            "caches": bot.cache_stats()
+        }
+    
+    def request_where(request, bot, route=False):
+        """(where, routed): the request's filters, else (if route) the routing of the question"""
+        if request.filenames is not None or request.drugs is not None:
+            return bot.indexer.catalog.where(request.filenames, request.drugs), False
+        if not route:
+            return None, False
+        filenames = bot.route(request.query)
+        return (filename_where(filenames), True) if filenames is not None else (None, False)
+    
+    @app.get("/documents")
+    async def documents():
+        """The document catalog: title, pages, extraction method and drugs per PDF"""
+        bot = state['bot']
+        catalog = await bot.run_in_executor(bot.indexer.catalog.load)
+        return {"documents": list(catalog.values())}
+    
+    @app.post("/search")
+    async def search(request: SearchRequest):
+        bot, batcher = state['bot'], state['batcher']
+        started = time.perf_counter()
+        try:
+            with bot.admission():
+                # The catalog is read from disk when it changed; keep that off the loop
+                where, _ = await bot.run_in_executor(request_where, request, bot)
+                results, _, timings = await batcher.search(request.query, request.n_results, where)
+        except ServerBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        metrics.REGISTRY.record_trace(search_trace("search", timings))
+        return {"results": format_hits(results), "timings": timings}
+    
+    @app.post("/query")
+    async def query(request: SearchRequest):
+        bot, batcher = state['bot'], state['batcher']
+        started = time.perf_counter()
+        try:
+            with bot.admission():
+                where, routed = await bot.run_in_executor(request_where, request, bot, True)
+                results, embedding, timings = await batcher.search(
+                    request.query, request.n_results, where)
+                fallback = routed and bot.weak_results(results)
+                if fallback:
+                    # Routing only narrows on the catalog's guess; search everything instead
+                    results, embedding, timings = await batcher.search(
+                        request.query, request.n_results, None)
+                retrieved = time.perf_counter()
+                trace = search_trace("query", timings)
+                if where:
+                    trace.set(where=where, routed=routed)
+                if fallback:
+                    trace.set(route_fallback=True)
+                answer, sources = await bot.agenerate_response(
+                    request.query, retrieved=(results, embedding), trace=trace)
+        except ServerBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        finished = time.perf_counter()
+        timings["retrieve_ms"] = round((retrieved - started) * 1000, 2)
+        timings["generate_ms"] = round((finished - retrieved) * 1000, 2)
+        timings["total_ms"] = round((finished - started) * 1000, 2)
+        return {"answer": answer, "sources": sources, "timings": timings,
+                "trace": trace.to_dict()}
+    
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Stage histograms and counters for a Prometheus scraper"""
+        return PlainTextResponse(metrics.REGISTRY.prometheus_text(),
+                                 media_type="text/plain; version=0.0.4")
+    
+    @app.get("/metrics/json")
+    async def json_metrics():
+        return {**metrics.REGISTRY.snapshot(), "traces": metrics.REGISTRY.recent_traces()}
+    
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(description="HTTP API for the PDF chatbot")
+    arg_parser.add_argument("--host", default=None)
+    arg_parser.add_argument("--port", type=int, default=None)
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    settings = get_config(args.profile, args.overrides)
+    print(f"Profile: {settings['profile']}")
+    uvicorn.run(
+        create_app(settings),
+        host=args.host or settings['api']['host'],
+        port=args.port or settings['api']['port']
+    )
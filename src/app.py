@@ -5,8 +5,11 @@ from pathlib import Path
 # Add src to path
 sys.path.append(str(Path(__file__).parent / "src"))
 
+import argparse
+
+import metrics
 from chatbot import ChatBot
-from config import OLLAMA_CONFIG
+from config import add_config_arguments, get_config
 
 
 # Page config
@@ -16,10 +19,39 @@ st.set_page_config(
     layout="centered"
 )
 
-# Initialize chatbot
+# Profile/overrides: `streamlit run app.py -- --profile fast`
+arg_parser = argparse.ArgumentParser()
+add_config_arguments(arg_parser)
+args, _ = arg_parser.parse_known_args()
+SETTINGS = get_config(args.profile, args.overrides)
+OLLAMA_CONFIG = SETTINGS['ollama']
+
+
+# One chatbot (model client, index, caches) shared by every session; each
+# session keeps its own messages and trace in st.session_state
 @st.cache_resource
 def load_chatbot():
-    return ChatBot(config=OLLAMA_CONFIG)
+    return ChatBot(settings=SETTINGS)
+
+
+def show_trace(trace):
+    """Stage timings and LLM stats of the last question"""
+    if trace is None:
+        st.caption("No question asked yet")
+        return
+    
+    st.table([{"stage": name, "ms": round(seconds * 1000, 1)}
+              for name, seconds in trace.stages.items()])
+    attributes = trace.attributes
+    if attributes.get("cached"):
+        st.markdown(f"Answered without the LLM: `{attributes['cached']}`")
+    if attributes.get("eval_count"):
+        st.markdown(f"Tokens: `{attributes.get('prompt_eval_count', 0)}` prompt / "
+                    f"`{attributes['eval_count']}` generated")
+    if attributes.get("tokens_per_second"):
+        st.markdown(f"Generation: `{attributes['tokens_per_second']:.1f}` tokens/s")
+    if attributes.get("load_seconds"):
+        st.markdown(f"Model load: `{attributes['load_seconds']:.2f}`s")
 
 
 def main():
@@ -30,6 +62,9 @@ def main():
     if "messages" not in st.session_state:
         st.session_state.messages = []
     
+    if "trace" not in st.session_state:
+        st.session_state.trace = None
+    
     if "chatbot" not in st.session_state:
         with st.spinner("Loading chatbot..."):
             st.session_state.chatbot = load_chatbot()
@@ -41,15 +76,28 @@ def main():
         
         if st.button("Clear Chat History"):
             st.session_state.messages = []
-            st.session_state.chatbot.clear_history()
+            st.session_state.trace = None
             st.rerun()
         
         st.markdown("---")
         st.markdown("**Configuration**")
+        st.markdown(f"Profile: `{SETTINGS['profile']}`")
         st.markdown(f"Model: `{OLLAMA_CONFIG['model']}`")
         st.markdown(f"Base URL: `{OLLAMA_CONFIG['base_url']}`")
         st.markdown(f"Temperature: `{OLLAMA_CONFIG['temperature']}`")
         st.markdown(f"Max Tokens: `{OLLAMA_CONFIG['max_tokens']}`")
+        st.markdown(f"Chunks retrieved: `{SETTINGS['embedding']['n_results']}`")
+        
+        cache_stats = st.session_state.chatbot.cache_stats()
+        st.markdown(f"Retrieval cache: `{cache_stats['retrieval']['hits']}` hits / "
+                    f"`{cache_stats['retrieval']['misses']}` misses")
+        if "response" in cache_stats:
+            st.markdown(f"Answer cache: `{cache_stats['response']['hits']}` hits / "
+                        f"`{cache_stats['response']['misses']}` misses")
+        
+        # Filled in at the end, once the current question has been answered
+        show_trace_view = st.checkbox("Show request trace")
+        trace_slot = st.empty()
     
     # Display chat messages
     for message in st.session_state.messages:
@@ -71,15 +119,21 @@ def main():
         
         # Generate response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                answer, sources = st.session_state.chatbot.chat(prompt)
-                st.markdown(answer)
-                
-                # Show sources
-                if sources:
-                    with st.expander("📄 Sources"):
-                        for source in set(sources):
-                            st.markdown(f"- {source}")
+            with st.spinner("Searching documents..."):
+                # The shared bot must not record this session's conversation
+                trace = metrics.Trace()
+                sources, stream = st.session_state.chatbot.chat_stream(
+                    prompt, trace=trace, record=False)
+                st.session_state.trace = trace
+            
+            # Render tokens as they arrive
+            answer = st.write_stream(stream)
+            
+            # Show sources
+            if sources:
+                with st.expander("📄 Sources"):
+                    for source in set(sources):
+                        st.markdown(f"- {source}")
         
         # Add assistant message
         st.session_state.messages.append({
@@ -87,6 +141,10 @@ def main():
             "content": answer,
             "sources": sources
         })
+    
+    if show_trace_view:
+        with trace_slot.container():
+            show_trace(st.session_state.trace)
 
 
 if __name__ == "__main__":
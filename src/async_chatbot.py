@@ -0,0 +1,258 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+import ollama
+
+import metrics
+from chatbot import ChatBot
+from config import get_config
+
+
+class ServerBusyError(Exception):
+    """Raised when a request arrives while the wait queue is full"""
+
+
+class AsyncChatBot(ChatBot):
+    """ChatBot for many concurrent callers on one event loop
+    
+    Ollama is called through a single ollama.AsyncClient whose httpx pool
+    keeps connections alive between requests. Retrieval (embedding + Chroma)
+    runs on a thread pool so it never blocks the loop. At most
+    max_concurrency generations run at once and at most max_queue requests
+    wait behind them; anything beyond that fails fast with ServerBusyError
+    instead of queueing without bound.
+    
+    The bot is shared by every caller, so answers are not added to
+    conversation_history; callers keep their own history.
+    """
+    
+    def __init__(self, config=None, settings=None):
+        super().__init__(config=config, settings=settings)
+        
+        self.max_concurrency = self.config.get('max_concurrency', 4)
+        self.max_queue = self.config.get('max_queue', 32)
+        
+        self._async_client = None
+        self._client_loop = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.get('retrieval_workers', 4),
+            thread_name_prefix="retrieval"
+        )
+        self._semaphore = None
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+    
+    def _bind_loop(self):
+        """HTTP pool and semaphore belong to one event loop; recreate them for a new one"""
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            self._async_client = ollama.AsyncClient(
+                host=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client_loop = loop
+    
+    @property
+    def async_client(self):
+        """Pooled AsyncClient for the running event loop"""
+        self._bind_loop()
+        return self._async_client
+    
+    @property
+    def semaphore(self):
+        self._bind_loop()
+        return self._semaphore
+    
+    def _admit(self):
+        """Backpressure: reject instead of queueing past capacity"""
+        with self._in_flight_lock:
+            if self._in_flight >= self.max_concurrency + self.max_queue:
+                raise ServerBusyError(
+                    f"{self._in_flight} requests in flight (limit "
+                    f"{self.max_concurrency} running + {self.max_queue} queued)")
+            self._in_flight += 1
+    
+    def _release(self):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+    
+    @contextmanager
+    def admission(self):
+        """Hold a request slot for the duration of the block"""
+        self._admit()
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def load(self):
+        """Current load, e.g. for a health endpoint"""
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
+    
+    async def run_in_executor(self, func, *args):
+        """Run blocking work (retrieval, cache writes) off the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+    
+    async def agenerate_response(self, user_query, retrieved=None, trace=None):
+        """Async generate_response: retrieval in the executor, Ollama over HTTP"""
+        trace = trace or metrics.Trace()
+        prompt, sources, cached, store, prompt_stats = await self.run_in_executor(
+            self.prepare_answer, user_query, retrieved, trace)
+        if cached:
+            self.finish_trace(trace)
+            return cached
+        
+        started = time.perf_counter()
+        try:
+            async with self.semaphore:
+                response = await self.async_client.chat(
+                    model=self.model_name,
+                    messages=self.build_messages(prompt),
+                    options=self._llm_options(),
+                    keep_alive=self.keep_alive
+                )
+            
+            answer = response['message']['content']
+            llm_seconds = time.perf_counter() - started
+            self.log_request(prompt_stats, llm_seconds)
+            self.finish_trace(trace, llm_seconds, response=response)
+            
+            if store:
+                await self.run_in_executor(store, answer)
+            
+            return answer, sources
+        
+        except Exception as e:
+            trace.set(error=str(e))
+            self.finish_trace(trace, time.perf_counter() - started)
+            return f"Error generating response: {str(e)}", []
+    
+    async def achat(self, user_query):
+        """Async chat function; raises ServerBusyError when over capacity"""
+        with self.admission():
+            return await self.agenerate_response(user_query)
+    
+    @asynccontextmanager
+    async def achat_stream(self, user_query):
+        """Async chat_stream as a context manager yielding (sources, async token generator)
+            
+            async with bot.achat_stream(query) as (sources, tokens):
+                async for token in tokens:
+                    ...
+        
+        The request's slot is held until the block exits, whether or not the
+        tokens were read; raises ServerBusyError when over capacity.
+        """
+        with self.admission():
+            trace = metrics.Trace()
+            prompt, sources, cached, store, prompt_stats = await self.run_in_executor(
+                self.prepare_answer, user_query, None, trace)
+            if cached:
+                self.finish_trace(trace)
+                tokens = self._areplay(cached[0])
+                sources = cached[1]
+            else:
+                tokens = self._astream_answer(prompt, store, prompt_stats, trace)
+            try:
+                yield sources, tokens
+            finally:
+                await tokens.aclose()
+    
+    @staticmethod
+    async def _areplay(answer):
+        yield answer
+    
+    async def _astream_answer(self, prompt, store, prompt_stats, trace):
+        parts = []
+        started = time.perf_counter()
+        first_token = None
+        final = None
+        async with self.semaphore:
+            try:
+                stream = await self.async_client.chat(
+                    model=self.model_name,
+                    messages=self.build_messages(prompt),
+                    options=self._llm_options(),
+                    keep_alive=self.keep_alive,
+                    stream=True
+                )
+                async for chunk in stream:
+                    token = chunk['message']['content']
+                    if token:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        parts.append(token)
+                        yield token
+                    if chunk.get('done'):
+                        final = chunk
+            except Exception as e:
+                error = f"Error generating response: {str(e)}"
+                trace.set(error=str(e))
+                self.finish_trace(trace, time.perf_counter() - started, first_token)
+                yield error
+                return
+        
+        answer = "".join(parts)
+        llm_seconds = time.perf_counter() - started
+        self.log_request(prompt_stats, llm_seconds, first_token)
+        self.finish_trace(trace, llm_seconds, first_token, final)
+        if store:
+            await self.run_in_executor(store, answer)
+    
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+async def _load_test(bot, queries):
+    """Fire all queries at once and report per-request latency"""
+    loop = asyncio.get_running_loop()
+    
+    async def one(query):
+        start = loop.time()
+        try:
+            answer, _ = await bot.achat(query)
+            status = "ok" if not answer.startswith("Error") else answer
+        except ServerBusyError:
+            status = "busy"
+        return loop.time() - start, status
+    
+    results = await asyncio.gather(*(one(q) for q in queries))
+    latencies = sorted(latency for latency, _ in results)
+    for latency, status in results:
+        print(f"  {latency:6.2f}s  {status}")
+    print(f"\n{len(results)} requests, p50 {latencies[len(latencies) // 2]:.2f}s, "
+          f"max {latencies[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(
+        description="Send concurrent questions through AsyncChatBot "
+                    "(point ollama.base_url at benchmarks/stub_ollama.py to test without a model)")
+    arg_parser.add_argument("query", help="Question to ask")
+    arg_parser.add_argument("--concurrency", type=int, default=10, help="Simultaneous requests")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    settings = get_config(args.profile, args.overrides)
+    bot = AsyncChatBot(settings=settings)
+    # Distinct queries so the caches do not answer everything after the first
+    queries = [f"{args.query} ({i})" for i in range(args.concurrency)]
+    asyncio.run(_load_test(bot, queries))
+    bot.close()
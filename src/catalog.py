@@ -0,0 +1,182 @@
+# Catalog of the indexed documents: one entry per PDF with its title, page
+# count, extraction method and the drug names it mentions.
+#
+# The indexer builds each entry while it reads a document's pages, keeps it
+# in the document's manifest entry, and writes catalog.json next to the
+# collection at the end of every run. At query time the catalog turns
+# filename/drug filters into Chroma `where` clauses, and ChatBot uses it to
+# route a question that names a drug to the documents about that drug.
+
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+from lexical_index import tokenize
+
+# Common stems of international nonproprietary drug names
+DRUG_STEMS = (
+    "mab", "nib", "ciclib", "parib", "pril", "sartan", "olol", "dipine", "statin", "fibrate",
+    "gliptin", "gliflozin", "glutide", "formin", "glitazone", "prazole", "tidine", "setron",
+    "lukast", "cillin", "mycin", "micin", "cycline", "floxacin", "penem", "azole", "vir",
+    "parin", "xaban", "gatran", "grel", "farin", "oxetine", "traline", "pramine", "triptyline",
+    "azepam", "zolam", "apine", "peridol", "piprazole", "triptan", "caine", "barbital",
+    "profen", "coxib", "fenac", "sone", "olone", "terol", "tropium", "thiazide", "semide",
+    "thyroxine", "pentin", "gabalin", "dronate", "platin", "rubicin", "taxel", "trexate",
+)
+DRUG_PATTERN = re.compile(r"\b[a-z]{3,}(?:" + "|".join(DRUG_STEMS) + r")\b")
+
+# Words that end in a drug stem without being drugs
+NOT_DRUGS = {"cholesterol"}
+
+
+def find_drugs(text, names=()):
+    """Counter of drug names in text: stem matches plus the given names"""
+    text = text.lower()
+    found = Counter(word for word in DRUG_PATTERN.findall(text) if word not in NOT_DRUGS)
+    if names:
+        # Names that also match a stem are counted already
+        found.update([token for token in tokenize(text) if token in names and token not in found])
+    return found
+
+
+class DocumentProfile:
+    """Catalog entry of one document, accumulated page by page"""
+    
+    def __init__(self, filename, drug_names=(), max_drugs=20, min_mentions=2):
+        self.filename = filename
+        self.drug_names = drug_names
+        self.max_drugs = max_drugs
+        self.min_mentions = min_mentions
+        self.title = None
+        self.pages = 0
+        self.methods = Counter()
+        self.drugs = Counter()
+    
+    def add_page(self, page):
+        text = page.get('text') or ""
+        self.pages += 1
+        self.methods[page.get('extraction_method') or "unknown"] += 1
+        if self.title is None and text.strip():
+            self.title = self._title(text)
+        self.drugs.update(find_drugs(text, self.drug_names))
+    
+    @staticmethod
+    def _title(text, max_chars=100):
+        """First line (or sentence) of the first page with text"""
+        line = text.strip().splitlines()[0]
+        line = re.split(r"(?<=[.!?])\s", line, 1)[0]
+        if len(line) > max_chars:
+            line = line[:max_chars].rsplit(" ", 1)[0]
+        return line
+    
+    def entry(self):
+        # A drug in the file name counts however often the text names it
+        named = find_drugs(os.path.splitext(self.filename)[0].replace("_", " "), self.drug_names)
+        drugs = [drug for drug, count in self.drugs.most_common()
+                 if count >= self.min_mentions or drug in named]
+        drugs += [drug for drug in named if drug not in drugs]
+        return {
+            "filename": self.filename,
+            "title": self.title or os.path.splitext(self.filename)[0],
+            "pages": self.pages,
+            "extraction_method": self.methods.most_common(1)[0][0] if self.methods else None,
+            "extraction_methods": dict(self.methods),
+            "drugs": drugs[:self.max_drugs]
+        }
+
+
+def filename_where(filenames):
+    """Chroma where clause for chunks of the given documents"""
+    filenames = sorted(set(filenames))
+    if not filenames:
+        # Chroma rejects an empty $in; no chunk has an empty filename
+        return {"filename": ""}
+    if len(filenames) == 1:
+        return {"filename": filenames[0]}
+    return {"filename": {"$in": filenames}}
+
+
+class DocumentCatalog:
+    """catalog.json: {filename: entry}, reloaded when the file changes"""
+    
+    def __init__(self, path, drug_names=(), max_drugs=20, min_mentions=2):
+        self.path = path
+        self.drug_names = {name.lower() for name in drug_names}
+        self.max_drugs = max_drugs
+        self.min_mentions = min_mentions
+        self.documents = {}
+        self._version = None
+    
+    def load(self):
+        """Current documents, re-read if another run rewrote the file"""
+        try:
+            version = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self.documents, self._version = {}, None
+            return self.documents
+        if version != self._version:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.documents = {entry["filename"]: entry for entry in json.load(f)}
+            except (OSError, ValueError, KeyError, TypeError):
+                self.documents = {}
+            self._version = version
+        return self.documents
+    
+    def save(self, entries):
+        """Write the catalog atomically, sorted by filename"""
+        entries = sorted(entries, key=lambda entry: entry["filename"])
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self.documents = {entry["filename"]: entry for entry in entries}
+        self._version = os.stat(self.path).st_mtime_ns
+    
+    def profile(self, filename):
+        return DocumentProfile(filename, self.drug_names, self.max_drugs, self.min_mentions)
+    
+    def settings_key(self):
+        """Hash of everything an entry depends on besides the text; entries made
+        under another key are out of date"""
+        settings = [sorted(self.drug_names), self.max_drugs, self.min_mentions,
+                    DRUG_STEMS, sorted(NOT_DRUGS)]
+        return hashlib.sha1(json.dumps(settings).encode('utf-8')).hexdigest()[:16]
+    
+    def match(self, filenames=None, drugs=None):
+        """Filenames that satisfy both filters (None = no filter on that field)"""
+        documents = self.load()
+        selected = set(documents)
+        if filenames is not None:
+            selected &= set(filenames)
+        if drugs is not None:
+            wanted = {drug.lower() for drug in drugs}
+            selected = {name for name in selected if wanted & set(documents[name]["drugs"])}
+        return sorted(selected)
+    
+    def where(self, filenames=None, drugs=None):
+        """Chroma where clause for the filters, or None if there are none"""
+        if filenames is None and drugs is None:
+            return None
+        if drugs is None:
+            # Filenames need no catalog lookup, so documents indexed before it existed still match
+            return filename_where(filenames)
+        return filename_where(self.match(filenames, drugs))
+    
+    def route(self, query):
+        """Documents about the drugs a question names, or None to search everything
+        
+        Only narrows the search: if no cataloged drug is named, or every
+        document mentions the named drugs, returns None.
+        """
+        documents = self.load()
+        if not documents:
+            return None
+        known = {drug for entry in documents.values() for drug in entry["drugs"]}
+        named = set(tokenize(query)) & known
+        if not named:
+            return None
+        filenames = self.match(drugs=named)
+        return filenames if len(filenames) < len(documents) else None
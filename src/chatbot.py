@@ -1,120 +1,413 @@
+import json
+import time
+
+import metrics
 import ollama
+from cache import TTLCache
+from catalog import filename_where
+from config import get_config
+from context_builder import ContextBuilder, estimate_tokens
 from indexer import EmbeddingIndexer
+from response_cache import SemanticResponseCache
 
 
 class ChatBot:
-    def __init__(self, config=None):
-        # Default configuration
+    def __init__(self, config=None, settings=None):
+        # Default configuration: the active performance profile
+        if settings is None:
+            settings = get_config()
         if config is None:
-            config = {
-                'base_url': 'http://localhost:11434',
-                'model': 'mistral',
-                'timeout': 120,
-                'temperature': 0.7,
-                'max_tokens': 2000
-            }
+            config = settings['ollama']
         
+        self.settings = settings
         self.config = config
+        metrics.configure(settings.get('metrics'))
+        self.last_trace = None  # metrics.Trace of the most recent question
         self.model_name = config['model']
         self.base_url = config['base_url']
         self.timeout = config.get('timeout', 120)
         self.temperature = config.get('temperature', 0.7)
         self.max_tokens = config.get('max_tokens', 2000)
+        self.keep_alive = config.get('keep_alive')
         
         # Initialize Ollama client
-        self.client = ollama.Client(host=self.base_url)
+        self.client = ollama.Client(host=self.base_url, timeout=self.timeout)
         
-        self.indexer = EmbeddingIndexer()
+        self.indexer = EmbeddingIndexer(
+            json_folder=settings['paths']['json_folder'],
+            db_path=settings['paths']['db_path'],
+            config=settings['embedding']
+        )
+        self.n_results = self.indexer.n_results
+        # Narrow retrieval to the cataloged documents about the drugs a question names
+        self.route_queries = settings['embedding'].get('route_queries', False)
+        self.route_max_distance = settings['embedding'].get('route_max_distance', 0.7)
         self.conversation_history = []
+        
+        # Deduplicates/merges retrieved chunks and trims them to a token budget
+        self.context_builder = ContextBuilder(
+            budget_tokens=config.get('context_token_budget', 2000),
+            chunk_overlap=self.indexer.chunk_overlap
+        )
+        
+        # Repeated questions skip embedding and collection.query
+        cache_config = settings.get('cache', {})
+        self.embedding_cache = TTLCache(**cache_config)
+        self.retrieval_cache = TTLCache(**cache_config)
+        self._index_version = self.indexer.index_version()
+        
+        # Answers for near-identical questions over the same retrieved chunks
+        response_config = dict(settings.get('response_cache', {}))
+        self.response_cache = None
+        if response_config.pop('enabled', False):
+            self.response_cache = SemanticResponseCache(**response_config)
+        
+        if config.get('warmup', False):
+            self.warm_up()
     
-    def get_relevant_context(self, query, n_results=5):
-        """Retrieve relevant chunks from vector DB"""
-        results = self.indexer.search(query, n_results=n_results)
+    def warm_up(self):
+        """Load the model and evaluate the system prompt before the first question
+        
+        Ollama keeps the KV cache of the last prompt, so later requests that
+        start with the same system message only evaluate the new part.
+        """
+        started = time.perf_counter()
+        try:
+            self.client.chat(
+                model=self.model_name,
+                messages=[{"role": "system", "content": self.SYSTEM_PROMPT}],
+                options={**self._llm_options(), 'num_predict': 1},
+                keep_alive=self.keep_alive
+            )
+            print(f"Warmed up {self.model_name} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"Warning: could not warm up {self.model_name}: {e}")
+    
+    @staticmethod
+    def normalize_query(query):
+        """Cache key for a query: case and whitespace do not matter"""
+        return " ".join(query.lower().split())
+    
+    def check_index_version(self):
+        """Drop cached results once the collection has been re-indexed"""
+        version = self.indexer.index_version()
+        if version != self._index_version:
+            self._index_version = version
+            self.embedding_cache.clear()
+            self.retrieval_cache.clear()
+    
+    def cache_stats(self):
+        """Hit/miss counters of the query caches"""
+        stats = {
+            "embedding": self.embedding_cache.stats(),
+            "retrieval": self.retrieval_cache.stats()
+        }
+        if self.response_cache:
+            stats["response"] = self.response_cache.stats()
+        return stats
+    
+    def query_embedding(self, query):
+        """Cached embedding of the normalized query text"""
+        self.check_index_version()
+        normalized = self.normalize_query(query)
+        embedding = self.embedding_cache.get(normalized)
+        if embedding is None:
+            embedding = self.indexer.embed_query(normalized)
+            self.embedding_cache.put(normalized, embedding)
+        return embedding
+    
+    @staticmethod
+    def where_key(where):
+        """Hashable form of a Chroma where clause for cache keys"""
+        return json.dumps(where, sort_keys=True) if where else None
+    
+    def route(self, query):
+        """Filenames to restrict the search to, or None to search every document"""
+        if not self.route_queries:
+            return None
+        return self.indexer.catalog.route(query)
+    
+    def weak_results(self, results):
+        """True if a routed search found nothing close enough to trust the routing"""
+        distances = (results.get('distances') or [[]])[0]
+        return not distances or min(distances) > self.route_max_distance
+    
+    def search(self, query, n_results=None, query_embedding=None, where=None):
+        """Cached indexer.search: raw Chroma results for a query"""
+        n_results = n_results or self.n_results
+        self.check_index_version()
         
-        context_parts = []
-        sources = []
+        key = (self.normalize_query(query), n_results, self.where_key(where))
+        results = self.retrieval_cache.get(key)
+        if results is not None:
+            return results
         
-        if results['documents'] and len(results['documents'][0]) > 0:
-            for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
-                context_parts.append(doc)
-                sources.append(f"{metadata['filename']} (Page {metadata['page']})")
+        if query_embedding is None:
+            query_embedding = self.query_embedding(query)
         
-        context = "\n\n".join(context_parts)
+        results = self.indexer.search(query, n_results=n_results,
+                                      query_embedding=query_embedding, where=where)
+        self.retrieval_cache.put(key, results)
+        return results
+    
+    def get_relevant_context(self, query, n_results=None):
+        """Retrieve relevant chunks from vector DB"""
+        results = self.search(query, n_results=n_results)
+        return self.format_context(results)
+    
+    def format_context(self, results):
+        """Turn Chroma results into (context text, source labels)"""
+        context, sources, _ = self.context_builder.build(results)
         return context, sources
     
-    def generate_response(self, user_query):
-        """Generate response using Ollama"""
+    NO_CONTEXT_ANSWER = "I couldn't find relevant information in the documents."
+    
+    # Identical for every request, so Ollama can reuse its evaluated prefix
+    SYSTEM_PROMPT = ("You are a helpful assistant that answers questions based on the provided "
+                     "context from PDF documents. Answer the question based only on the context "
+                     "provided. If the context doesn't contain enough information to answer the "
+                     "question, say so. Be concise and specific.")
+    
+    def build_prompt(self, user_query, context):
+        """Create the user message sent to Ollama (instructions are in SYSTEM_PROMPT)"""
+        return f"""Context from documents:
+{context}
+
+Question: {user_query}"""
+    
+    def build_messages(self, prompt):
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _llm_options(self):
+        return {
+            'temperature': self.temperature,
+            'num_predict': self.max_tokens,
+        }
+    
+    def _generation_settings(self):
+        """Everything besides the chunks and model that changes the answer"""
+        return {
+            'system_prompt': self.SYSTEM_PROMPT,
+            'prompt_template': self.build_prompt("{question}", "{context}"),
+            'options': self._llm_options(),
+            'context_token_budget': self.context_builder.budget_tokens,
+            'profile': self.settings.get('profile')
+        }
+    
+    def prepare_answer(self, user_query, retrieved=None, trace=None):
+        """Retrieval step shared by generate_response and chat_stream
+        
+        Returns (prompt, sources, cached, store, prompt_stats). cached is an
+        (answer, sources) pair when no LLM call is needed; otherwise store, if
+        not None, saves the generated answer in the response cache. Pass
+        retrieved=(results, query_embedding) when retrieval already ran.
+        Stage timings are added to trace if given.
+        """
+        trace = trace or metrics.Trace()
+        
         # Get relevant context
-        context, sources = self.get_relevant_context(user_query)
+        if retrieved is None:
+            with trace.stage('route'):
+                filenames = self.route(user_query)
+            where = None
+            if filenames is not None:
+                where = filename_where(filenames)
+                trace.set(routed_to=filenames)
+            with trace.stage('query_embed'):
+                embedding = self.query_embedding(user_query)
+            with trace.stage('retrieve'):
+                results = self.search(user_query, query_embedding=embedding, where=where)
+                if where is not None and self.weak_results(results):
+                    # The catalog can miss a document about the drug; search them all
+                    trace.set(route_fallback=True)
+                    results = self.search(user_query, query_embedding=embedding)
+        else:
+            results, embedding = retrieved
+        with trace.stage('prompt_build'):
+            context, sources, prompt_stats = self.context_builder.build(results)
+        trace.set(chunks=prompt_stats['chunks'], context_tokens=prompt_stats['tokens'])
         
         if not context:
-            return "I couldn't find relevant information in the documents.", []
+            trace.set(cached='no_context')
+            return None, [], (self.NO_CONTEXT_ANSWER, []), None, prompt_stats
         
-        # Create prompt
-        prompt = f"""You are a helpful assistant that answers questions based on the provided context from PDF documents.
-
-Context from documents:
-{context}
-
-Question: {user_query}
-
-Answer the question based only on the context provided. If the context doesn't contain enough information to answer the question, say so. Be concise and specific."""
+        store = None
+        # Same chunks, near-identical question: reuse the earlier answer
+        if self.response_cache:
+            context_key = SemanticResponseCache.context_key(
+                results, self.model_name, self._generation_settings())
+            cached = self.response_cache.lookup(embedding, context_key)
+            if cached:
+                trace.set(cached='response')
+                return None, cached[1], cached, None, prompt_stats
+            
+            def store(answer):
+                self.response_cache.store(user_query, embedding, context_key, answer, sources)
+        
+        with trace.stage('prompt_build'):
+            prompt = self.build_prompt(user_query, context)
+        prompt_stats["prompt_tokens"] = estimate_tokens(self.SYSTEM_PROMPT) + estimate_tokens(prompt)
+        return prompt, sources, None, store, prompt_stats
+    
+    def log_request(self, prompt_stats, llm_seconds, first_token_seconds=None):
+        """One line per LLM call: prompt size after compaction and latency"""
+        ttft = f", first token {first_token_seconds:.2f}s" if first_token_seconds is not None else ""
+        print(f"[llm] {prompt_stats['chunks']} chunks -> {prompt_stats['sections']} sections, "
+              f"context ~{prompt_stats['raw_tokens']} -> ~{prompt_stats['tokens']} tokens, "
+              f"prompt ~{prompt_stats['prompt_tokens']} tokens, {llm_seconds:.2f}s{ttft}")
+    
+    def finish_trace(self, trace, llm_seconds=None, first_token_seconds=None, response=None):
+        """Add the LLM stage (and Ollama's stats from its final response) and record the trace"""
+        if llm_seconds is not None:
+            trace.add('llm', llm_seconds)
+        if first_token_seconds is not None:
+            trace.add('llm_first_token', first_token_seconds)
+        if response is not None:
+            trace.set(**metrics.ollama_stats(response))
+        self.last_trace = trace
+        metrics.REGISTRY.record_trace(trace)
+    
+    def generate_response(self, user_query, trace=None):
+        """Generate response using Ollama"""
+        trace = trace or metrics.Trace()
+        prompt, sources, cached, store, prompt_stats = self.prepare_answer(user_query, trace=trace)
+        if cached:
+            self.finish_trace(trace)
+            return cached
         
+        started = time.perf_counter()
         try:
             # Call Ollama with configured parameters
             response = self.client.chat(
                 model=self.model_name,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                options={
-                    'temperature': self.temperature,
-                    'num_predict': self.max_tokens,
-                }
+                messages=self.build_messages(prompt),
+                options=self._llm_options(),
+                keep_alive=self.keep_alive
             )
             
             answer = response['message']['content']
-            return answer, sources
+            llm_seconds = time.perf_counter() - started
+            self.log_request(prompt_stats, llm_seconds)
+            self.finish_trace(trace, llm_seconds, response=response)
+            
+            if store:
+                store(answer)
             
+            return answer, sources
+        
         except Exception as e:
+            trace.set(error=str(e))
+            self.finish_trace(trace, time.perf_counter() - started)
             return f"Error generating response: {str(e)}", []
     
-    def chat(self, user_query):
-        """Main chat function"""
-        answer, sources = self.generate_response(user_query)
-        
-        # Store in history
+    def _record(self, user_query, answer, sources):
+        """Store in history"""
         self.conversation_history.append({
             "query": user_query,
             "answer": answer,
             "sources": sources
         })
-        
+    
+    def chat(self, user_query):
+        """Main chat function"""
+        answer, sources = self.generate_response(user_query)
+        self._record(user_query, answer, sources)
         return answer, sources
     
+    def chat_stream(self, user_query, trace=None, record=True):
+        """Streaming chat function: returns (sources, token generator)
+        
+        Retrieval runs before returning, so sources are available up front.
+        The generator yields answer text as Ollama produces it and, with
+        record, adds the full answer to conversation_history once it is
+        exhausted. Pass record=False when the bot is shared between users
+        who keep their own history, and a trace to get this question's
+        timings rather than reading last_trace.
+        """
+        trace = trace or metrics.Trace()
+        prompt, sources, cached, store, prompt_stats = self.prepare_answer(user_query, trace=trace)
+        if cached:
+            self.finish_trace(trace)
+            return cached[1], self._replay(user_query, *cached, record)
+        return sources, self._stream_answer(user_query, prompt, sources, store, prompt_stats, trace, record)
+    
+    def _replay(self, user_query, answer, sources, record):
+        """Generator over an answer that needed no LLM call"""
+        yield answer
+        if record:
+            self._record(user_query, answer, sources)
+    
+    def _stream_answer(self, user_query, prompt, sources, store, prompt_stats, trace, record):
+        parts = []
+        started = time.perf_counter()
+        first_token = None
+        final = None
+        try:
+            stream = self.client.chat(
+                model=self.model_name,
+                messages=self.build_messages(prompt),
+                options=self._llm_options(),
+                keep_alive=self.keep_alive,
+                stream=True
+            )
+            for chunk in stream:
+                token = chunk['message']['content']
+                if token:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    parts.append(token)
+                    yield token
+                if chunk.get('done'):
+                    final = chunk
+        except Exception as e:
+            error = f"Error generating response: {str(e)}"
+            trace.set(error=str(e))
+            self.finish_trace(trace, time.perf_counter() - started, first_token)
+            yield error
+            if record:
+                self._record(user_query, "".join(parts) + error, [])
+            return
+        
+        answer = "".join(parts)
+        llm_seconds = time.perf_counter() - started
+        self.log_request(prompt_stats, llm_seconds, first_token)
+        self.finish_trace(trace, llm_seconds, first_token, final)
+        if store:
+            store(answer)
+        if record:
+            self._record(user_query, answer, sources)
+    
     def clear_history(self):
         """Clear conversation history"""
         self.conversation_history = []
 
 
 if __name__ == "__main__":
+    import argparse
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(description="Chat with your PDF documents")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
     # Test the chatbot
-    config = {
-        'base_url': 'http://localhost:11434',
-        'model': 'mistral',
-        'timeout': 120,
-        'temperature': 0.7,
-        'max_tokens': 2000
-    }
+    settings = get_config(args.profile, args.overrides)
+    print(f"Profile: {settings['profile']}")
     
-    bot = ChatBot(config=config)
+    bot = ChatBot(settings=settings)
     
     while True:
         query = input("\nYou: ")
         if query.lower() in ['exit', 'quit']:
             break
         
-        answer, sources = bot.chat(query)
-        print(f"\nBot: {answer}")
+        sources, stream = bot.chat_stream(query)
+        print("\nBot: ", end="", flush=True)
+        for token in stream:
+            print(token, end="", flush=True)
+        print()
         if sources:
             print(f"\nSources: {', '.join(set(sources))}")
\ No newline at end of file
@@ -0,0 +1,187 @@
+# Token-sized chunks that keep sentences and [TABLE] blocks whole.
+#
+# Page text is split into units (sentences, and the [TABLE]...[/TABLE] blocks
+# written by the parser), every unit of a page is counted in one batch with
+# the embedding model's tokenizer, and consecutive units are packed into
+# chunks of at most max_tokens, so the model sees all of every chunk. The
+# next chunk repeats whole trailing sentences up to overlap_tokens. With
+# stitching on, a page's unfinished last sentence (or a short last chunk) is
+# carried into the first chunk of the next page, which then spans both
+# pages (page_start/page_end).
+
+import re
+from typing import NamedTuple
+
+TABLE_PATTERN = re.compile(r'\[TABLE\].*?\[/TABLE\]', re.S)
+
+# Whitespace after terminal punctuation (optionally closed by a quote or
+# bracket) that is followed by something that can start a sentence
+SENTENCE_BREAK = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])')
+
+# Last words that end in a period without ending the sentence
+ABBREVIATIONS = {"e.g.", "i.e.", "approx.", "vs.", "dr.", "no.", "fig.", "al.", "cf.", "ca."}
+
+TERMINATED = re.compile(r'[.!?:;]["\')\]]*$')
+
+
+def split_sentences(text):
+    """Sentences of text, not split after common abbreviations"""
+    sentences = []
+    for piece in SENTENCE_BREAK.split(text.strip()):
+        if sentences and sentences[-1].rsplit(None, 1)[-1].lower() in ABBREVIATIONS:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        elif piece:
+            sentences.append(piece)
+    return sentences
+
+
+class Unit(NamedTuple):
+    text: str
+    tokens: int
+    table: bool
+
+
+class Chunk(NamedTuple):
+    text: str
+    tokens: int
+    page_start: int
+    page_end: int
+
+
+class Chunker:
+    """Packs the sentences and tables of each page into chunks of max_tokens
+    
+    count_tokens maps a list of texts to their token counts without special
+    tokens (the embedders' count_tokens). Units longer than max_tokens are
+    split on lines, or on words, with a table's header row repeated.
+    """
+    
+    def __init__(self, count_tokens, max_tokens=256, overlap_tokens=32,
+                 min_tokens=64, stitch_pages=True):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = min_tokens
+        self.stitch_pages = stitch_pages
+    
+    def units(self, text):
+        """Sentences and table blocks of one page, token-counted in one batch"""
+        pieces = []
+        position = 0
+        for match in TABLE_PATTERN.finditer(text):
+            pieces.extend((sentence, False) for sentence in split_sentences(text[position:match.start()]))
+            pieces.append((match.group().strip(), True))
+            position = match.end()
+        pieces.extend((sentence, False) for sentence in split_sentences(text[position:]))
+        if not pieces:
+            return []
+        
+        units = []
+        for (piece, table), tokens in zip(pieces, self.count_tokens([piece for piece, _ in pieces])):
+            if tokens > self.max_tokens:
+                units.extend(self._split_oversized(piece, table))
+            else:
+                units.append(Unit(piece, tokens, table))
+        return units
+    
+    def _split_oversized(self, text, table):
+        """Pieces of one long sentence or table that each fit max_tokens"""
+        prefix, suffix, header = "", "", []
+        if table:
+            prefix, suffix = "[TABLE]", "[/TABLE]"
+            text = text[len(prefix):-len(suffix)].strip()
+        
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        separator = "\n"
+        if len(lines) < 2:
+            lines, separator = text.split(), " "
+        elif table:
+            header = lines[:1]
+            lines = lines[1:]
+        
+        # Markers and header are repeated in every piece
+        counts = self.count_tokens(lines + header + [part for part in (prefix, suffix) if part])
+        fixed = sum(counts[len(lines):])
+        budget = max(self.max_tokens - fixed, 1)
+        
+        units = []
+        current, size = [], 0
+        for line, tokens in zip(lines, counts):
+            if current and size + tokens > budget:
+                units.append(self._join_piece(prefix, header + current, suffix, separator, fixed + size, table))
+                current, size = [], 0
+            current.append(line)
+            size += tokens
+        if current:
+            units.append(self._join_piece(prefix, header + current, suffix, separator, fixed + size, table))
+        return units
+    
+    @staticmethod
+    def _join_piece(prefix, lines, suffix, separator, tokens, table):
+        parts = ([prefix] if prefix else []) + lines + ([suffix] if suffix else [])
+        return Unit(separator.join(parts), tokens, table)
+    
+    def _pack(self, units):
+        """(start, end) ranges of units per chunk; start includes the overlap"""
+        ranges = []
+        start, size = 0, 0
+        for i, unit in enumerate(units):
+            if i > start and size + unit.tokens > self.max_tokens:
+                ranges.append((start, i))
+                start = self._overlap_start(units, start, i, self.max_tokens - unit.tokens)
+                size = sum(u.tokens for u in units[start:i])
+            size += unit.tokens
+        if start < len(units):
+            ranges.append((start, len(units)))
+        return ranges
+    
+    def _overlap_start(self, units, start, end, room):
+        """First unit of the trailing sentences of units[start:end] to repeat"""
+        budget = min(self.overlap_tokens, room)
+        first, size = end, 0
+        while first - 1 > start and not units[first - 1].table:
+            size += units[first - 1].tokens
+            if size > budget:
+                break
+            first -= 1
+        return first
+    
+    def tail_length(self, units):
+        """Number of a page's last units to carry into the next page"""
+        if not self.stitch_pages or not units:
+            return 0
+        
+        ranges = self._pack(units)
+        # Units of the last chunk that are not overlap from the chunk before it
+        last_new = ranges[-2][1] if len(ranges) > 1 else 0
+        if sum(unit.tokens for unit in units[last_new:]) < self.min_tokens:
+            n = len(units) - last_new
+        elif not units[-1].table and not TERMINATED.search(units[-1].text):
+            n = 1
+        else:
+            return 0
+        
+        # Never let the carried text take more than half of the next chunk
+        while n and sum(unit.tokens for unit in units[-n:]) > self.max_tokens // 2:
+            n -= 1
+        return n
+    
+    def chunk_page(self, units, page_num, carry=(), carry_page=None, last_page=True):
+        """Chunks of one page and the units it carries into the next page
+        
+        carry are the units carried in from page carry_page; they open the
+        first chunk. Returns (chunks, tail); tail is empty on the last page.
+        """
+        tail = [] if last_page else units[len(units) - self.tail_length(units):]
+        body = units[:len(units) - len(tail)]
+        sequence = list(carry) + body
+        
+        chunks = []
+        for start, end in self._pack(sequence):
+            chunks.append(Chunk(
+                text=" ".join(unit.text for unit in sequence[start:end]),
+                tokens=sum(unit.tokens for unit in sequence[start:end]),
+                page_start=carry_page if start < len(carry) else page_num,
+                page_end=page_num if end > len(carry) else carry_page
+            ))
+        return chunks, tail
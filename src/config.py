@@ -1,29 +1,106 @@
 # Configuration for PDF Chatbot
 
+import json
+import os
+
 OLLAMA_CONFIG = {
     'base_url': 'http://localhost:11434',
     'model': 'mistral',
     'timeout': 120,
     'temperature': 0.7,
-    'max_tokens': 2000
+    'max_tokens': 2000,
+    'context_token_budget': 2000,  # Max retrieved-context tokens sent in the prompt
+    'keep_alive': '30m',    # How long Ollama keeps the model loaded after a request (-1 = forever)
+    'warmup': True,         # Load the model and its system prompt when ChatBot starts
+    'max_concurrency': 4,   # AsyncChatBot: simultaneous Ollama requests
+    'max_queue': 32,        # AsyncChatBot: requests allowed to wait beyond that
+    'retrieval_workers': 4  # AsyncChatBot: threads for embedding/Chroma lookups
 }
 
 # Embedding configuration
 EMBEDDING_CONFIG = {
     'model': 'all-MiniLM-L6-v2',
-    'chunk_size': 500,
-    'chunk_overlap': 50,
-    'n_results': 5  # Number of chunks to retrieve
+    'backend': 'sentence-transformers',  # or 'onnx'
+    'device': 'cpu',
+    'num_threads': 0,  # Torch/ONNX Runtime intra-op threads (0 = library default)
+    'onnx_model_dir': 'models/all-MiniLM-L6-v2-onnx',  # model.onnx + tokenizer.json
+    'quantize': False,  # int8 dynamic quantization (ONNX backend only)
+    'chunk_size': 256,  # Max model tokens per chunk (capped at the model's sequence length)
+    'chunk_overlap': 32,  # Tokens of whole sentences repeated at the start of the next chunk
+    'chunk_min_tokens': 64,  # A shorter last chunk on a page is joined to the next page's first
+    'stitch_pages': True,  # Carry a sentence cut by a page break into the next page's first chunk
+    'n_results': 5,  # Number of chunks to retrieve
+    'route_queries': True,  # Search only the documents whose catalog lists the drugs a question names
+    'route_max_distance': 0.7,  # Routed search falls back to every document if no hit is closer (cosine)
+    'catalog_drug_names': [],  # Drug names to catalog besides those matched by INN stems (src/catalog.py)
+    'catalog_min_mentions': 2,  # Mentions for a stem-matched drug to be listed for a document
+    'catalog_max_drugs': 20,  # Drugs listed per document, most mentioned first
+    'hybrid': True,  # Fuse BM25 keyword hits with vector hits (reciprocal-rank fusion)
+    'fusion_candidates': 20,  # Hits taken from each retriever before fusion
+    'rrf_k': 60,  # RRF constant: higher flattens the weight of top ranks
+    'batch_size': 64,  # Chunks per embedding forward pass
+    'flush_size': 1024,  # Chunks per Chroma write
+    'vector_backend': 'chroma'  # or 'numpy': memory-mapped float16 exact search (src/vector_store.py)
 }
 
 # PDF Parser configuration
 PARSER_CONFIG = {
     'use_ocr': True,              # Enable OCR for scanned PDFs
     'extract_tables': True,        # Extract tables from PDFs
+    'table_detection': True,       # Send only pages that look tabular to the table extractors
+    'table_min_aligned_rows': 3,   # Rows with aligned columns needed to call a page a table
     'denoise_images': True,        # Clean images before OCR
+    'adaptive_preprocessing': True,  # Skip blank pages, denoise only as much as the page needs
+    'blank_ink_fraction': 0.0005,  # Pages with less dark area than this are not OCR'd
+    'noise_thresholds': (0.75, 2.5),  # Estimated noise for light / strong denoising
+    'ocr_fast_dpi': 0,            # OCR at this DPI first, retry at ocr_dpi if unsure (0 = off)
+    'ocr_min_confidence': 70,     # Tesseract mean word confidence that accepts the fast pass
     'min_text_length': 10,         # Min characters to consider valid
     'ocr_dpi': 300,               # DPI for OCR (higher = better quality, slower)
-    'ocr_language': 'eng'         # Tesseract language (eng, fra, deu, etc.)
+    'ocr_language': 'eng',        # Tesseract language (eng, fra, deu, etc.)
+    'workers': 1,                 # Parser processes (0 = all cores, 1 = sequential)
+    'shard_pages': 50,            # Pages per worker task and per write to the output file
+    'output_format': 'jsonl',     # 'jsonl': one page per line, written as parsed; 'json': legacy
+    'compression': 'none',        # Page files: 'none', 'gzip' or 'zstd' (needs zstandard)
+    'render_batch_pages': 16,     # Pages rasterized per poppler call (bounds memory)
+    'ocr_workers': 0,             # OCR threads per document (0 = all cores, 1 = serial)
+    'ocr_max_inflight': 0         # Rendered images queued for OCR (0 = 2 x ocr_workers)
+}
+
+# Query caches in ChatBot (cleared automatically when the index changes)
+CACHE_CONFIG = {
+    'max_size': 512,  # Entries per cache (query embeddings, retrieval results)
+    'ttl': 3600       # Seconds before an entry expires
+}
+
+# Semantic answer cache: skip the LLM for near-identical questions
+RESPONSE_CACHE_CONFIG = {
+    'enabled': True,
+    'path': 'data/response_cache.sqlite',  # Next to data/chromadb
+    'threshold': 0.95,   # Min cosine similarity between query embeddings
+    'max_entries': 2000,
+    'max_mb': 50
+}
+
+# Headless HTTP service (src/api.py)
+API_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8000,
+    'max_batch': 32,    # Searches merged into one encode() + collection.query()
+    'max_wait_ms': 5    # How long the first search waits for others to join
+}
+
+# Pipelined parse -> embed ingestion (src/ingest.py)
+INGEST_CONFIG = {
+    'queue_size': 8,      # Parsed page windows waiting to be embedded (bounds memory)
+    'save_pages': True    # Also write page files for the indexer and later incremental runs
+}
+
+# Stage timings (src/metrics.py), served by the API at /metrics
+METRICS_CONFIG = {
+    'enabled': True,
+    'log_path': None,     # JSON Lines file for request traces and run summaries (None = off)
+    'trace_history': 50   # Recent request traces kept for the API and the app sidebar
 }
 
 # Paths
@@ -31,4 +108,73 @@ PATHS = {
     'pdf_folder': 'data/pdfs',
     'json_folder': 'data/json',
     'db_path': 'data/chromadb'
-}
\ No newline at end of file
+}
+
+# Performance profiles: overrides applied on top of the sections above.
+# Pick one with --profile on the command line or $PDF_CHATBOT_PROFILE.
+PERFORMANCE_PROFILES = {
+    'fast': {
+        'parser': {'ocr_dpi': 200, 'ocr_fast_dpi': 150, 'denoise_images': False,
+                   'render_batch_pages': 32},
+        'embedding': {'n_results': 3},
+        'ollama': {'max_tokens': 512, 'context_token_budget': 1000}
+    },
+    'balanced': {},
+    'accurate': {
+        'parser': {'ocr_dpi': 400, 'render_batch_pages': 8},
+        'embedding': {'n_results': 8},
+        'ollama': {'context_token_budget': 4000}
+    }
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+
+def get_config(profile=None, overrides=None):
+    """Return every config section with a performance profile applied
+    
+    profile defaults to $PDF_CHATBOT_PROFILE, then DEFAULT_PROFILE. overrides
+    is a list of "section.key=value" strings, e.g. "parser.ocr_dpi=200";
+    values are parsed as JSON when possible.
+    """
+    profile = profile or os.environ.get('PDF_CHATBOT_PROFILE') or DEFAULT_PROFILE
+    if profile not in PERFORMANCE_PROFILES:
+        raise ValueError(f"Unknown profile '{profile}' "
+                         f"(choose from {', '.join(PERFORMANCE_PROFILES)})")
+    
+    settings = {
+        'ollama': dict(OLLAMA_CONFIG),
+        'embedding': dict(EMBEDDING_CONFIG),
+        'parser': dict(PARSER_CONFIG),
+        'cache': dict(CACHE_CONFIG),
+        'response_cache': dict(RESPONSE_CACHE_CONFIG),
+        'api': dict(API_CONFIG),
+        'ingest': dict(INGEST_CONFIG),
+        'metrics': dict(METRICS_CONFIG),
+        'paths': dict(PATHS)
+    }
+    for section, values in PERFORMANCE_PROFILES[profile].items():
+        settings[section].update(values)
+    
+    for override in overrides or []:
+        key, sep, value = override.partition('=')
+        section, dot, name = key.strip().partition('.')
+        if not sep or not dot or section not in settings:
+            raise ValueError(f"Invalid override '{override}' (expected section.key=value)")
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass  # Plain string
+        settings[section][name] = value
+    
+    settings['profile'] = profile
+    return settings
+
+
+def add_config_arguments(arg_parser):
+    """Add the shared --profile/--set options to an argparse parser"""
+    arg_parser.add_argument("--profile", choices=list(PERFORMANCE_PROFILES),
+                            help="Performance profile (default: $PDF_CHATBOT_PROFILE or balanced)")
+    arg_parser.add_argument("--set", dest="overrides", action="append", default=[],
+                            metavar="SECTION.KEY=VALUE",
+                            help="Override one setting, e.g. parser.ocr_dpi=200 (repeatable)")
@@ -0,0 +1,107 @@
+def estimate_tokens(text):
+    """Rough LLM token count (~4 characters per token for English text)
+    
+    Good enough for budgeting; the exact count depends on the Ollama model's
+    tokenizer, which is not available locally.
+    """
+    return (len(text) + 3) // 4
+
+
+def merge_overlap(first, second, max_overlap):
+    """Join two texts, dropping words at the start of second that repeat the end of first
+    
+    max_overlap is in tokens (the chunker's overlap); it is turned into a
+    number of words with estimate_tokens over the end of first.
+    """
+    first_words = first.split()
+    second_words = second.split()
+    limit = min(len(first_words), len(second_words))
+    longest = 0
+    while (longest < limit and
+           estimate_tokens(" ".join(first_words[len(first_words) - longest:])) < max_overlap):
+        longest += 1
+    
+    for size in range(longest, 0, -1):
+        if first_words[-size:] == second_words[:size]:
+            return " ".join(first_words + second_words[size:])
+    return " ".join(first_words) + " ... " + " ".join(second_words)
+
+
+def page_label(pages):
+    """'Page 3' or 'Pages 3-4' for a set of page numbers"""
+    first, last = min(pages), max(pages)
+    return f"Page {first}" if first == last else f"Pages {first}-{last}"
+
+
+class ContextBuilder:
+    """Builds the prompt context from retrieved chunks within a token budget
+    
+    Chunks from the same page are merged in chunk order, with the overlap
+    between neighbours sent once. Pages are then added in relevance order
+    (best-ranked chunk first) until budget_tokens is reached; the page that
+    crosses the budget is truncated if a useful amount of room is left.
+    """
+    
+    def __init__(self, budget_tokens=2000, chunk_overlap=50, min_section_tokens=64):
+        self.budget_tokens = budget_tokens
+        self.chunk_overlap = chunk_overlap
+        self.min_section_tokens = min_section_tokens
+    
+    def build(self, results):
+        """Return (context, sources, stats) for Chroma-shaped query results"""
+        if not results.get('documents') or not results['documents'][0]:
+            return "", [], {"chunks": 0, "sections": 0, "raw_tokens": 0, "tokens": 0}
+        
+        documents = results['documents'][0]
+        metadatas = results['metadatas'][0]
+        
+        # Group by page, remembering the best rank seen for each page
+        sections = {}
+        for rank, (doc, metadata) in enumerate(zip(documents, metadatas)):
+            key = (metadata['filename'], metadata['page'])
+            section = sections.setdefault(key, {"rank": rank, "chunks": {}, "pages": set()})
+            section["chunks"][metadata.get('chunk', rank)] = doc
+            # Chunks stitched across a page break start on the previous page
+            section["pages"].update((metadata.get('page_start', metadata['page']),
+                                     metadata.get('page_end', metadata['page'])))
+        
+        merged = []
+        for (filename, _), section in sections.items():
+            text = None
+            previous = None
+            for chunk_idx in sorted(section["chunks"]):
+                doc = section["chunks"][chunk_idx]
+                if text is None:
+                    text = doc
+                elif chunk_idx == previous + 1:
+                    text = merge_overlap(text, doc, self.chunk_overlap)
+                else:
+                    text = text + " ... " + doc
+                previous = chunk_idx
+            merged.append((section["rank"], filename, page_label(section["pages"]), text))
+        
+        merged.sort(key=lambda item: item[0])
+        
+        context_parts = []
+        sources = []
+        used = 0
+        for _, filename, pages, text in merged:
+            tokens = estimate_tokens(text)
+            remaining = self.budget_tokens - used
+            if tokens > remaining:
+                if remaining < self.min_section_tokens:
+                    break
+                # Truncate on a word boundary to fit what is left
+                text = text[:remaining * 4].rsplit(" ", 1)[0]
+                tokens = estimate_tokens(text)
+            context_parts.append(text)
+            sources.append(f"{filename} ({pages})")
+            used += tokens
+        
+        stats = {
+            "chunks": len(documents),
+            "sections": len(context_parts),
+            "raw_tokens": sum(estimate_tokens(doc) for doc in documents),
+            "tokens": used
+        }
+        return "\n\n".join(context_parts), sources, stats
@@ -0,0 +1,162 @@
+import os
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+# Optional ONNX Runtime backend
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+class SentenceTransformerEmbedder(EmbeddingFunction):
+    """SentenceTransformer on CPU, used for both indexing and querying
+    
+    Registered as the collection's embedding function, so Chroma embeds
+    query_texts with the same model that produced the stored vectors.
+    """
+    
+    def __init__(self, model_name, device='cpu', num_threads=0, batch_size=64):
+        from sentence_transformers import SentenceTransformer
+        
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        
+        # Text tokens the model reads per input: its sequence length minus [CLS]/[SEP]
+        special_tokens = len(self.model.tokenizer("")["input_ids"])
+        self.max_tokens = self.model.max_seq_length - special_tokens
+    
+    def count_tokens(self, texts):
+        """Tokens per text, without special tokens or truncation, in one batch"""
+        encoded = self.model.tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            truncation=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+    
+    def encode(self, texts, batch_size=None):
+        """Embed texts into a (n, dim) float32 array of normalized vectors"""
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size or self.batch_size,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    
+    def __call__(self, input):
+        return self.encode(input).tolist()
+
+
+class OnnxEmbedder(EmbeddingFunction):
+    """ONNX Runtime encoder with mean pooling, optionally int8-quantized
+    
+    model_dir must contain model.onnx and tokenizer.json, e.g. an
+    `optimum-cli export onnx` of the sentence-transformers model, or Chroma's
+    cached copy in ~/.cache/chroma/onnx_models/all-MiniLM-L6-v2/onnx.
+    """
+    
+    def __init__(self, model_dir, num_threads=0, quantize=False, batch_size=64, max_length=256):
+        if not ONNX_AVAILABLE:
+            raise ImportError("ONNX backend needs onnxruntime and tokenizers installed")
+        
+        model_path = os.path.join(model_dir, "model.onnx")
+        if quantize:
+            model_path = self._quantize(model_path)
+        
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        
+        # Untruncated copy for sizing chunks
+        self.counter = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.counter.no_truncation()
+        self.counter.no_padding()
+        self.max_tokens = max_length - len(self.counter.encode("").ids)
+        self.model_name = model_path
+        self.batch_size = batch_size
+    
+    @staticmethod
+    def _quantize(model_path):
+        """Dynamic int8 quantization, cached next to the fp32 model"""
+        quantized_path = model_path.replace(".onnx", "_int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            print(f"Quantizing {model_path} to int8...")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+    
+    def count_tokens(self, texts):
+        """Tokens per text, without special tokens or truncation, in one batch"""
+        encoded = self.counter.encode_batch(list(texts), add_special_tokens=False)
+        return [len(e.ids) for e in encoded]
+    
+    def encode(self, texts, batch_size=None):
+        """Embed texts into a (n, dim) float32 array of normalized vectors"""
+        texts = list(texts)
+        batch_size = batch_size or self.batch_size
+        batches = []
+        
+        for i in range(0, len(texts), batch_size):
+            encoded = self.tokenizer.encode_batch(texts[i:i + batch_size])
+            mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encoded], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encoded], dtype=np.int64)
+            }
+            feeds = {name: value for name, value in feeds.items() if name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            
+            # Mean pooling over real tokens, then L2 normalization
+            summed = (hidden * mask[:, :, None]).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1, keepdims=True), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            batches.append((pooled / np.clip(norms, 1e-12, None)).astype(np.float32))
+        
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(batches)
+    
+    def __call__(self, input):
+        return self.encode(input).tolist()
+
+
+def create_embedder(config):
+    """Build the embedding backend described by an EMBEDDING_CONFIG section"""
+    backend = config.get('backend', 'sentence-transformers')
+    
+    if backend == 'onnx':
+        return OnnxEmbedder(
+            config['onnx_model_dir'],
+            num_threads=config.get('num_threads', 0),
+            quantize=config.get('quantize', False),
+            batch_size=config.get('batch_size', 64)
+        )
+    if backend == 'sentence-transformers':
+        return SentenceTransformerEmbedder(
+            config.get('model', 'all-MiniLM-L6-v2'),
+            device=config.get('device', 'cpu'),
+            num_threads=config.get('num_threads', 0),
+            batch_size=config.get('batch_size', 64)
+        )
+    raise ValueError(f"Unknown embedding backend '{backend}'")
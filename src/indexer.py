@@ -1,113 +1,622 @@
 import os
 import json
+import time
+import hashlib
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 
+import metrics
+from catalog import DocumentCatalog
+from chunker import Chunker
+from config import get_config
+from embeddings import create_embedder
+from lexical_index import BM25Index
+import page_store
+from vector_store import VectorStore
+
+
+def _with_last(items):
+    """(item, is_last) for each item of an iterable, reading one item ahead"""
+    iterator = iter(items)
+    try:
+        item = next(iterator)
+    except StopIteration:
+        return
+    for following in iterator:
+        yield item, False
+        item = following
+    yield item, True
+
+
+class IndexRun:
+    """State of one indexing run: manifest entries, pending chunks, counters"""
+    
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.old_files = manifest["files"]
+        self.new_files = {}
+        self.previous_names = {}  # PDF filename -> manifest key of a removed page file
+        self.renamed = set()
+        self.stale_ids = []
+        self.changed_files = set()  # PDF filenames with chunks written this run
+        self.profiled = set()  # Manifest keys whose catalog entry was rebuilt this run
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.total_chunks = 0
+        self.changed_pages = 0
+        self.unchanged_files = 0
+        self.embed_seconds = 0.0
+        self.start_time = time.perf_counter()
+    
+    def add(self, chunk_id, document, metadata):
+        self.ids.append(chunk_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self.changed_files.add(metadata["filename"])
+        self.total_chunks += 1
+
 
 class EmbeddingIndexer:
-    def __init__(self, json_folder="data/json", db_path="data/chromadb"):
-        self.json_folder = json_folder
-        self.db_path = db_path
+    def __init__(self, json_folder=None, db_path=None,
+                 batch_size=None, flush_size=None, config=None):
+        settings = get_config()
+        self.json_folder = json_folder or settings['paths']['json_folder']
+        self.db_path = db_path or settings['paths']['db_path']
+        self.manifest_path = os.path.join(self.db_path, "index_manifest.json")
+        
+        # Configuration: the 'embedding' section of the active profile by default
+        config = config or settings['embedding']
+        self.config = config
+        self.model_name = config.get('model', 'all-MiniLM-L6-v2')
+        self.chunk_size = config.get('chunk_size', 256)
+        self.chunk_overlap = config.get('chunk_overlap', 32)
+        self.chunk_min_tokens = config.get('chunk_min_tokens', 64)
+        self.stitch_pages = config.get('stitch_pages', True)
+        self.n_results = config.get('n_results', 5)
+        
+        # Batching: chunks per encode() forward pass, chunks per Chroma write
+        self.batch_size = batch_size or config.get('batch_size', 64)
+        self.flush_size = flush_size or config.get('flush_size', 1024)
+        
+        # Keyword index next to the collection, fused with vector hits at query time
+        self.hybrid = config.get('hybrid', True)
+        self.fusion_candidates = config.get('fusion_candidates', 20)
+        self.rrf_k = config.get('rrf_k', 60)
+        self.lexical_index = BM25Index(os.path.join(self.db_path, "bm25"))
+        
+        # Title, page count and drug names per document, for filtered and routed search
+        self.catalog = DocumentCatalog(os.path.join(self.db_path, "catalog.json"),
+                                       drug_names=config.get('catalog_drug_names', []),
+                                       max_drugs=config.get('catalog_max_drugs', 20),
+                                       min_mentions=config.get('catalog_min_mentions', 2))
         
-        # Load embedding model
+        # Load embedding model: one backend for index-time and query-time vectors
         print("Loading embedding model...")
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.embedding_model = create_embedder(config)
         
-        # Initialize ChromaDB
-        self.client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.client.get_or_create_collection(
-            name="pdf_documents",
-            metadata={"hnsw:space": "cosine"}
+        # Chunks are sized in the model's own tokens and never exceed what it reads
+        self.chunk_tokens = min(self.chunk_size, self.embedding_model.max_tokens)
+        self.chunker = Chunker(
+            self.embedding_model.count_tokens,
+            max_tokens=self.chunk_tokens,
+            overlap_tokens=self.chunk_overlap,
+            min_tokens=self.chunk_min_tokens,
+            stitch_pages=self.stitch_pages
         )
+        
+        # Vector store: ChromaDB (HNSW) or memory-mapped exact search. Either way
+        # our backend is the embedding function, so Chroma never loads its own
+        self.vector_backend = config.get('vector_backend', 'chroma')
+        if self.vector_backend == 'numpy':
+            self.client = None
+        elif self.vector_backend == 'chroma':
+            self.client = chromadb.PersistentClient(path=self.db_path)
+        else:
+            raise ValueError(f"Unknown vector_backend: {self.vector_backend}")
+        self.collection = self._get_collection()
+        
+        # Chroma rejects writes above its max batch size
+        max_batch_size = getattr(self.client, 'max_batch_size', None)
+        if max_batch_size:
+            self.flush_size = min(self.flush_size, max_batch_size)
+        
+        # Pay the first forward pass at startup rather than on the first query
+        self.embedding_model.encode(["warmup"])
         print("Embedding model loaded!")
     
-    def chunk_text(self, text, chunk_size=500, overlap=50):
-        """Split text into chunks with overlap"""
-        words = text.split()
-        chunks = []
-        
-        for i in range(0, len(words), chunk_size - overlap):
-            chunk = ' '.join(words[i:i + chunk_size])
-            if chunk.strip():
-                chunks.append(chunk)
+    def _get_collection(self):
+        if self.client is None:
+            return VectorStore(os.path.join(self.db_path, "vectors"),
+                               embedding_function=self.embedding_model)
+        return self.client.get_or_create_collection(
+            name="pdf_documents",
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=self.embedding_model
+        )
+    
+    def chunk_text(self, text):
+        """Split one page's text into token-sized chunks, without stitching"""
+        chunks, _ = self.chunker.chunk_page(self.chunker.units(text), 0)
+        return [chunk.text for chunk in chunks]
+    
+    def _page_hash(self, content_hash, previous_hash, last_page):
+        """Manifest hash of a page's chunks
         
-        return chunks
+        With stitching a page's chunks also depend on the text carried in
+        from the previous page and on whether it is the last page.
+        """
+        if not self.stitch_pages:
+            return content_hash
+        key = f"{previous_hash or ''}:{content_hash}:{int(last_page)}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+    
+    def _load_manifest(self):
+        """Load the per-file/per-page hash manifest of what is indexed"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save_manifest(self, manifest):
+        """Write the manifest atomically so a crash never leaves it half-written"""
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+    
+    def _reset_collection(self):
+        """Drop and recreate the collection (cheaper than get() + delete())"""
+        if self.client is None:
+            self.collection.reset()
+            return
+        self.client.delete_collection(name="pdf_documents")
+        self.collection = self._get_collection()
+    
+    def _persist(self):
+        """Chroma persists every write; the numpy store writes its files once per run"""
+        if self.client is None:
+            self.collection.persist()
+    
+    @staticmethod
+    def chunk_id(filename, page_num, chunk_idx):
+        """Deterministic chunk ID: same file/page/chunk always maps to the same ID"""
+        return f"{filename}::p{page_num}::c{chunk_idx}"
     
-    def index_documents(self):
-        """Load JSONs and create embeddings"""
-        json_files = list(Path(self.json_folder).glob("*.json"))
+    def _page_ids(self, filename, page_num, n_chunks):
+        return [self.chunk_id(filename, page_num, i) for i in range(n_chunks)]
+    
+    def _delete(self, ids):
+        """Delete chunk IDs from the collection in flush-sized batches"""
+        for i in range(0, len(ids), self.flush_size):
+            self.collection.delete(ids=ids[i:i + self.flush_size])
+    
+    def index_documents(self, full_rebuild=False):
+        """Read parsed page files and embed new or changed pages only"""
+        json_files = page_store.list_documents(self.json_folder)
+        run = self.start_run(full_rebuild)
         
-        if not json_files:
-            print(f"No JSON files found in {self.json_folder}")
+        if not json_files and not run.old_files:
+            print(f"No parsed documents found in {self.json_folder}")
             return
         
-        print(f"Found {len(json_files)} JSON files to index")
+        print(f"Found {len(json_files)} parsed documents to index")
         
-        # Clear existing collection if it has data
-        try:
-            count = self.collection.count()
-            if count > 0:
-                # Get all IDs and delete them
-                all_data = self.collection.get()
-                if all_data['ids']:
-                    self.collection.delete(ids=all_data['ids'])
-                    print(f"Cleared {count} existing documents")
-        except Exception as e:
-            print(f"Note: {e}")
-        
-        doc_id = 0
+        # A PDF re-parsed into another format (e.g. .json -> .pages.jsonl) keeps
+        # its manifest entry, so unchanged pages are not embedded again
+        current_names = {json_file.name for json_file in json_files}
+        run.previous_names = {entry["filename"]: json_name
+                              for json_name, entry in run.old_files.items()
+                              if json_name not in current_names}
         
         for json_file in json_files:
-            print(f"Indexing: {json_file.name}")
+            stat = json_file.stat()
+            old_entry = run.old_files.get(json_file.name)
             
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # Skip files whose JSON has not been touched since last run (entries
+            # from before the catalog existed are read once more to fill it in)
+            if (old_entry and old_entry["mtime_ns"] == stat.st_mtime_ns
+                    and old_entry["size"] == stat.st_size and "document" in old_entry):
+                run.new_files[json_file.name] = old_entry
+                run.unchanged_files += 1
+                continue
             
-            filename = data['filename']
-            
-            for page in data['pages']:
+            filename = page_store.read_filename(json_file)
+            self.index_document(run, json_file.name, filename,
+                                page_store.iter_pages(json_file), stat)
+        
+        # Documents ingested without a page file (ingest.py --no-save-pages) are
+        # not missing; ingest.py removes them when their PDF is deleted
+        for json_name, old_entry in run.old_files.items():
+            if old_entry.get("page_file") is False and json_name not in run.new_files \
+                    and json_name not in run.renamed:
+                run.new_files[json_name] = old_entry
+        
+        self.finish_run(run)
+    
+    def start_run(self, full_rebuild=False):
+        """Begin an indexing run: load the manifest, resetting the index if it is unusable"""
+        manifest = self._load_manifest()
+        
+        # An index built before the manifest existed uses running doc_{n} IDs
+        # that cannot be matched to pages, so it has to be rebuilt once
+        if manifest is None and self.collection.count() > 0:
+            print("No index manifest found, rebuilding existing collection")
+            full_rebuild = True
+        
+        # Vectors and chunk boundaries depend on these, so a change invalidates everything
+        index_settings = {
+            "model": self.model_name,
+            "backend": self.config.get('backend', 'sentence-transformers'),
+            "quantize": self.config.get('quantize', False),
+            "chunker": "sentence-tokens",
+            "chunk_tokens": self.chunk_tokens,
+            "chunk_overlap": self.chunk_overlap,
+            "chunk_min_tokens": self.chunk_min_tokens,
+            "stitch_pages": self.stitch_pages
+        }
+        # Only recorded for the non-default store, so existing Chroma indexes stay valid
+        if self.vector_backend != 'chroma':
+            index_settings["vector_backend"] = self.vector_backend
+        if manifest is not None and manifest.get("settings") != index_settings:
+            print("Embedding model, chunking or vector store settings changed, rebuilding index")
+            full_rebuild = True
+        
+        if full_rebuild:
+            self._reset_collection()
+            manifest = None
+        
+        if manifest is None:
+            manifest = {"files": {}}
+        manifest["settings"] = index_settings
+        return IndexRun(manifest)
+    
+    def index_document(self, run, key, filename, pages, stat=None):
+        """Embed the new or changed pages of one document
+        
+        key is the document's manifest entry (its page file name), pages any
+        iterable of page records, stat the page file's os.stat() if it exists.
+        If reading pages fails, the document keeps its previous manifest entry
+        and the error is re-raised.
+        """
+        old_entry = run.old_files.get(key)
+        if old_entry is None and filename in run.previous_names:
+            run.renamed.add(run.previous_names[filename])
+            old_entry = run.old_files[run.previous_names[filename]]
+        
+        stale_mark = len(run.stale_ids)
+        old_pages = {}
+        if old_entry:
+            old_pages = dict(old_entry["pages"])
+            # File was re-parsed under a different name; drop the old chunks
+            if old_entry["filename"] != filename:
+                for page_key, page_entry in old_pages.items():
+                    run.stale_ids.extend(self._page_ids(
+                        old_entry["filename"], page_key, page_entry["chunks"]))
+                old_pages = {}
+        
+        new_pages = {}
+        file_changed_pages = 0
+        profile = self.catalog.profile(filename)
+        
+        # Carrying text across a page break needs the previous page's text and
+        # whether another page follows
+        previous = None  # (page_num, text, content_hash, tail or None if not chunked)
+        
+        try:
+            for page, last_page in _with_last(pages):
                 page_num = page['page_number']
                 text = page['text']
+                profile.add_page(page)
+                content_hash = page.get('content_hash') or \
+                    hashlib.sha256(text.encode('utf-8')).hexdigest()
+                page_hash = self._page_hash(content_hash, previous and previous[2], last_page)
                 
-                if not text.strip():
+                page_key = str(page_num)
+                old_page = old_pages.pop(page_key, None)
+                if old_page and old_page["hash"] == page_hash:
+                    new_pages[page_key] = old_page
+                    previous = (page_num, text, content_hash, None)
                     continue
                 
-                # Chunk the text
-                chunks = self.chunk_text(text)
+                with metrics.REGISTRY.timer('chunk'):
+                    carry, carry_page = (), None
+                    if self.stitch_pages and previous:
+                        carry_page, previous_text, _, carry = previous
+                        if carry is None:
+                            units = self.chunker.units(previous_text)
+                            carry = units[len(units) - self.chunker.tail_length(units):]
+                    chunks, tail = self.chunker.chunk_page(
+                        self.chunker.units(text), page_num, carry, carry_page, last_page)
+                previous = (page_num, text, content_hash, tail)
+                
+                # Changed page: upserts overwrite the first chunks, the rest are stale
+                if old_page:
+                    run.stale_ids.extend(
+                        self.chunk_id(filename, page_num, i)
+                        for i in range(len(chunks), old_page["chunks"])
+                    )
+                
+                new_pages[page_key] = {"hash": page_hash, "chunks": len(chunks)}
+                file_changed_pages += 1
                 
+                # A chunk is stored under the page that ends it; page_start/page_end
+                # give the pages its text comes from
                 for chunk_idx, chunk in enumerate(chunks):
-                    # Create metadata
-                    metadata = {
+                    run.add(self.chunk_id(filename, page_num, chunk_idx), chunk.text, {
                         "filename": filename,
                         "page": page_num,
-                        "chunk": chunk_idx
-                    }
+                        "chunk": chunk_idx,
+                        "page_start": chunk.page_start,
+                        "page_end": chunk.page_end,
+                        "tokens": chunk.tokens,
+                        "content_hash": page_hash
+                    })
                     
-                    # Add to collection
-                    self.collection.add(
-                        documents=[chunk],
-                        metadatas=[metadata],
-                        ids=[f"doc_{doc_id}"]
-                    )
-                    
-                    doc_id += 1
-            
-            print(f"  ✓ Indexed {filename}")
+                    # Flush in large multi-chunk writes
+                    if len(run.ids) >= self.flush_size:
+                        self._flush_run(run)
+        except BaseException:
+            # Chunks already written are valid; keep the old entry so the
+            # pages are compared again next time, and delete nothing
+            del run.stale_ids[stale_mark:]
+            if old_entry:
+                run.new_files[key] = old_entry
+            raise
+        
+        # Pages that disappeared from the file
+        for page_key, page_entry in old_pages.items():
+            run.stale_ids.extend(self._page_ids(filename, page_key, page_entry["chunks"]))
+        
+        run.new_files[key] = {
+            "filename": filename,
+            "mtime_ns": stat.st_mtime_ns if stat else 0,
+            "size": stat.st_size if stat else 0,
+            "pages": new_pages,
+            "document": profile.entry()
+        }
+        run.profiled.add(key)
+        run.changed_pages += file_changed_pages
+        print(f"  ✓ Indexed {filename} ({file_changed_pages} new/changed pages)")
+    
+    def finish_run(self, run, remove_missing=True):
+        """Write what is buffered, delete stale chunks and save the manifest
+        
+        remove_missing drops documents that were not seen in this run (their
+        page file was deleted); otherwise they are kept as they are.
+        """
+        # Files that were deleted from the JSON folder
+        for json_name, old_entry in run.old_files.items():
+            if json_name in run.new_files or json_name in run.renamed:
+                continue
+            if not remove_missing:
+                run.new_files[json_name] = old_entry
+                continue
+            print(f"  ✗ Removing {old_entry['filename']}")
+            for page_key, page_entry in old_entry["pages"].items():
+                run.stale_ids.extend(self._page_ids(
+                    old_entry["filename"], page_key, page_entry["chunks"]))
+        
+        if run.ids:
+            self._flush_run(run)
+        
+        if run.stale_ids:
+            self._delete(run.stale_ids)
+        self._persist()
+        
+        elapsed = time.perf_counter() - run.start_time
+        rate = run.total_chunks / elapsed if elapsed > 0 else 0.0
+        
+        if self.hybrid:
+            # Chunk IDs start with the PDF filename
+            changed = run.changed_files | {chunk_id.rsplit("::", 2)[0] for chunk_id in run.stale_ids}
+            if changed or not self.lexical_index.exists():
+                self.update_lexical_index(changed, [entry["filename"] for entry in run.new_files.values()])
+        
+        catalog_key = self.catalog.settings_key()
+        if run.manifest.get("catalog_settings") != catalog_key:
+            self._refresh_catalog(run)
+        run.manifest["catalog_settings"] = catalog_key
+        self.catalog.save([entry["document"] for entry in run.new_files.values()
+                           if entry.get("document")])
+        
+        # Saved last: its mtime is the index version readers compare against
+        run.manifest["files"] = run.new_files
+        self._save_manifest(run.manifest)
+        metrics.REGISTRY.log_summary("index")
+        
+        print(f"\nIndexing complete! {run.changed_pages} new/changed pages, "
+              f"{run.total_chunks} chunks embedded, {len(run.stale_ids)} stale chunks removed, "
+              f"{run.unchanged_files} files unchanged")
+        print(f"  Total chunks in collection: {self.collection.count()}")
+        print(f"  {elapsed:.1f}s, {rate:.1f} chunks/sec, {run.embed_seconds:.1f}s embedding "
+              f"(batch_size={self.batch_size}, flush_size={self.flush_size})")
+    
+    def _refresh_catalog(self, run):
+        """Rebuild the catalog entries of files not read this run from their page files
         
-        print(f"\nIndexing complete! Total chunks: {doc_id}")
+        Needed when the catalog settings changed; documents without a page
+        file (ingest.py --no-save-pages) keep their entry until re-ingested.
+        """
+        refreshed = 0
+        for key, entry in run.new_files.items():
+            page_file = Path(self.json_folder) / key
+            if key in run.profiled or not page_file.exists():
+                continue
+            profile = self.catalog.profile(entry["filename"])
+            for page in page_store.iter_pages(page_file):
+                profile.add_page(page)
+            entry["document"] = profile.entry()
+            refreshed += 1
+        if refreshed:
+            print(f"  Catalog settings changed: {refreshed} catalog entries rebuilt")
     
-    def search(self, query, n_results=5):
-        """Search for relevant chunks"""
+    def _flush_run(self, run):
+        start_time = time.perf_counter()
+        self._flush(run.ids, run.documents, run.metadatas)
+        run.embed_seconds += time.perf_counter() - start_time
+        run.ids, run.documents, run.metadatas = [], [], []
+    
+    def _document_chunks(self, filename):
+        """(chunk_id, text) for every chunk of one document, read in pages"""
+        offset = 0
+        while True:
+            page = self.collection.get(where={"filename": filename}, include=["documents"],
+                                       limit=self.flush_size, offset=offset)
+            if not page['ids']:
+                break
+            yield from zip(page['ids'], page['documents'])
+            offset += len(page['ids'])
+    
+    def update_lexical_index(self, changed, filenames):
+        """Re-read the changed documents into the BM25 index and swap in the result"""
+        start_time = time.perf_counter()
+        n_chunks, n_terms, n_read = self.lexical_index.update(changed, filenames, self._document_chunks)
+        print(f"  BM25 index: {n_chunks} chunks, {n_terms} terms, {n_read} documents re-read "
+              f"in {time.perf_counter() - start_time:.1f}s")
+    
+    def _flush(self, ids, documents, metadatas):
+        """Embed a batch of chunks and write it to the collection in one call"""
+        with metrics.REGISTRY.timer('embed'):
+            embeddings = self.embedding_model.encode(documents, batch_size=self.batch_size)
+        
+        with metrics.REGISTRY.timer('upsert'):
+            self.collection.upsert(
+                ids=ids,
+                documents=documents,
+                embeddings=embeddings.tolist(),
+                metadatas=metadatas
+            )
+    
+    def index_version(self):
+        """Changes whenever index_documents writes, even from another process"""
+        try:
+            return os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def embed_query(self, query):
+        """Embed one query with the collection's embedding backend"""
+        return self.embedding_model.encode([query])[0].tolist()
+    
+    def _use_hybrid(self):
+        return self.hybrid and self.lexical_index.exists()
+    
+    def search_batch(self, query_embeddings, n_results=None, queries=None, where=None):
+        """One collection.query for many queries; returns per-query results
+        
+        Each item has the same shape as search() (lists nested one level).
+        Pass the query texts as well to fuse in BM25 hits, and a Chroma
+        where clause (e.g. from catalog.where()) to search only some chunks.
+        """
+        n_results = n_results or self.n_results
+        hybrid = queries is not None and self._use_hybrid()
         results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
+            query_embeddings=query_embeddings,
+            n_results=max(n_results, self.fusion_candidates) if hybrid else n_results,
+            where=where
         )
+        keys = [key for key in ('ids', 'documents', 'metadatas', 'distances')
+                if results.get(key) is not None]
+        per_query = [
+            {key: [results[key][i]] for key in keys}
+            for i in range(len(query_embeddings))
+        ]
+        if hybrid:
+            per_query = [
+                self._fuse(query, vector_results, embedding, n_results, where)
+                for query, vector_results, embedding in zip(queries, per_query, query_embeddings)
+            ]
+        return per_query
+    
+    def search(self, query, n_results=None, query_embedding=None, where=None):
+        """Search for relevant chunks
         
-        return results
+        Pass a precomputed query_embedding to skip embedding the query text.
+        With hybrid retrieval on, vector and BM25 hits are fused (RRF).
+        where is a Chroma where clause, e.g.
+        self.catalog.where(filenames=["label.pdf"], drugs=["metformin"]).
+        """
+        n_results = n_results or self.n_results
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        return self.search_batch([query_embedding], n_results=n_results,
+                                 queries=[query], where=where)[0]
+    
+    def _fuse(self, query, vector_results, query_embedding, n_results, where=None):
+        """Reciprocal-rank fusion of vector and BM25 hits, in Chroma's result shape
+        
+        Chunks found only by BM25 are fetched from the collection; their
+        distance is computed from the stored embedding so all hits stay
+        comparable.
+        """
+        vector_ids = vector_results['ids'][0]
+        if where is None:
+            lexical_ids = [chunk_id for chunk_id, _ in
+                           self.lexical_index.search(query, self.fusion_candidates)]
+        else:
+            # The BM25 index covers every chunk: over-fetch, then keep the ones the filter allows
+            candidates = [chunk_id for chunk_id, _ in
+                          self.lexical_index.search(query, self.fusion_candidates * 5)]
+            allowed = set(self.collection.get(ids=candidates, where=where, include=[])['ids']) \
+                if candidates else set()
+            lexical_ids = [chunk_id for chunk_id in candidates
+                           if chunk_id in allowed][:self.fusion_candidates]
+        
+        scores = {}
+        for ranked in (vector_ids, lexical_ids):
+            for rank, chunk_id in enumerate(ranked):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        fused = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        
+        hits = {
+            chunk_id: (doc, metadata, distance)
+            for chunk_id, doc, metadata, distance in zip(
+                vector_ids, vector_results['documents'][0],
+                vector_results['metadatas'][0], vector_results['distances'][0])
+        }
+        missing = [chunk_id for chunk_id in fused if chunk_id not in hits]
+        if missing:
+            found = self.collection.get(ids=missing,
+                                        include=["documents", "metadatas", "embeddings"])
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1.0
+            for chunk_id, doc, metadata, embedding in zip(
+                    found['ids'], found['documents'], found['metadatas'], found['embeddings']):
+                vector = np.asarray(embedding, dtype=np.float32)
+                similarity = float(np.dot(query_vector, vector) / (np.linalg.norm(vector) or 1.0))
+                hits[chunk_id] = (doc, metadata, 1.0 - similarity)
+        
+        # A chunk can vanish between the two lookups if the index is being updated
+        fused = [chunk_id for chunk_id in fused if chunk_id in hits]
+        return {
+            'ids': [fused],
+            'documents': [[hits[chunk_id][0] for chunk_id in fused]],
+            'metadatas': [[hits[chunk_id][1] for chunk_id in fused]],
+            'distances': [[hits[chunk_id][2] for chunk_id in fused]]
+        }
 
 
 if __name__ == "__main__":
-    indexer = EmbeddingIndexer()
-    indexer.index_documents()
\ No newline at end of file
+    import argparse
+    
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(description="Index parsed PDF JSON into the vector store")
+    arg_parser.add_argument("--rebuild", action="store_true",
+                            help="Drop the collection and re-embed everything")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    settings = get_config(args.profile, args.overrides)
+    print(f"Profile: {settings['profile']}")
+    metrics.configure(settings['metrics'])
+    
+    indexer = EmbeddingIndexer(
+        json_folder=settings['paths']['json_folder'],
+        db_path=settings['paths']['db_path'],
+        config=settings['embedding']
+    )
+    indexer.index_documents(full_rebuild=args.rebuild)
\ No newline at end of file
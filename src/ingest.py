@@ -0,0 +1,262 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import metrics
+import page_store
+from config import get_config
+from indexer import EmbeddingIndexer
+from pdf_parser import AdvancedPDFParser, limit_ocr_threads
+
+# Marks the end of the parsed windows on the queue
+_DONE = object()
+
+
+class ShardError(Exception):
+    """A page window of a PDF could not be parsed"""
+
+
+class IngestPipeline:
+    """Parse PDFs and index their pages at the same time
+    
+    Parser processes extract page windows (the parser's shards) and a feeder
+    thread puts finished windows, in page order, on a bounded queue. The
+    calling thread chunks, embeds and upserts them as they arrive, so OCR of
+    later pages overlaps with embedding of earlier ones and wall time
+    approaches the slower of the two stages instead of their sum. A full
+    queue stalls parsing rather than buffering pages without bound.
+    
+    PDFs whose size and modification time match their manifest entry are
+    not parsed again, and documents whose PDF left the folder are removed
+    from the index. Page files are written as a side output when save_pages
+    is set, which keeps later `indexer.py` runs incremental; without them,
+    manifest entries are marked so `indexer.py` keeps those documents.
+    """
+    
+    def __init__(self, settings=None, parser=None, indexer=None):
+        settings = settings or get_config()
+        metrics.configure(settings.get('metrics'))
+        paths = settings['paths']
+        self.parser = parser or AdvancedPDFParser(
+            pdf_folder=paths['pdf_folder'],
+            json_folder=paths['json_folder'],
+            config=settings['parser']
+        )
+        self.indexer = indexer or EmbeddingIndexer(
+            json_folder=paths['json_folder'],
+            db_path=paths['db_path'],
+            config=settings['embedding']
+        )
+        
+        ingest_config = settings.get('ingest', {})
+        self.queue_size = ingest_config.get('queue_size', 8)
+        self.save_pages = ingest_config.get('save_pages', True)
+        self.parse_seconds = 0.0
+        self._stop = threading.Event()
+    
+    def run(self, workers=None, full_rebuild=False):
+        """Ingest every PDF in the parser's folder; returns errors grouped by file"""
+        pdf_files = sorted(Path(self.parser.pdf_folder).glob("*.pdf"))
+        if not pdf_files:
+            print(f"No PDF files found in {self.parser.pdf_folder}")
+            return {}
+        
+        if workers is None:
+            workers = self.parser.workers
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        workers = max(1, workers)
+        
+        start_time = time.perf_counter()
+        run = self.indexer.start_run(full_rebuild)
+        keys = {pdf_file: self._key(pdf_file) for pdf_file in pdf_files}
+        run.previous_names = {entry["filename"]: name for name, entry in run.old_files.items()
+                              if name not in keys.values()}
+        
+        # PDFs not touched since they were ingested keep their entry as it is
+        changed_files = []
+        for pdf_file in pdf_files:
+            entry = run.old_files.get(keys[pdf_file])
+            stat = pdf_file.stat()
+            if (entry and "document" in entry and entry.get("pdf_mtime_ns") == stat.st_mtime_ns
+                    and entry.get("pdf_size") == stat.st_size):
+                run.new_files[keys[pdf_file]] = entry
+                run.unchanged_files += 1
+            else:
+                changed_files.append(pdf_file)
+        
+        shards = self.parser.plan_shards(changed_files, self.parser.shard_pages)
+        shard_counts = {}
+        for pdf_file, _, _ in shards:
+            shard_counts[pdf_file] = shard_counts.get(pdf_file, 0) + 1
+        
+        print(f"Ingesting {len(changed_files)} new/changed PDFs ({len(shards)} page windows) "
+              f"with {workers} parser processes, {run.unchanged_files} unchanged")
+        
+        windows = queue.Queue(maxsize=self.queue_size)
+        self._stop.clear()
+        feeder = threading.Thread(target=self._feed, args=(shards, workers, windows),
+                                  name="ingest-feeder", daemon=True)
+        feeder.start()
+        
+        errors = {}
+        try:
+            item = windows.get()
+            while item is not _DONE:
+                item = self._ingest_pdf(run, item, windows, shard_counts, keys, errors)
+        finally:
+            self._stop.set()
+            feeder.join()
+        
+        # Documents whose PDF is no longer in the folder are removed, with their
+        # page file so a later `indexer.py` run does not index them again
+        self.indexer.finish_run(run)
+        for name in run.old_files:
+            page_file = Path(self.parser.json_folder) / name
+            if name not in run.new_files and name not in run.renamed and page_file.exists():
+                page_file.unlink()
+        
+        elapsed = time.perf_counter() - start_time
+        print(f"\nIngestion complete! {len(changed_files) - len(errors)}/{len(changed_files)} files "
+              f"in {elapsed:.1f}s (parsing {self.parse_seconds:.1f}s, "
+              f"embedding {run.embed_seconds:.1f}s)")
+        for name, file_errors in errors.items():
+            print(f"  ✗ {name}: {'; '.join(file_errors)}")
+        return errors
+    
+    def _key(self, pdf_file):
+        """Manifest key: the page file this PDF is (or would be) saved as"""
+        return page_store.output_name(pdf_file.name, self.parser.output_format,
+                                      self.parser.compression)
+    
+    def _put(self, windows, item):
+        """Queue put that gives up once the consumer has stopped"""
+        while not self._stop.is_set():
+            try:
+                windows.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _feed(self, shards, workers, windows):
+        """Feeder thread: parse shards on a process pool, queue them in order"""
+        start_time = time.perf_counter()
+        ocr_workers = self.parser.ocr_workers or max(1, (os.cpu_count() or 1) // workers)
+        max_ahead = 2 * workers
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=limit_ocr_threads) as executor:
+                pending = []
+                shard_iter = iter(shards)
+                while True:
+                    # Keep the pool busy, but only a bounded number of shards ahead
+                    for pdf_file, first, last in shard_iter:
+                        pending.append((pdf_file, first, last, executor.submit(
+                            self.parser.parse_shard, pdf_file, first, last, ocr_workers)))
+                        if len(pending) >= max_ahead:
+                            break
+                    if not pending:
+                        break
+                    
+                    pdf_file, first, last, future = pending.pop(0)
+                    try:
+                        item = (pdf_file, first, last, future.result(), None)
+                    except Exception as e:
+                        item = (pdf_file, first, last, None, str(e))
+                    if not self._put(windows, item):
+                        for *_, future in pending:
+                            future.cancel()
+                        return
+        except Exception as e:
+            print(f"  ✗ Parser pool failed: {str(e)}")
+        finally:
+            self.parse_seconds = time.perf_counter() - start_time
+            self._put(windows, _DONE)
+    
+    def _ingest_pdf(self, run, item, windows, shard_counts, keys, errors):
+        """Index one PDF from its queued windows; returns the next queue item"""
+        pdf_file = item[0]
+        received = 0
+        writer = self.parser.open_writer(pdf_file) if self.save_pages else None
+        
+        def pages():
+            nonlocal item, received
+            while True:
+                if item is _DONE:
+                    raise ShardError("parsing stopped before the last page window")
+                _, first, last, pages_data, error = item
+                received += 1
+                if error:
+                    label = f"pages {first}-{last}" if first else "all pages"
+                    raise ShardError(f"{label}: {error}")
+                for page in sorted(pages_data, key=lambda p: p["page_number"]):
+                    record = self.parser.page_record(page)
+                    if writer:
+                        writer.write(record)
+                    yield record
+                if received == shard_counts[pdf_file]:
+                    return
+                item = windows.get()
+        
+        try:
+            self.indexer.index_document(run, keys[pdf_file], pdf_file.name, pages())
+        except Exception as e:
+            # A parse error, or an embedding/collection error: the file's old
+            # entry is kept and the run goes on with the next file
+            errors.setdefault(pdf_file.name, []).append(
+                str(e) if isinstance(e, ShardError) else f"indexing: {str(e)}")
+            if writer:
+                writer.abort()
+            print(f"  ✗ Error processing {pdf_file.name}, pages not saved")
+            # Skip the rest of this PDF's windows
+            while item is not _DONE and received < shard_counts[pdf_file]:
+                item = windows.get()
+                received += 1
+            return item if item is _DONE else windows.get()
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+        
+        entry = run.new_files[keys[pdf_file]]
+        stat = pdf_file.stat()
+        entry["pdf_mtime_ns"], entry["pdf_size"] = stat.st_mtime_ns, stat.st_size
+        if writer:
+            writer.commit()
+            self.parser.report_saved(writer)
+            stat = os.stat(writer.path)
+            entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+        else:
+            # No page file: indexer.py must keep the document, not treat it as deleted
+            entry["page_file"] = False
+        return windows.get()
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(
+        description="Parse PDFs and index them in one pipelined pass")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="Parser processes (0 = all cores; default: parser.workers)")
+    arg_parser.add_argument("--rebuild", action="store_true",
+                            help="Drop the collection and re-embed everything")
+    arg_parser.add_argument("--no-save-pages", action="store_true",
+                            help="Do not write page files as a side output")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    limit_ocr_threads()
+    settings = get_config(args.profile, args.overrides)
+    if args.no_save_pages:
+        settings['ingest']['save_pages'] = False
+    print(f"Profile: {settings['profile']}")
+    
+    pipeline = IngestPipeline(settings)
+    pipeline.run(workers=args.workers, full_rebuild=args.rebuild)
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import versioned_dir
+
+# Bump when tokenize() or the file layout changes so existing indexes are rebuilt
+FORMAT_VERSION = 2
+
+# Keeps "0.5", "mg/kg", "12345-678-90" and "5-fu" together as single tokens
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+SPLIT_PATTERN = re.compile(r"[.\-/]")
+
+
+def tokenize(text):
+    """Lowercased word tokens; compound tokens also yield their parts
+    
+    "0.5 mg/kg" -> ["0.5", "0", "5", "mg/kg", "mg", "kg"], so a query matches
+    both "mg/kg" and "mg per kg" spellings.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in SPLIT_PATTERN.split(token) if part)
+    return tokens
+
+
+class BM25Index:
+    """On-disk BM25 inverted index over the indexed chunks
+    
+    Postings are flat numpy arrays (chunk number and term frequency, grouped
+    by term) that are memory-mapped on load, so only the postings of the
+    query terms are read from disk.
+    
+    Each document's chunks are tokenized into a segment of their own
+    (segments/<hash>.npz), so an indexing run only re-reads the documents
+    it changed; update() then merges the segments into one index with exact
+    document statistics, which needs no tokenizing and takes numpy time.
+    The merged index is written as a new version and swapped in atomically
+    (see versioned_dir): offsets.npy, docs.npy, tfs.npy, lengths.npy,
+    meta.json (counts, average length), terms.json (term -> number) and
+    ids.json (chunk number -> chunk ID).
+    """
+    
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._loaded_version = None
+        # Segments are tokenized, so a tokenizer change starts them afresh
+        self.segment_path = os.path.join(path, f"segments_v{FORMAT_VERSION}")
+    
+    def _file(self, name, path=None):
+        return os.path.join(path or versioned_dir.current(self.path), name)
+    
+    def _read_meta(self, path=None):
+        try:
+            with open(self._file("meta.json", path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def exists(self):
+        meta = self._read_meta()
+        return meta is not None and meta.get("version") == FORMAT_VERSION
+    
+    @staticmethod
+    def _segment_name(filename):
+        return hashlib.sha1(filename.encode('utf-8')).hexdigest() + ".npz"
+    
+    def update(self, changed, filenames, read_chunks):
+        """Re-tokenize the changed documents and swap in a new merged index
+        
+        changed are the documents whose chunks changed, filenames all the
+        documents that belong in the index, and read_chunks(filename) yields
+        a document's (chunk_id, text). Segments of other documents are
+        dropped; documents without a segment yet are read as if changed.
+        
+        Returns (chunks, terms, documents read).
+        """
+        os.makedirs(self.segment_path, exist_ok=True)
+        for name in os.listdir(self.path):
+            if name.startswith("segments_") and name != os.path.basename(self.segment_path):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        
+        existing = set(os.listdir(self.segment_path))
+        wanted = {self._segment_name(filename): filename for filename in set(filenames)}
+        n_read = 0
+        for name, filename in sorted(wanted.items(), key=lambda item: item[1]):
+            if filename in changed or name not in existing:
+                self._write_segment(name, read_chunks(filename))
+                n_read += 1
+        for name in existing - set(wanted):
+            os.remove(os.path.join(self.segment_path, name))
+        
+        n_chunks, n_terms = self._merge(sorted(wanted))
+        return n_chunks, n_terms, n_read
+    
+    def _write_segment(self, name, chunks):
+        """Tokenize one document's chunks into its segment file"""
+        ids = []
+        lengths = []
+        postings = defaultdict(list)
+        
+        for doc_num, (chunk_id, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            ids.append(chunk_id)
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append((doc_num, tf))
+        
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        entries = np.asarray([entry for term in terms for entry in postings[term]],
+                             dtype=np.int64).reshape(-1, 2)
+        
+        tmp_path = os.path.join(self.segment_path, name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                ids=np.asarray(ids, dtype=str),
+                lengths=np.asarray(lengths, dtype=np.int32),
+                terms=np.asarray(terms, dtype=str),
+                offsets=offsets,
+                docs=entries[:, 0].astype(np.int32),
+                tfs=np.minimum(entries[:, 1], np.iinfo(np.uint16).max).astype(np.uint16)
+            )
+        os.replace(tmp_path, os.path.join(self.segment_path, name))
+    
+    def _merge(self, names):
+        """Merge the named segments into a new version of the index"""
+        segments = []
+        for name in names:
+            with np.load(os.path.join(self.segment_path, name)) as segment:
+                segments.append({key: segment[key] for key in segment.files})
+        
+        all_terms = (np.unique(np.concatenate([segment["terms"] for segment in segments]))
+                     if segments else np.zeros(0, dtype=str))
+        ids = []
+        term_parts, doc_parts, tf_parts, length_parts = [], [], [], []
+        for segment in segments:
+            # Segment term and chunk numbers -> merged ones
+            term_nums = np.searchsorted(all_terms, segment["terms"])
+            term_parts.append(np.repeat(term_nums, np.diff(segment["offsets"])))
+            doc_parts.append(segment["docs"] + len(ids))
+            tf_parts.append(segment["tfs"])
+            length_parts.append(segment["lengths"])
+            ids.extend(segment["ids"].tolist())
+        
+        def joined(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+        
+        term_nums = joined(term_parts, np.int64)
+        # Stable, so each term's chunks stay in ascending order
+        order = np.argsort(term_nums, kind="stable")
+        docs = joined(doc_parts, np.int32)[order]
+        tfs = joined(tf_parts, np.uint16)[order]
+        lengths = joined(length_parts, np.int32)
+        offsets = np.zeros(len(all_terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(term_nums, minlength=len(all_terms)))
+        
+        version_path = versioned_dir.new_version(self.path)
+        try:
+            np.save(self._file("offsets.npy", version_path), offsets)
+            np.save(self._file("docs.npy", version_path), docs)
+            np.save(self._file("tfs.npy", version_path), tfs)
+            np.save(self._file("lengths.npy", version_path), lengths)
+            with open(self._file("terms.json", version_path), 'w', encoding='utf-8') as f:
+                json.dump({term: i for i, term in enumerate(all_terms.tolist())}, f)
+            with open(self._file("ids.json", version_path), 'w', encoding='utf-8') as f:
+                json.dump(ids, f)
+            with open(self._file("meta.json", version_path), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": FORMAT_VERSION,
+                    "documents": len(ids),
+                    "terms": len(all_terms),
+                    "avg_length": float(np.mean(lengths)) if len(lengths) else 0.0
+                }, f)
+        except BaseException:
+            versioned_dir.discard(version_path)
+            raise
+        versioned_dir.publish(self.path, version_path)
+        return len(ids), len(all_terms)
+    
+    def _load(self):
+        """(Re)load when a new version was swapped in, e.g. by another process"""
+        version_path = versioned_dir.current(self.path)
+        if version_path == self._loaded_version:
+            return True
+        
+        meta = self._read_meta(version_path)
+        if meta is None or meta.get("version") != FORMAT_VERSION:
+            return False
+        
+        with open(self._file("terms.json", version_path), 'r', encoding='utf-8') as f:
+            self._terms = json.load(f)
+        with open(self._file("ids.json", version_path), 'r', encoding='utf-8') as f:
+            self._ids = json.load(f)
+        self._offsets = np.load(self._file("offsets.npy", version_path), mmap_mode='r')
+        self._docs = np.load(self._file("docs.npy", version_path), mmap_mode='r')
+        self._tfs = np.load(self._file("tfs.npy", version_path), mmap_mode='r')
+        
+        # Per-document length normalization, computed once per load
+        lengths = np.load(self._file("lengths.npy", version_path)).astype(np.float32)
+        avg_length = meta["avg_length"] or 1.0
+        self._norms = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+        
+        self._loaded_version = version_path
+        return True
+    
+    def search(self, query, n_results=10):
+        """Top chunks for the query as a list of (chunk_id, score), best first"""
+        if not self._load() or not self._ids:
+            return []
+        
+        n_docs = len(self._ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_num = self._terms.get(term)
+            if term_num is None:
+                continue
+            start, end = self._offsets[term_num], self._offsets[term_num + 1]
+            docs = np.asarray(self._docs[start:end])
+            tfs = np.asarray(self._tfs[start:end], dtype=np.float32)
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Each document appears once per term, so plain fancy-index += is safe
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._norms[docs])
+        
+        n_results = min(n_results, int(np.count_nonzero(scores)))
+        if n_results <= 0:
+            return []
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[i], float(scores[i])) for i in top]
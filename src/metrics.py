@@ -0,0 +1,232 @@
+# Stage timings for the parser, the indexer and the question-answering path.
+#
+# Durations go into per-stage histograms in the process-wide REGISTRY, which
+# src/api.py serves as Prometheus text (GET /metrics) and JSON, and which can
+# also append request traces and run summaries to a JSON Lines log. ChatBot
+# builds one Trace per question: its stages (query_embed, retrieve,
+# prompt_build, llm) plus the token counts and durations Ollama reports.
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds in seconds; spans a cached lookup up to a slow CPU generation
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+PREFIX = "pdf_chatbot"
+
+
+class Histogram:
+    """Bucketed distribution of durations in seconds"""
+    
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket: above the largest bound
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+    
+    def quantile(self, q):
+        """Estimate from the buckets, interpolating inside the one that holds q"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+    
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95)
+        }
+
+
+class Trace:
+    """Stage timings and attributes of one request"""
+    
+    def __init__(self, kind="chat"):
+        self.kind = kind
+        self.started = time.time()
+        self.stages = {}
+        self.attributes = {}
+    
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+    
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "time": self.started,
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            **self.attributes
+        }
+
+
+def ollama_stats(response):
+    """Token counts and durations (in seconds) from a final Ollama response"""
+    stats = {}
+    for key in ('prompt_eval_count', 'eval_count'):
+        if response.get(key) is not None:
+            stats[key] = response.get(key)
+    for key in ('load_duration', 'prompt_eval_duration', 'eval_duration', 'total_duration'):
+        if response.get(key) is not None:
+            stats[key.replace('_duration', '_seconds')] = response.get(key) / 1e9
+    if stats.get('eval_count') and stats.get('eval_seconds'):
+        stats['tokens_per_second'] = stats['eval_count'] / stats['eval_seconds']
+    return stats
+
+
+class MetricsRegistry:
+    """Thread-safe histograms per stage, counters and the most recent traces"""
+    
+    def __init__(self, enabled=True, log_path=None, trace_history=50):
+        self._lock = threading.Lock()
+        self.configure(enabled, log_path, trace_history)
+    
+    def configure(self, enabled=True, log_path=None, trace_history=50):
+        with self._lock:
+            self.enabled = enabled
+            self.log_path = log_path
+            self.histograms = {}
+            self.counters = {}
+            self.traces = deque(maxlen=trace_history)
+    
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+    
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+    
+    def record_trace(self, trace):
+        """Observe every stage of a finished request and keep its trace"""
+        if not self.enabled:
+            return
+        for name, seconds in trace.stages.items():
+            self.observe(name, seconds)
+        
+        # Ollama's own breakdown of the LLM stage
+        attributes = trace.attributes
+        for name in ('load', 'prompt_eval', 'eval'):
+            if attributes.get(f'{name}_seconds') is not None:
+                self.observe(f'llm_{name}', attributes[f'{name}_seconds'])
+        self.inc('requests_total', kind=trace.kind, cached=str(bool(attributes.get('cached'))).lower())
+        if attributes.get('prompt_eval_count'):
+            self.inc('llm_tokens_total', attributes['prompt_eval_count'], type='prompt')
+        if attributes.get('eval_count'):
+            self.inc('llm_tokens_total', attributes['eval_count'], type='generated')
+        
+        record = trace.to_dict()
+        with self._lock:
+            self.traces.append(record)
+        self.log(record)
+    
+    def log(self, record):
+        """Append one JSON line to log_path, if configured"""
+        if not (self.enabled and self.log_path):
+            return
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    
+    def log_summary(self, kind):
+        """Log the stage histograms at the end of a parser or indexer run"""
+        self.log({"kind": kind, "time": time.time(), "stages": self.snapshot()["stages"]})
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stages": {name: h.snapshot() for name, h in sorted(self.histograms.items())},
+                "counters": [{"name": name, **dict(labels), "value": value}
+                             for (name, labels), value in sorted(self.counters.items())]
+            }
+    
+    def recent_traces(self):
+        with self._lock:
+            return list(self.traces)
+    
+    def prometheus_text(self):
+        """Histograms and counters in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            name = f"{PREFIX}_stage_seconds"
+            lines.append(f"# HELP {name} Time spent per pipeline stage")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            
+            declared = set()
+            for (counter, labels), value in sorted(self.counters.items()):
+                name = f"{PREFIX}_{counter}"
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def configure(config=None):
+    """Apply the 'metrics' config section to REGISTRY"""
+    config = config or {}
+    REGISTRY.configure(
+        enabled=config.get('enabled', True),
+        log_path=config.get('log_path'),
+        trace_history=config.get('trace_history', 50)
+    )
@@ -0,0 +1,214 @@
+# Streaming page records between the parser and the indexer.
+#
+# One file per PDF in JSON Lines: a header line with the PDF's filename, then
+# one line per page in page order, optionally gzip- or zstd-compressed
+# (".pages.jsonl.gz" / ".pages.jsonl.zst"). Writers append pages as they are
+# parsed and readers yield them one at a time, so neither side holds a whole
+# document in memory. Legacy pretty-printed ".json" files are still read.
+
+import gzip
+import io
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+FORMAT = "pages-v1"
+SUFFIXES = {
+    None: ".pages.jsonl",
+    "gzip": ".pages.jsonl.gz",
+    "zstd": ".pages.jsonl.zst",
+}
+
+
+def _compression_of(path):
+    name = str(path)
+    if name.endswith(".gz"):
+        return "gzip"
+    if name.endswith(".zst"):
+        return "zstd"
+    return None
+
+
+def _open(path, mode, compression):
+    """Text-mode file object for path ('r' or 'w'), (de)compressing as needed"""
+    if compression == "gzip":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError(f"zstandard is not installed, cannot open {path}")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def resolve_compression(compression):
+    """Normalize the configured compression ('none', 'gzip', 'zstd')"""
+    compression = None if compression in (None, "", "none") else compression
+    if compression not in SUFFIXES:
+        raise ValueError(f"Unknown page store compression: {compression}")
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        print("zstandard not installed, writing gzip-compressed page files instead")
+        compression = "gzip"
+    return compression
+
+
+def stem_of(path):
+    """PDF stem of a page file or legacy JSON ("report.pages.jsonl.gz" -> "report")"""
+    name = Path(path).name
+    for suffix in list(SUFFIXES.values()) + [".json"]:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(path).stem
+
+
+def output_path(folder, stem, compression=None):
+    return os.path.join(folder, stem + SUFFIXES[compression])
+
+
+class PageWriter:
+    """Appends page records for one PDF to a temporary file, renamed into place on commit()
+    
+    Readers never see a partially written document. commit() also removes
+    other files for the same PDF (legacy JSON, other compressions), so every
+    PDF has exactly one page file.
+    """
+    
+    def __init__(self, folder, pdf_filename, compression=None):
+        self.folder = folder
+        self.pdf_filename = pdf_filename
+        self.compression = compression
+        self.path = output_path(folder, Path(pdf_filename).stem, compression)
+        self.tmp_path = self.path + ".tmp"
+        self.pages = 0
+        self.chars = 0
+        self.ocr_pages = 0
+        self.ocr_paths = Counter()  # How OCR handled each page, e.g. "blank", "fast", "denoise light"
+        self._file = _open(self.tmp_path, "w", compression)
+        self._write({"format": FORMAT, "filename": pdf_filename})
+    
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def write(self, page):
+        self._write(page)
+        self.pages += 1
+        self.chars += len(page["text"])
+        self.ocr_pages += page.get("extraction_method") == "OCR"
+        ocr = page.get("ocr")
+        if ocr:
+            self.ocr_paths[ocr.get("path", "full")] += 1
+            if "denoise" in ocr:
+                self.ocr_paths["denoise " + ocr["denoise"]] += 1
+    
+    def commit(self):
+        self._file.close()
+        stem = Path(self.pdf_filename).stem
+        for suffix in list(SUFFIXES.values()) + [".json"]:
+            other = os.path.join(self.folder, stem + suffix)
+            if other != self.path and os.path.exists(other):
+                os.remove(other)
+        os.replace(self.tmp_path, self.path)
+    
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class JSONWriter(PageWriter):
+    """Legacy output: the whole document as one pretty-printed JSON file on commit()"""
+    
+    def __init__(self, folder, pdf_filename):
+        self.folder = folder
+        self.pdf_filename = pdf_filename
+        self.path = os.path.join(folder, Path(pdf_filename).stem + ".json")
+        self.tmp_path = self.path + ".tmp"
+        self.pages = 0
+        self.chars = 0
+        self.ocr_pages = 0
+        self.ocr_paths = Counter()
+        self._records = []
+    
+    def _write(self, record):
+        self._records.append(record)
+    
+    def commit(self):
+        with open(self.tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "filename": self.pdf_filename,
+                "total_pages": len(self._records),
+                "pages": self._records
+            }, f, indent=2, ensure_ascii=False)
+        stem = Path(self.pdf_filename).stem
+        for suffix in SUFFIXES.values():
+            other = os.path.join(self.folder, stem + suffix)
+            if os.path.exists(other):
+                os.remove(other)
+        os.replace(self.tmp_path, self.path)
+    
+    def abort(self):
+        self._records = []
+
+
+def output_name(pdf_filename, output_format="jsonl", compression=None):
+    """File name the writer for this PDF and format produces"""
+    stem = Path(pdf_filename).stem
+    if output_format == "json":
+        return stem + ".json"
+    return stem + SUFFIXES[compression]
+
+
+def open_writer(folder, pdf_filename, output_format="jsonl", compression=None):
+    """PageWriter for the configured output format ('jsonl' or legacy 'json')"""
+    if output_format == "json":
+        return JSONWriter(folder, pdf_filename)
+    if output_format != "jsonl":
+        raise ValueError(f"Unknown output format: {output_format}")
+    return PageWriter(folder, pdf_filename, compression)
+
+
+def list_documents(folder):
+    """Page files and legacy JSON files in folder, one per PDF (page files win)"""
+    by_stem = {}
+    for path in sorted(Path(folder).iterdir()) if os.path.isdir(folder) else []:
+        name = path.name
+        if name.endswith(tuple(SUFFIXES.values())):
+            by_stem[stem_of(path)] = path
+        elif name.endswith(".json"):
+            by_stem.setdefault(stem_of(path), path)
+    return [by_stem[stem] for stem in sorted(by_stem)]
+
+
+def read_filename(path):
+    """The PDF filename a page file or legacy JSON belongs to"""
+    if str(path).endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)['filename']
+    with _open(path, "r", _compression_of(path)) as f:
+        return json.loads(f.readline())["filename"]
+
+
+def iter_pages(path):
+    """Yield page dicts lazily (legacy JSON files are loaded whole)"""
+    if str(path).endswith(".json"):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield from data['pages']
+        return
+    
+    with _open(path, "r", _compression_of(path)) as f:
+        f.readline()  # Header
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -1,6 +1,10 @@
 import os
-import json
 import re
+import hashlib
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+)
 from pathlib import Path
 from typing import Dict, List, Optional
 
@@ -26,39 +30,260 @@ try:
 except ImportError:
     TABULA_AVAILABLE = False
 
+import metrics
+import page_store
+from config import get_config
+
+
+def limit_ocr_threads():
+    """Keep each tesseract process to one thread
+    
+    OCR runs many tesseract processes side by side, which should not each
+    spawn a thread per core. Called once per process: by the entry points
+    and as the initializer of parser process pools.
+    """
+    os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+
+class PDFDocument:
+    """Shared handle and page-image cache for one PDF
+    
+    Keeps a single pdfplumber handle open for the text and table stages and
+    rasterizes pages for OCR with one poppler call per run of consecutive
+    pages. At most batch_pages rendered images are held at a time, so memory
+    stays bounded on long scans.
+    """
+    
+    def __init__(self, pdf_path, dpi=300, batch_pages=16):
+        self.pdf_path = pdf_path
+        self.dpi = dpi
+        self.batch_pages = max(1, batch_pages)
+        self._pdf = None
+        self._images = {}
+    
+    @property
+    def pdf(self):
+        """Lazily opened pdfplumber document, reused across stages"""
+        if self._pdf is None:
+            self._pdf = pdfplumber.open(self.pdf_path)
+        return self._pdf
+    
+    def page_batches(self, page_numbers):
+        """Group page numbers into runs of consecutive pages, at most batch_pages long"""
+        batches = []
+        for page_num in sorted(set(page_numbers)):
+            if (batches and page_num == batches[-1][-1] + 1
+                    and len(batches[-1]) < self.batch_pages):
+                batches[-1].append(page_num)
+            else:
+                batches.append([page_num])
+        return batches
+    
+    def render(self, first_page, last_page):
+        """Rasterize a page range in a single poppler call, replacing the cache"""
+        images = convert_from_path(
+            self.pdf_path,
+            first_page=first_page,
+            last_page=last_page,
+            dpi=self.dpi
+        )
+        self._images = dict(zip(range(first_page, last_page + 1), images))
+        return self._images
+    
+    def get_image(self, page_num):
+        """Rendered image of one page, from the cache when possible"""
+        if page_num not in self._images:
+            self.render(page_num, page_num)
+        return self._images.get(page_num)
+    
+    def iter_images(self, page_numbers):
+        """Yield (page_num, image) for the given pages, rendering in bulk batches"""
+        for batch in self.page_batches(page_numbers):
+            images = self.render(batch[0], batch[-1])
+            for page_num in batch:
+                yield page_num, images.get(page_num)
+            # Drop the batch before rendering the next one
+            self._images = {}
+    
+    def close(self):
+        self._images = {}
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Position tolerances of detect_table, in points: characters whose tops fall
+# in the same ROW_BIN_PT bin form one text row, and column starts in the
+# same COLUMN_BIN_PT bin count as aligned
+ROW_BIN_PT = 2
+COLUMN_BIN_PT = 3
+
+
+def detect_table(page, min_aligned_rows=3):
+    """Cheap guess at whether a pdfplumber page holds a table
+    
+    Returns 'lattice' when the page has ruling lines in both directions,
+    'stream' when at least min_aligned_rows text rows break into columns
+    that line up with other rows, and None otherwise. Uses only the page's
+    line/rect edges and character positions, no table extraction.
+    """
+    edges = page.edges
+    horizontal = sum(1 for e in edges if e['orientation'] == 'h' and e['width'] > 20)
+    vertical = sum(1 for e in edges if e['orientation'] == 'v' and e['height'] > 10)
+    if horizontal >= 2 and vertical >= 2:
+        return 'lattice'
+    
+    chars = [c for c in page.chars if c['text'].strip()]
+    if not chars:
+        return None
+    widths = sorted(c['width'] for c in chars)
+    min_gap = 2 * widths[len(widths) // 2]
+    
+    # Column starts (after a wide gap) per text row; rows and columns are
+    # matched in bins of ROW_BIN_PT and COLUMN_BIN_PT points
+    rows = {}
+    for c in chars:
+        rows.setdefault(round(c['top'] / ROW_BIN_PT), []).append(c)
+    row_columns = []
+    for row_chars in rows.values():
+        row_chars.sort(key=lambda c: c['x0'])
+        columns = {round(b['x0'] / COLUMN_BIN_PT) for a, b in zip(row_chars, row_chars[1:])
+                   if b['x0'] - a['x1'] > min_gap}
+        if columns:
+            row_columns.append(columns)
+    
+    bin_counts = {}
+    for columns in row_columns:
+        for x in columns:
+            bin_counts[x] = bin_counts.get(x, 0) + 1
+    aligned_rows = sum(1 for columns in row_columns
+                       if any(bin_counts[x] >= min_aligned_rows for x in columns))
+    return 'stream' if aligned_rows >= min_aligned_rows else None
+
+
+# Everything clean_text does after collapsing whitespace, as one pattern.
+# The text is scanned with a leading space so removals can take the space
+# before them along; the lookahead lets the scan skip all other characters.
+CLEAN_PATTERN = re.compile(
+    r"(?=[ |_0-])(?:"
+    r" (?:(?i:page) \d+\b"                    # Isolated page numbers
+    r"|[^a-zA-Z0-9\s|]+(?= )"                 # Standalone special characters
+    r"|(?:\|{2,}|_{3,}|-{3,})(?= |$))"        # OCR artifacts: runs of pipes, underscores, hyphens
+    r"|\|{2,}|_{3,}|-{3,}"                    # ... also attached to a word (keeps the space before)
+    r"|0(?<=[A-Za-z]0)(?=[A-Za-z])"          # "d0se": zero inside a word
+    r"|\|(?<=[A-Za-z]\|)(?=[A-Za-z])"        # "wa|k": pipe inside a word
+    r"|\|(?<= \|)(?=[a-z]))"                  # "|n": pipe starting a lowercase word
+)
+
+# A [TABLE] block from the table extractors; group 1 holds its rows
+TABLE_BLOCK_PATTERN = re.compile(r"\[TABLE\](.*?)\[/TABLE\]", re.S)
+
+# Common OCR mistakes, only ever matched next to letters ("10 mg" stays as is)
+OCR_FIXES = {'0': 'O', '|': 'I'}
+
+
+def _clean_replacement(match):
+    return OCR_FIXES.get(match.group(), '')
+
+
+# fastNlMeansDenoising filter strength per denoising level
+DENOISE_STRENGTH = {'light': 5, 'strong': 10}
+
+# Immerkaer's noise estimation kernel: cancels smooth image structure
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def estimate_image_quality(gray, max_side=1000):
+    """Ink coverage and noise level of a grayscale page image
+    
+    Measured on a copy downsampled to max_side pixels, which costs a few
+    milliseconds even for 300 DPI renders. Returns (ink, noise): the fraction
+    of dark pixels, and an estimate of the noise standard deviation taken
+    from the background only, so text edges do not count as noise.
+    """
+    scale = max_side / max(gray.shape)
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ink = np.count_nonzero(gray < 128) / gray.size
+    
+    response = np.abs(cv2.filter2D(gray.astype(np.float32), -1, NOISE_KERNEL))[1:-1, 1:-1]
+    near_ink = cv2.dilate((gray < 200).astype(np.uint8), np.ones((3, 3), np.uint8))[1:-1, 1:-1]
+    background = response[near_ink == 0]
+    noise = background.mean() * np.sqrt(np.pi / 2) / 6 if background.size else 0.0
+    return float(ink), float(noise)
+
 
 class AdvancedPDFParser:
-    def __init__(self, pdf_folder="data/pdfs", json_folder="data/json"):
-        self.pdf_folder = pdf_folder
-        self.json_folder = json_folder
-        os.makedirs(json_folder, exist_ok=True)
-        
-        # Configuration
-        self.use_ocr = True
-        self.extract_tables = True
-        self.denoise_images = True
-        self.min_text_length = 10  # Minimum characters to consider valid text
-    
-    def preprocess_image(self, image):
-        """Clean and enhance image for better OCR"""
-        if not self.denoise_images:
-            return image
+    def __init__(self, pdf_folder=None, json_folder=None, config=None):
+        settings = get_config()
+        self.pdf_folder = pdf_folder or settings['paths']['pdf_folder']
+        self.json_folder = json_folder or settings['paths']['json_folder']
+        os.makedirs(self.json_folder, exist_ok=True)
         
-        # Convert PIL to numpy array
+        # Configuration: the 'parser' section of the active profile by default
+        config = config or settings['parser']
+        self.config = config
+        self.use_ocr = config.get('use_ocr', True)
+        self.extract_tables = config.get('extract_tables', True)
+        self.denoise_images = config.get('denoise_images', True)
+        self.min_text_length = config.get('min_text_length', 10)  # Minimum characters to consider valid text
+        self.ocr_dpi = config.get('ocr_dpi', 300)
+        self.ocr_language = config.get('ocr_language', 'eng')
+        self.workers = config.get('workers', 1)
+        self.shard_pages = config.get('shard_pages', 50)
+        self.render_batch_pages = config.get('render_batch_pages', 16)
+        self.ocr_workers = config.get('ocr_workers', 0)  # 0 = all cores
+        self.ocr_max_inflight = config.get('ocr_max_inflight', 0)  # 0 = 2 x workers
+        self.table_detection = config.get('table_detection', True)
+        self.table_min_aligned_rows = config.get('table_min_aligned_rows', 3)
+        self.output_format = config.get('output_format', 'jsonl')
+        self.compression = page_store.resolve_compression(config.get('compression'))
+        self.adaptive_preprocessing = config.get('adaptive_preprocessing', True)
+        self.blank_ink_fraction = config.get('blank_ink_fraction', 0.0005)
+        self.noise_thresholds = config.get('noise_thresholds', (0.75, 2.5))
+        self.ocr_fast_dpi = config.get('ocr_fast_dpi', 0)  # 0 = always OCR at ocr_dpi
+        self.ocr_min_confidence = config.get('ocr_min_confidence', 70)
+    
+    def _grayscale(self, image):
         img_array = np.array(image)
-        
-        # Convert to grayscale
         if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
+            return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+        return img_array
+    
+    def choose_denoising(self, noise):
+        """Denoising level for an estimated noise level: 'none', 'light' or 'strong'"""
+        light_above, strong_above = self.noise_thresholds
+        if noise >= strong_above:
+            return 'strong'
+        if noise >= light_above:
+            return 'light'
+        return 'none'
+    
+    def preprocess_image(self, image, denoise='strong'):
+        """Clean and enhance image for better OCR
+        
+        denoise picks the fastNlMeansDenoising strength ('none' skips it);
+        'strong' is the fixed filter used before adaptive preprocessing.
+        """
+        if not self.denoise_images:
+            return image
+        
+        # Convert PIL to numpy array and to grayscale
+        gray = self._grayscale(image)
         
         # Apply denoising
-        denoised = cv2.fastNlMeansDenoising(gray, h=10)
+        if denoise != 'none':
+            gray = cv2.fastNlMeansDenoising(gray, h=DENOISE_STRENGTH[denoise])
         
         # Increase contrast
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
+        enhanced = clahe.apply(gray)
         
         # Thresholding to handle background noise
         _, binary = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
@@ -66,153 +291,291 @@ class AdvancedPDFParser:
         # Convert back to PIL
         return Image.fromarray(binary)
     
-    def extract_text_with_ocr(self, pdf_path, page_num):
-        """Extract text from scanned PDF using OCR"""
+    def _tesseract(self, image):
+        """OCR an image, returning (text, mean word confidence 0-100)"""
+        data = pytesseract.image_to_data(image, lang=self.ocr_language,
+                                         output_type=pytesseract.Output.DICT)
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(line, []).append(word)
+            if float(data['conf'][i]) >= 0:
+                confidences.append(float(data['conf'][i]))
+        text = "\n".join(" ".join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return text, confidence
+    
+    def extract_text_with_ocr(self, pdf_path, page_num, image=None, stats=None):
+        """Extract text from scanned PDF using OCR
+        
+        Pass an already rendered page image to skip rasterizing it here.
+        With adaptive preprocessing, blank pages are skipped, the denoising
+        strength follows the measured noise, and with ocr_fast_dpi set the
+        page is first read at that lower resolution and only re-read at
+        ocr_dpi when Tesseract's confidence is below ocr_min_confidence.
+        The path taken is recorded in stats if given.
+        """
+        stats = {} if stats is None else stats
         try:
-            # Convert PDF page to image
-            images = convert_from_path(
-                pdf_path, 
-                first_page=page_num, 
-                last_page=page_num,
-                dpi=300  # Higher DPI for better OCR
-            )
+            if image is None:
+                # Convert PDF page to image
+                images = convert_from_path(
+                    pdf_path, 
+                    first_page=page_num, 
+                    last_page=page_num,
+                    dpi=self.ocr_dpi  # Higher DPI for better OCR
+                )
+                
+                if not images:
+                    return ""
+                image = images[0]
             
-            if not images:
-                return ""
+            if not self.adaptive_preprocessing:
+                stats['path'] = 'full'
+                text, stats['confidence'] = self._tesseract(self.preprocess_image(image))
+                return text.strip()
             
-            # Preprocess image
-            image = self.preprocess_image(images[0])
+            ink, noise = estimate_image_quality(self._grayscale(image))
+            stats['ink'], stats['noise'] = ink, noise
+            if ink < self.blank_ink_fraction:
+                stats['path'] = 'blank'
+                return ""
+            denoise = stats['denoise'] = self.choose_denoising(noise)
             
-            # Perform OCR
-            text = pytesseract.image_to_string(image, lang='eng')
+            # Low resolution first: downscaling the render is far cheaper than OCR
+            if self.ocr_fast_dpi and self.ocr_fast_dpi < self.ocr_dpi:
+                scale = self.ocr_fast_dpi / self.ocr_dpi
+                small = image.resize((max(1, round(image.width * scale)),
+                                      max(1, round(image.height * scale))), Image.LANCZOS)
+                text, confidence = self._tesseract(self.preprocess_image(small, denoise))
+                stats['confidence'] = confidence
+                if confidence >= self.ocr_min_confidence:
+                    stats['path'] = 'fast'
+                    return text.strip()
+                stats['path'] = 'retry'
+            else:
+                stats['path'] = 'full'
             
+            text, stats['confidence'] = self._tesseract(self.preprocess_image(image, denoise))
             return text.strip()
-            
+        
         except Exception as e:
             print(f"    OCR error on page {page_num}: {str(e)}")
             return ""
     
-    def extract_tables_from_page(self, pdf_path, page_num):
-        """Extract tables from PDF page"""
-        tables_text = []
+    def _table_to_text(self, df):
+        """Convert table to readable text"""
+        return f"\n[TABLE]\n{df.to_string(index=False)}\n[/TABLE]\n"
+    
+    def extract_tables_from_pages(self, pdf_path, page_numbers, hints=None, timings=None):
+        """Extract tables from several PDF pages, one extractor call per document
         
-        # Try Camelot first (better for complex tables)
-        if CAMELOT_AVAILABLE and self.extract_tables:
+        hints maps page numbers to detect_table() results: only 'lattice'
+        pages go to Camelot lattice, 'lattice' and 'stream' pages to Camelot
+        stream and Tabula, and pages hinted None are skipped. Pages without a
+        hint are treated as possible tables of either kind. If a batched call
+        fails, its pages are retried one at a time and the failures printed.
+        Seconds spent per extractor are added to timings if given.
+        
+        Returns {page_number: tables_text} for pages where tables were found.
+        """
+        tables_by_page = {}
+        if not page_numbers or not self.extract_tables:
+            return {}
+        hints = hints or {}
+        timings = {} if timings is None else timings
+        candidates = [p for p in page_numbers if hints.get(p, 'unknown') is not None]
+        
+        def add(page_num, text):
+            tables_by_page.setdefault(int(page_num), []).append(text)
+        
+        def timed(name, func, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+        
+        def read_pages(name, pages, read):
+            """Tables from read(pages); if the batched call fails, page by page"""
             try:
-                tables = camelot.read_pdf(
-                    str(pdf_path), 
-                    pages=str(page_num),
+                return list(timed(name, read, pages))
+            except Exception as e:
+                if len(pages) == 1:
+                    print(f"    {name} error on page {pages[0]}: {str(e)}")
+                    return []
+                print(f"    {name} error on pages {pages[0]}-{pages[-1]}: {str(e)}, retrying each page")
+            
+            tables, failed = [], []
+            for page_num in pages:
+                try:
+                    tables.extend(timed(name, read, [page_num]))
+                except Exception as e:
+                    failed.append(page_num)
+                    print(f"    {name} error on page {page_num}: {str(e)}")
+            if failed:
+                print(f"    {name} failed on {len(failed)} of {len(pages)} pages: {failed}")
+            return tables
+        
+        # Try Camelot first (better for complex tables)
+        if CAMELOT_AVAILABLE:
+            lattice_pages = [p for p in candidates if hints.get(p, 'lattice') == 'lattice']
+            if lattice_pages:
+                tables = read_pages('camelot_lattice', lattice_pages, lambda pages: camelot.read_pdf(
+                    str(pdf_path),
+                    pages=",".join(str(p) for p in pages),
                     flavor='lattice',  # For tables with lines
                     strip_text='\n'
-                )
-                
+                ))
                 for table in tables:
-                    df = table.df
-                    # Convert table to readable text
-                    table_text = f"\n[TABLE]\n{df.to_string(index=False)}\n[/TABLE]\n"
-                    tables_text.append(table_text)
-                
-                # If lattice fails, try stream (for tables without lines)
-                if not tables:
-                    tables = camelot.read_pdf(
-                        str(pdf_path), 
-                        pages=str(page_num),
-                        flavor='stream'
-                    )
-                    for table in tables:
-                        df = table.df
-                        table_text = f"\n[TABLE]\n{df.to_string(index=False)}\n[/TABLE]\n"
-                        tables_text.append(table_text)
-                        
-            except Exception as e:
-                pass  # Silently fail, will try other methods
-        
-        # Fallback to tabula
-        if not tables_text and TABULA_AVAILABLE and self.extract_tables:
-            try:
-                tables = tabula.read_pdf(
+                    add(table.page, self._table_to_text(table.df))
+            
+            # Where lattice found nothing, try stream (for tables without lines)
+            missing = [p for p in candidates if p not in tables_by_page]
+            if missing:
+                tables = read_pages('camelot_stream', missing, lambda pages: camelot.read_pdf(
                     str(pdf_path),
-                    pages=page_num,
-                    multiple_tables=True,
-                    silent=True
-                )
-                
-                for df in tables:
-                    if not df.empty:
-                        table_text = f"\n[TABLE]\n{df.to_string(index=False)}\n[/TABLE]\n"
-                        tables_text.append(table_text)
-                        
-            except Exception as e:
-                pass  # Silently fail
+                    pages=",".join(str(p) for p in pages),
+                    flavor='stream'
+                ))
+                for table in tables:
+                    add(table.page, self._table_to_text(table.df))
         
-        return "\n".join(tables_text)
+        # Fallback to tabula: one JVM call for every page still without tables
+        missing = [p for p in candidates if p not in tables_by_page]
+        if TABULA_AVAILABLE and missing:
+            tables = read_pages('tabula', missing, lambda pages: tabula.read_pdf(
+                str(pdf_path),
+                pages=pages,
+                multiple_tables=True,
+                output_format='json',
+                silent=True
+            ))
+            for table in tables:
+                rows = [[cell.get('text', '') for cell in row] for row in table.get('data', [])]
+                if any(any(cell for cell in row) for row in rows):
+                    add(table['page_number'], self._rows_to_text(rows))
+        
+        return {page_num: "\n".join(texts) for page_num, texts in tables_by_page.items()}
+    
+    def _rows_to_text(self, rows):
+        """Tabula JSON rows in the same layout as _table_to_text"""
+        import pandas as pd
+        
+        if len(rows) > 1:
+            return self._table_to_text(pd.DataFrame(rows[1:], columns=rows[0]))
+        return self._table_to_text(pd.DataFrame(rows))
+    
+    def extract_tables_from_page(self, pdf_path, page_num):
+        """Extract tables from PDF page"""
+        return self.extract_tables_from_pages(pdf_path, [page_num]).get(page_num, "")
     
     def clean_text(self, text):
-        """Clean extracted text from noise and artifacts"""
+        """Clean extracted text from noise and artifacts
+        
+        Whitespace is collapsed first, then one regex pass applies every
+        other rule. Inside [TABLE] blocks each row is cleaned on its own
+        line. Call it once on the final text of a page.
+        """
         if not text:
             return ""
+        if "[TABLE]" not in text:
+            return self._clean_run(text)
         
+        # Table rows stay on their own lines so tables can later be split by row
+        parts = []
+        position = 0
+        for match in TABLE_BLOCK_PATTERN.finditer(text):
+            parts.append(self._clean_run(text[position:match.start()]))
+            rows = [self._clean_run(row) for row in match.group(1).splitlines()]
+            parts.append("\n".join(["[TABLE]"] + [row for row in rows if row] + ["[/TABLE]"]))
+            position = match.end()
+        parts.append(self._clean_run(text[position:]))
+        return "\n".join(part for part in parts if part)
+    
+    @staticmethod
+    def _clean_run(text):
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Remove common OCR artifacts
-        text = re.sub(r'[|]{2,}', '', text)  # Multiple pipes
-        text = re.sub(r'_{3,}', '', text)    # Multiple underscores
-        text = re.sub(r'-{3,}', '', text)    # Multiple hyphens
-        
-        # Fix common OCR mistakes
-        text = text.replace('|', 'I')  # Pipe to I
-        text = text.replace('0', 'O')  # Zero to O in words (careful!)
-        
-        # Remove standalone special characters
-        text = re.sub(r'\s+[^a-zA-Z0-9\s]+\s+', ' ', text)
+        text = " " + " ".join(text.split())
         
-        # Remove page numbers that might be isolated
-        text = re.sub(r'\bPage\s+\d+\b', '', text, flags=re.IGNORECASE)
+        # Artifacts are removed, OCR mistakes in letter contexts fixed
+        return CLEAN_PATTERN.sub(_clean_replacement, text).strip()
+    
+    def _text_length(self, text):
+        """Length the text will have after clean_text, near enough to compare pages"""
+        return len(" ".join(text.split()))
+    
+    def extract_text_from_pdf(self, pdf_path, first_page=None, last_page=None):
+        """Extract text from PDF using multiple methods
         
-        return text.strip()
+        first_page/last_page (1-based, inclusive) restrict extraction to a
+        page range so large documents can be split into shards.
+        """
+        with PDFDocument(pdf_path, dpi=self.ocr_dpi,
+                         batch_pages=self.render_batch_pages) as document:
+            return self._extract_pages(document, first_page, last_page)
     
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF using multiple methods"""
+    def _extract_pages(self, document, first_page, last_page):
+        """Run the text, OCR and table stages against one open PDFDocument"""
+        pdf_path = document.pdf_path
         pages_data = []
+        start = (first_page or 1) - 1
         
         # Method 1: Try pdfplumber (best for most PDFs)
         print(f"    Trying pdfplumber...")
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    # Extract text
-                    text = page.extract_text() or ""
-                    
-                    # Extract tables
-                    tables_text = ""
-                    if self.extract_tables:
-                        try:
-                            tables = page.extract_tables()
-                            if tables:
-                                for table in tables:
-                                    # Convert table to text
-                                    table_str = "\n[TABLE]\n"
-                                    for row in table:
-                                        table_str += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
-                                    table_str += "[/TABLE]\n"
-                                    tables_text += table_str
-                        except:
-                            pass
-                    
-                    combined_text = text + "\n" + tables_text
-                    combined_text = self.clean_text(combined_text)
-                    
-                    # If text is too short, mark for OCR
-                    if len(combined_text) < self.min_text_length:
-                        combined_text = ""
-                    
-                    pages_data.append({
-                        "page_number": page_num,
-                        "text": combined_text,
-                        "extraction_method": "pdfplumber",
-                        "needs_ocr": len(combined_text) < self.min_text_length
-                    })
+            pdf = document.pdf
+            for page_num, page in enumerate(pdf.pages[start:last_page], start + 1):
+                # Extract text
+                text_start = time.perf_counter()
+                text = page.extract_text() or ""
+                page_timings = {'text': time.perf_counter() - text_start}
+                
+                # Only pages that look tabular go to the table extractors
+                table_hint = 'unknown'
+                if self.extract_tables and self.table_detection:
+                    detect_start = time.perf_counter()
+                    table_hint = detect_table(page, self.table_min_aligned_rows)
+                    page_timings['table_detect'] = time.perf_counter() - detect_start
+                
+                # Extract tables
+                tables_text = ""
+                if self.extract_tables and table_hint is not None:
+                    tables_start = time.perf_counter()
+                    try:
+                        tables = page.extract_tables()
+                        if tables:
+                            for table in tables:
+                                # Convert table to text
+                                table_str = "\n[TABLE]\n"
+                                for row in table:
+                                    table_str += " | ".join([str(cell) if cell else "" for cell in row]) + "\n"
+                                table_str += "[/TABLE]\n"
+                                tables_text += table_str
+                    except:
+                        pass
+                    page_timings['pdfplumber_tables'] = time.perf_counter() - tables_start
+                
+                combined_text = text + "\n" + tables_text
+                
+                # If text is too short, mark for OCR
+                if self._text_length(combined_text) < self.min_text_length:
+                    combined_text = ""
+                
+                pages_data.append({
+                    "page_number": page_num,
+                    "text": combined_text,
+                    "extraction_method": "pdfplumber",
+                    "needs_ocr": not combined_text,
+                    "table_hint": table_hint,
+                    "timings": page_timings
+                })
+                
+                # Release pdfplumber's per-page object cache to keep memory flat
+                page.close()
         except Exception as e:
             print(f"    pdfplumber failed: {str(e)}")
             pages_data = []
@@ -222,38 +585,56 @@ class AdvancedPDFParser:
             print(f"    Trying PyPDF2...")
             try:
                 reader = PdfReader(pdf_path)
-                for page_num, page in enumerate(reader.pages, 1):
+                for page_num, page in enumerate(reader.pages[start:last_page], start + 1):
                     text = page.extract_text() or ""
-                    text = self.clean_text(text)
                     
                     pages_data.append({
                         "page_number": page_num,
                         "text": text,
                         "extraction_method": "PyPDF2",
-                        "needs_ocr": len(text) < self.min_text_length
+                        "needs_ocr": self._text_length(text) < self.min_text_length
                     })
             except Exception as e:
                 print(f"    PyPDF2 failed: {str(e)}")
         
         # Method 3: OCR for pages with insufficient text
         if self.use_ocr:
-            for page_data in pages_data:
-                if page_data["needs_ocr"]:
-                    print(f"    Running OCR on page {page_data['page_number']}...")
-                    ocr_text = self.extract_text_with_ocr(pdf_path, page_data['page_number'])
-                    ocr_text = self.clean_text(ocr_text)
-                    
-                    if len(ocr_text) > len(page_data['text']):
-                        page_data['text'] = ocr_text
-                        page_data['extraction_method'] = "OCR"
-                        page_data['needs_ocr'] = False
+            pages_by_number = {p['page_number']: p for p in pages_data}
+            ocr_pages = [p['page_number'] for p in pages_data if p["needs_ocr"]]
+            
+            if ocr_pages:
+                try:
+                    self._run_ocr(document, pages_by_number, ocr_pages)
+                except Exception as e:
+                    print(f"    OCR rendering failed: {str(e)}")
+        
+        # Normalize each page's final text once; Camelot/Tabula tables keep their layout
+        for page_data in pages_data:
+            page_data['text'] = self.clean_text(page_data['text'])
         
         # Method 4: Advanced table extraction with Camelot/Tabula
         if self.extract_tables and (CAMELOT_AVAILABLE or TABULA_AVAILABLE):
-            print(f"    Extracting tables...")
+            hints = {p['page_number']: p['table_hint'] for p in pages_data
+                     if p.get('table_hint', 'unknown') != 'unknown'}
+            candidates = sum(1 for p in pages_data if hints.get(p['page_number'], 'unknown'))
+            print(f"    Extracting tables ({candidates}/{len(pages_data)} candidate pages)...")
+            
+            table_timings = {}
+            tables_by_page = self.extract_tables_from_pages(
+                pdf_path, [p['page_number'] for p in pages_data], hints, table_timings)
+            
+            # Batched calls are charged evenly to the pages they covered
             for page_data in pages_data:
-                page_num = page_data['page_number']
-                tables_text = self.extract_tables_from_page(pdf_path, page_num)
+                if hints.get(page_data['page_number'], 'unknown') is None:
+                    continue
+                for name, seconds in table_timings.items():
+                    page_data.setdefault('timings', {})[name] = seconds / candidates
+            if table_timings:
+                print("    Table extractors: " + ", ".join(
+                    f"{name} {seconds:.1f}s" for name, seconds in table_timings.items()))
+            
+            for page_data in pages_data:
+                tables_text = tables_by_page.get(page_data['page_number'])
                 
                 if tables_text:
                     # Append tables to existing text
@@ -261,60 +642,278 @@ class AdvancedPDFParser:
         
         return pages_data
     
-    def parse_all_pdfs(self):
-        """Parse all PDFs in the folder and save as JSON"""
-        pdf_files = list(Path(self.pdf_folder).glob("*.pdf"))
+    def _ocr_page(self, pdf_path, page_num, image):
+        """OCR one rendered page, returning (page_num, raw text, seconds, OCR stats)"""
+        start = time.perf_counter()
+        stats = {}
+        ocr_text = self.extract_text_with_ocr(pdf_path, page_num, image=image, stats=stats)
+        return page_num, ocr_text, time.perf_counter() - start, stats
+    
+    def _run_ocr(self, document, pages_by_number, ocr_pages):
+        """OCR pages on a thread pool with a bounded number of images in flight
+        
+        Tesseract runs as a subprocess and OpenCV releases the GIL, so threads
+        scale across cores. Pages are rendered lazily in batches and at most
+        ocr_max_inflight images wait in the pool, which caps memory.
+        """
+        workers = self.ocr_workers or os.cpu_count() or 1
+        max_inflight = self.ocr_max_inflight or 2 * workers
+        
+        def apply(result):
+            page_num, ocr_text, seconds, stats = result
+            page_data = pages_by_number[page_num]
+            page_data.setdefault('timings', {})['ocr'] = seconds
+            if stats:
+                page_data['ocr_stats'] = stats
+            
+            if self._text_length(ocr_text) > self._text_length(page_data['text']):
+                page_data['text'] = ocr_text
+                page_data['extraction_method'] = "OCR"
+                page_data['needs_ocr'] = False
+        
+        images = document.iter_images(ocr_pages)
+        
+        if workers == 1:
+            for page_num, image in images:
+                if image is not None:
+                    print(f"    Running OCR on page {page_num}...")
+                    apply(self._ocr_page(document.pdf_path, page_num, image))
+            return
+        
+        print(f"    Running OCR on {len(ocr_pages)} pages with {workers} threads...")
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for page_num, image in images:
+                if image is None:
+                    continue
+                pending.add(executor.submit(self._ocr_page, document.pdf_path, page_num, image))
+                
+                # Backpressure: stop rendering until a page finishes
+                if len(pending) >= max_inflight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        apply(future.result())
+            
+            for future in as_completed(pending):
+                apply(future.result())
+    
+    def page_record(self, page):
+        """Parsed page -> the record saved for the indexer"""
+        record = {
+            "page_number": page["page_number"],
+            "text": page["text"],
+            "extraction_method": page["extraction_method"],
+            # Lets the indexer skip pages whose text did not change
+            "content_hash": hashlib.sha256(page["text"].encode('utf-8')).hexdigest()
+        }
+        if page.get("timings"):
+            record["timings"] = {name: round(seconds, 3) for name, seconds in page["timings"].items()}
+            self.observe_timings(page["timings"])
+        if page.get("ocr_stats"):
+            record["ocr"] = {name: round(value, 4) if isinstance(value, float) else value
+                             for name, value in page["ocr_stats"].items()}
+        return record
+    
+    def observe_timings(self, timings):
+        """Add one page's timings to the parse, ocr and table stage metrics"""
+        table_seconds = sum(seconds for name, seconds in timings.items()
+                            if name not in ('text', 'ocr'))
+        metrics.REGISTRY.observe('parse', sum(timings.values()))
+        if 'ocr' in timings:
+            metrics.REGISTRY.observe('ocr', timings['ocr'])
+        if table_seconds:
+            metrics.REGISTRY.observe('table', table_seconds)
+    
+    def open_writer(self, pdf_file):
+        return page_store.open_writer(self.json_folder, pdf_file.name,
+                                      self.output_format, self.compression)
+    
+    def report_saved(self, writer):
+        print(f"  ✓ Saved to {os.path.basename(writer.path)}")
+        print(f"    Pages: {writer.pages}, Characters: {writer.chars}, OCR pages: {writer.ocr_pages}")
+        if writer.ocr_paths:
+            print("    OCR paths: " + ", ".join(
+                f"{path} {count}" for path, count in sorted(writer.ocr_paths.items())))
+    
+    def save_pdf_json(self, pdf_file, pages_data):
+        """Write parsed pages of one PDF to its output file"""
+        writer = self.open_writer(pdf_file)
+        try:
+            for page in pages_data:
+                writer.write(self.page_record(page))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        self.report_saved(writer)
+    
+    def parse_pdf(self, pdf_file):
+        """Parse one PDF, writing its pages out shard_pages at a time
+        
+        Only one window of pages is held in memory; the output file appears
+        once every page has been written.
+        """
+        page_count = self.get_page_count(pdf_file)
+        if page_count:
+            windows = [(first, min(first + self.shard_pages - 1, page_count))
+                       for first in range(1, page_count + 1, self.shard_pages)]
+        else:
+            windows = [(None, None)]
+        
+        writer = self.open_writer(pdf_file)
+        try:
+            with PDFDocument(pdf_file, dpi=self.ocr_dpi,
+                             batch_pages=self.render_batch_pages) as document:
+                for first, last in windows:
+                    for page in self._extract_pages(document, first, last):
+                        writer.write(self.page_record(page))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        self.report_saved(writer)
+    
+    def get_page_count(self, pdf_path):
+        """Number of pages in a PDF, or None if it cannot be read"""
+        try:
+            return len(PdfReader(pdf_path).pages)
+        except Exception:
+            return None
+    
+    def plan_shards(self, pdf_files, shard_pages):
+        """Split PDFs into (pdf_file, first_page, last_page) work items
+        
+        PDFs longer than shard_pages are split into page ranges so one large
+        document does not keep a single worker busy while others sit idle.
+        """
+        shards = []
+        for pdf_file in pdf_files:
+            page_count = self.get_page_count(pdf_file)
+            if not page_count or page_count <= shard_pages:
+                shards.append((pdf_file, None, None))
+                continue
+            for first in range(1, page_count + 1, shard_pages):
+                shards.append((pdf_file, first, min(first + shard_pages - 1, page_count)))
+        return shards
+    
+    def parse_shard(self, pdf_file, first_page, last_page, ocr_workers):
+        """Process pool entry point: extract one page range of one PDF"""
+        self.ocr_workers = ocr_workers
+        return self.extract_text_from_pdf(pdf_file, first_page, last_page)
+    
+    def parse_all_pdfs(self, workers=None):
+        """Parse all PDFs in the folder and save their pages for the indexer
+        
+        workers > 1 spreads PDFs (and page shards of large PDFs) across a
+        process pool; 0 uses every core. Defaults to the 'workers' setting.
+        """
+        pdf_files = sorted(Path(self.pdf_folder).glob("*.pdf"))
         
         if not pdf_files:
             print(f"No PDF files found in {self.pdf_folder}")
             return
         
+        if workers is None:
+            workers = self.workers
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        
         print(f"Found {len(pdf_files)} PDF files")
-        print(f"OCR enabled: {self.use_ocr}")
+        print(f"OCR enabled: {self.use_ocr} (dpi={self.ocr_dpi}, lang={self.ocr_language})")
         print(f"Table extraction enabled: {self.extract_tables}")
         print(f"Camelot available: {CAMELOT_AVAILABLE}")
         print(f"Tabula available: {TABULA_AVAILABLE}")
+        print(f"Workers: {workers}")
         print()
         
-        for pdf_file in pdf_files:
-            print(f"Processing: {pdf_file.name}")
-            
-            try:
-                pages_data = self.extract_text_from_pdf(pdf_file)
-                
-                # Create JSON structure
-                pdf_json = {
-                    "filename": pdf_file.name,
-                    "total_pages": len(pages_data),
-                    "pages": []
-                }
-                
-                # Clean up pages data for JSON
-                for page in pages_data:
-                    pdf_json["pages"].append({
-                        "page_number": page["page_number"],
-                        "text": page["text"],
-                        "extraction_method": page["extraction_method"]
-                    })
-                
-                # Calculate stats
-                total_chars = sum(len(p['text']) for p in pdf_json['pages'])
-                ocr_pages = sum(1 for p in pages_data if p['extraction_method'] == 'OCR')
-                
-                # Save to JSON file
-                json_filename = pdf_file.stem + ".json"
-                json_path = os.path.join(self.json_folder, json_filename)
+        if workers > 1:
+            errors = self._parse_parallel(pdf_files, workers)
+        else:
+            errors = {}
+            for pdf_file in pdf_files:
+                print(f"Processing: {pdf_file.name}")
                 
-                with open(json_path, 'w', encoding='utf-8') as f:
-                    json.dump(pdf_json, f, indent=2, ensure_ascii=False)
+                try:
+                    self.parse_pdf(pdf_file)
+                except Exception as e:
+                    print(f"  ✗ Error processing {pdf_file.name}: {str(e)}")
+                    errors[pdf_file.name] = [str(e)]
+        
+        metrics.REGISTRY.log_summary("parse")
+        print(f"\nPDF parsing complete! {len(pdf_files) - len(errors)}/{len(pdf_files)} files parsed")
+        for name, file_errors in errors.items():
+            print(f"  ✗ {name}: {'; '.join(file_errors)}")
+        
+        return errors
+    
+    def _parse_parallel(self, pdf_files, workers):
+        """Parse PDFs on a process pool, returning errors grouped by file
+        
+        Shards finish in any order; each is written to its file's output as
+        soon as every earlier shard of that file has been written.
+        """
+        shards = self.plan_shards(pdf_files, self.shard_pages)
+        
+        remaining = {}
+        ready = {pdf_file: {} for pdf_file in pdf_files}  # first page -> (last page, pages)
+        for pdf_file, _, _ in shards:
+            remaining[pdf_file] = remaining.get(pdf_file, 0) + 1
+        next_page = {pdf_file: 1 for pdf_file in pdf_files}
+        writers = {}
+        errors = {}
+        
+        # Split the cores between parser processes instead of multiplying them
+        ocr_workers = self.ocr_workers or max(1, (os.cpu_count() or 1) // workers)
+        
+        print(f"Parsing {len(shards)} shards on {workers} processes")
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=limit_ocr_threads) as executor:
+            futures = {
+                executor.submit(self.parse_shard, pdf_file, first, last, ocr_workers):
+                    (pdf_file, first, last)
+                for pdf_file, first, last in shards
+            }
+            
+            for future in as_completed(futures):
+                pdf_file, first, last = futures[future]
+                remaining[pdf_file] -= 1
+                try:
+                    pages_data = future.result()
+                    if pdf_file.name not in errors:
+                        ready[pdf_file][first or 1] = (last, pages_data)
+                        self._write_ready(pdf_file, ready[pdf_file], next_page, writers)
+                except Exception as e:
+                    label = f"pages {first}-{last}" if first else "all pages"
+                    errors.setdefault(pdf_file.name, []).append(f"{label}: {str(e)}")
                 
-                print(f"  ✓ Saved to {json_filename}")
-                print(f"    Pages: {len(pages_data)}, Characters: {total_chars}, OCR pages: {ocr_pages}")
+                if pdf_file.name in errors:
+                    # Drop what was written so far; the file is not saved
+                    ready[pdf_file].clear()
+                    if pdf_file in writers:
+                        writers.pop(pdf_file).abort()
+                    if not remaining[pdf_file]:
+                        print(f"  ✗ Error processing {pdf_file.name}, not saved")
+                    continue
                 
-            except Exception as e:
-                print(f"  ✗ Error processing {pdf_file.name}: {str(e)}")
+                if not remaining[pdf_file]:
+                    writer = writers.pop(pdf_file, None) or self.open_writer(pdf_file)
+                    writer.commit()
+                    self.report_saved(writer)
         
-        print("\nPDF parsing complete!")
+        return errors
+    
+    def _write_ready(self, pdf_file, ready, next_page, writers):
+        """Append the shards that continue this file's output in page order"""
+        while next_page[pdf_file] in ready:
+            last, pages_data = ready.pop(next_page[pdf_file])
+            if pdf_file not in writers:
+                writers[pdf_file] = self.open_writer(pdf_file)
+            for page in sorted(pages_data, key=lambda p: p["page_number"]):
+                writers[pdf_file].write(self.page_record(page))
+            if last is None:
+                break
+            next_page[pdf_file] = last + 1
 
 
 # Keep backward compatibility
@@ -324,5 +923,24 @@ class PDFParser(AdvancedPDFParser):
 
 
 if __name__ == "__main__":
-    parser = AdvancedPDFParser()
-    parser.parse_all_pdfs()
\ No newline at end of file
+    import argparse
+    
+    from config import add_config_arguments
+    
+    arg_parser = argparse.ArgumentParser(description="Parse PDFs into page files for the indexer")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="Parser processes (0 = all cores, 1 = sequential)")
+    add_config_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    
+    limit_ocr_threads()
+    settings = get_config(args.profile, args.overrides)
+    print(f"Profile: {settings['profile']}")
+    metrics.configure(settings['metrics'])
+    
+    parser = AdvancedPDFParser(
+        pdf_folder=settings['paths']['pdf_folder'],
+        json_folder=settings['paths']['json_folder'],
+        config=settings['parser']
+    )
+    parser.parse_all_pdfs(workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticResponseCache:
+    """SQLite cache of LLM answers for near-identical questions
+    
+    An answer is reused when a new query's embedding is within `threshold`
+    cosine similarity of a cached query and the retrieval step returned the
+    same chunks (same IDs and content hashes) for the same model and
+    generation settings (prompt, sampling options, profile). The least
+    recently used entries are evicted past max_entries or max_mb.
+    """
+    
+    def __init__(self, path, threshold=0.95, max_entries=2000, max_mb=50):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                context_key TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_context_key ON responses (context_key)")
+        self._conn.commit()
+    
+    @staticmethod
+    def context_key(results, model_name, generation=None):
+        """Key for the retrieved chunk set (IDs plus their content hashes),
+        the model and a JSON-serializable dict of anything else that shapes
+        the answer"""
+        ids = results['ids'][0] if results.get('ids') else []
+        metadatas = results['metadatas'][0] if results.get('metadatas') else [{}] * len(ids)
+        parts = sorted(f"{chunk_id}:{(meta or {}).get('content_hash', '')}"
+                       for chunk_id, meta in zip(ids, metadatas))
+        parts.append(model_name)
+        parts.append(json.dumps(generation, sort_keys=True))
+        return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+    
+    def lookup(self, embedding, context_key):
+        """Return (answer, sources) for a close enough cached query, else None"""
+        query = np.asarray(embedding, dtype=np.float32)
+        
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, embedding, answer, sources FROM responses WHERE context_key = ?",
+                (context_key,)
+            ).fetchall()
+            
+            best_row, best_score = None, self.threshold
+            for row in rows:
+                cached = np.frombuffer(row[1], dtype=np.float32)
+                if cached.shape != query.shape:
+                    continue
+                score = float(np.dot(cached, query) /
+                              (np.linalg.norm(cached) * np.linalg.norm(query) or 1.0))
+                if score >= best_score:
+                    best_row, best_score = row, score
+            
+            if best_row is None:
+                self.misses += 1
+                return None
+            
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE id = ?",
+                               (time.time(), best_row[0]))
+            self._conn.commit()
+            self.hits += 1
+            return best_row[2], json.loads(best_row[3])
+    
+    def store(self, query, embedding, context_key, answer, sources):
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        sources_json = json.dumps(sources)
+        size = len(blob) + len(query) + len(answer) + len(sources_json)
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (context_key, query, embedding, answer, sources, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (context_key, query, blob, answer, sources_json, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Delete least recently used entries until within both limits"""
+        count, total_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        
+        excess = []
+        if count > self.max_entries or total_size > self.max_bytes:
+            for row_id, size in self._conn.execute(
+                    "SELECT id, size FROM responses ORDER BY last_used"):
+                if count <= self.max_entries and total_size <= self.max_bytes:
+                    break
+                excess.append((row_id,))
+                count -= 1
+                total_size -= size
+        
+        if excess:
+            self._conn.executemany("DELETE FROM responses WHERE id = ?", excess)
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+    
+    def stats(self):
+        with self._lock:
+            count, total_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": count,
+            "bytes": total_size
+        }
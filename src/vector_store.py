@@ -0,0 +1,474 @@
+import json
+import operator
+import os
+import shutil
+import time
+
+import numpy as np
+
+import versioned_dir
+
+FORMAT_VERSION = 2
+
+# persist() merges the segments when there are more than this many, or when
+# more than this fraction of their rows are deleted
+MAX_SEGMENTS = 8
+MAX_DELETED_FRACTION = 0.25
+
+# Rows scored per matrix product, so a float32 copy of the whole store is never made
+SCORE_BLOCK_ROWS = 65536
+
+COMPARISONS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def _encode_columns(metadatas):
+    """Metadata dicts -> numpy columns: ints/floats as arrays, anything else dictionary-coded"""
+    arrays, schema = {}, {}
+    for key in sorted({key for metadata in metadatas for key in metadata}):
+        values = [metadata.get(key) for metadata in metadatas]
+        if all(type(value) is int for value in values):
+            arrays[key] = np.asarray(values, dtype=np.int64)
+            schema[key] = {"type": "int"}
+        elif all(type(value) in (int, float) for value in values):
+            arrays[key] = np.asarray(values, dtype=np.float64)
+            schema[key] = {"type": "float"}
+        else:
+            codes, uniques = {}, []
+            for value in values:
+                token = json.dumps(value)
+                if token not in codes:
+                    codes[token] = len(uniques)
+                    uniques.append(value)
+            arrays[key] = np.asarray([codes[json.dumps(value)] for value in values], dtype=np.int32)
+            schema[key] = {"type": "dict", "values": uniques}
+    return arrays, schema
+
+
+class _Columns:
+    """Read access to encoded metadata columns"""
+    
+    def __init__(self, arrays, schema):
+        self.arrays = arrays
+        self.schema = schema
+    
+    def metadata(self, row):
+        metadata = {}
+        for key, column in self.schema.items():
+            value = self.arrays[key][row]
+            if column["type"] == "dict":
+                value = column["values"][value]
+                if value is None:
+                    continue
+            else:
+                value = value.item()
+            metadata[key] = value
+        return metadata
+    
+    def mask(self, key, predicate, n_rows):
+        """Boolean row mask where predicate(value) holds for metadata[key]"""
+        column = self.schema.get(key)
+        if column is None:
+            return np.zeros(n_rows, dtype=bool)
+        if column["type"] == "dict":
+            matching = [code for code, value in enumerate(column["values"])
+                        if value is not None and predicate(value)]
+            return np.isin(self.arrays[key], matching)
+        return np.asarray(predicate(self.arrays[key]), dtype=bool)
+
+
+class _Segment:
+    """Rows of one segment: IDs, embeddings, metadata columns and documents
+    
+    live masks out the rows that were deleted or overwritten after the
+    segment was written. path is relative to the store (None for pending
+    rows that are only in memory).
+    """
+    
+    def __init__(self, ids, matrix, columns, document, live, path=None):
+        self.ids = ids
+        self.matrix = matrix
+        self.columns = columns
+        self.document = document
+        self.live = live
+        self.path = path
+    
+    @classmethod
+    def open(cls, store_path, path, deleted=None):
+        """Memory-map a segment directory; deleted are row numbers to mask out"""
+        full_path = os.path.join(store_path, path)
+        with open(os.path.join(full_path, "ids.json"), 'r', encoding='utf-8') as f:
+            ids = json.load(f)
+        with open(os.path.join(full_path, "columns.json"), 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        with np.load(os.path.join(full_path, "columns.npz")) as arrays:
+            columns = _Columns({key: arrays[key] for key in arrays.files}, schema)
+        matrix = np.load(os.path.join(full_path, "embeddings.npy"), mmap_mode='r')
+        offsets = np.load(os.path.join(full_path, "doc_offsets.npy"), mmap_mode='r')
+        blob = (np.memmap(os.path.join(full_path, "documents.bin"), dtype=np.uint8, mode='r')
+                if offsets[-1] else np.zeros(0, dtype=np.uint8))
+        
+        live = np.ones(len(ids), dtype=bool)
+        if deleted is not None:
+            live[deleted] = False
+        return cls(ids, matrix, columns,
+                   lambda row: bytes(blob[offsets[row]:offsets[row + 1]]).decode('utf-8'),
+                   live, path)
+    
+    @classmethod
+    def from_rows(cls, rows):
+        """In-memory segment of pending rows: {id: (embedding, document, metadata)}"""
+        ids = list(rows)
+        values = list(rows.values())
+        matrix = np.stack([value[0] for value in values])
+        documents = [value[1] for value in values]
+        return cls(ids, matrix, _Columns(*_encode_columns([value[2] for value in values])),
+                   documents.__getitem__, np.ones(len(ids), dtype=bool))
+    
+    def masked(self, live):
+        return _Segment(self.ids, self.matrix, self.columns, self.document, live, self.path)
+
+
+class VectorStore:
+    """Exact-search vector store on memory-mapped numpy files
+    
+    A drop-in for the subset of the Chroma collection API EmbeddingIndexer
+    uses: upsert, delete, get, query (with `where` filters) and count.
+    Embeddings are stored L2-normalized as float16 and searched by a blocked
+    matrix-vector product, so distances are cosine distances like the Chroma
+    collection's. Metadata is stored as numpy columns, documents as one UTF-8
+    blob with offsets.
+    
+    The rows live in append-only segments (segments/<name>/), which readers
+    memory-map, so processes share them through the OS page cache and opening
+    the store is nearly free. Writes are held in memory until persist(),
+    which writes only the new rows as one more segment plus the row numbers
+    deleted from older segments, and swaps the new version in atomically
+    (see versioned_dir). When there are more than MAX_SEGMENTS segments or
+    more than MAX_DELETED_FRACTION of the rows are deleted, persist() merges
+    the live rows into one segment instead.
+    """
+    
+    def __init__(self, path, embedding_function=None):
+        self.path = path
+        self.embedding_function = embedding_function
+        self._loaded_version = None
+        self._base = None  # Segments on disk
+        self._base_rows = {}  # id -> (segment number, row) of their live rows
+        self._pending = {}  # id -> (embedding, document, metadata) not yet persisted
+        self._removed = set()  # IDs deleted or overwritten since the last persist()
+        self._cleared = False
+        self._view = None
+    
+    def _dirty(self):
+        return bool(self._pending or self._removed or self._cleared)
+    
+    # --- reading ---
+    
+    def _load(self):
+        """(Re)open the segments on disk if a new version was swapped in"""
+        if self._dirty():
+            return
+        version_path = versioned_dir.current(self.path)
+        meta_path = os.path.join(version_path, "meta.json")
+        version = version_path if os.path.exists(meta_path) else None
+        if version == self._loaded_version and self._base is not None:
+            return
+        
+        segments = []
+        if version is not None:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get("version") == 1 and meta["count"]:
+                # Stores written before segments: one segment in the version directory
+                segments = [_Segment.open(self.path, os.path.relpath(version_path, self.path))]
+            elif meta.get("version") == FORMAT_VERSION:
+                for entry in meta["segments"]:
+                    deleted = (np.load(os.path.join(version_path, entry["deleted"]))
+                               if entry["deleted"] else None)
+                    segments.append(_Segment.open(self.path, entry["path"], deleted))
+        
+        self._base = segments
+        self._base_rows = self._row_index(segments)
+        self._loaded_version = version
+        self._view = None
+    
+    @staticmethod
+    def _row_index(segments):
+        row_of = {}
+        for segment_num, segment in enumerate(segments):
+            for row in np.flatnonzero(segment.live).tolist():
+                row_of[segment.ids[row]] = (segment_num, row)
+        return row_of
+    
+    def _current(self):
+        """(segments, id -> (segment number, row)) with the pending writes applied"""
+        self._load()
+        if self._view is None:
+            if not self._dirty():
+                self._view = (self._base, self._base_rows)
+            else:
+                segments = [] if self._cleared else [segment.masked(segment.live.copy())
+                                                     for segment in self._base]
+                if segments:
+                    for chunk_id in self._removed:
+                        location = self._base_rows.get(chunk_id)
+                        if location is not None:
+                            segments[location[0]].live[location[1]] = False
+                if self._pending:
+                    segments.append(_Segment.from_rows(self._pending))
+                self._view = (segments, self._row_index(segments))
+        return self._view
+    
+    def count(self):
+        return sum(int(np.count_nonzero(segment.live)) for segment in self._current()[0])
+    
+    def _where_mask(self, where, segment):
+        n_rows = len(segment.ids)
+        if "$and" in where:
+            masks = [self._where_mask(clause, segment) for clause in where["$and"]]
+            return np.logical_and.reduce(masks) if masks else np.ones(n_rows, dtype=bool)
+        if "$or" in where:
+            masks = [self._where_mask(clause, segment) for clause in where["$or"]]
+            return np.logical_or.reduce(masks) if masks else np.zeros(n_rows, dtype=bool)
+        
+        mask = np.ones(n_rows, dtype=bool)
+        for key, condition in where.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                if op in ("$in", "$nin"):
+                    matches = self._in_mask(segment.columns, key, operand, n_rows)
+                    mask &= matches if op == "$in" else ~matches
+                elif op in COMPARISONS:
+                    compare = COMPARISONS[op]
+                    mask &= segment.columns.mask(key, lambda value: compare(value, operand), n_rows)
+                else:
+                    raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+    
+    @staticmethod
+    def _in_mask(columns, key, operands, n_rows):
+        column = columns.schema.get(key)
+        if column is not None and column["type"] != "dict":
+            return np.isin(columns.arrays[key], list(operands))
+        operands = set(operands)
+        return columns.mask(key, lambda value: value in operands, n_rows)
+    
+    def _selected(self, segment, where):
+        """Live rows of a segment that match where, as a boolean mask"""
+        return segment.live & self._where_mask(where, segment) if where else segment.live
+    
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas")):
+        segments, row_of = self._current()
+        if ids is not None:
+            rows = [row_of[chunk_id] for chunk_id in ids if chunk_id in row_of]
+            if where:
+                masks = {}
+                for segment_num, _ in rows:
+                    if segment_num not in masks:
+                        masks[segment_num] = self._selected(segments[segment_num], where)
+                rows = [(segment_num, row) for segment_num, row in rows if masks[segment_num][row]]
+        else:
+            rows = [(segment_num, row) for segment_num, segment in enumerate(segments)
+                    for row in np.flatnonzero(self._selected(segment, where)).tolist()]
+        rows = rows[offset or 0:]
+        if limit is not None:
+            rows = rows[:limit]
+        
+        result = {"ids": [segments[s].ids[row] for s, row in rows]}
+        if "documents" in include:
+            result["documents"] = [segments[s].document(row) for s, row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [segments[s].columns.metadata(row) for s, row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [segments[s].matrix[row].astype(np.float32).tolist() for s, row in rows]
+        return result
+    
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        """Exact top-n by cosine similarity for each query, in Chroma's result shape"""
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = _normalize(query_embeddings)
+        segments, _ = self._current()
+        
+        # Top n of every segment, merged below: (similarities, segment numbers, rows) per query
+        hits = [[] for _ in queries]
+        for segment_num, segment in enumerate(segments):
+            # Filter first, so only the matching rows are read and scored
+            selected = self._selected(segment, where)
+            candidates = None if selected.all() else np.flatnonzero(selected)
+            n_candidates = len(segment.ids) if candidates is None else len(candidates)
+            if not n_candidates:
+                continue
+            
+            # One (rows x queries) product per block, upcast to float32 block by block
+            scores = np.empty((n_candidates, len(queries)), dtype=np.float32)
+            for start in range(0, n_candidates, SCORE_BLOCK_ROWS):
+                rows = (slice(start, start + SCORE_BLOCK_ROWS) if candidates is None
+                        else candidates[start:start + SCORE_BLOCK_ROWS])
+                block = np.asarray(segment.matrix[rows], dtype=np.float32)
+                scores[start:start + len(block)] = block @ queries.T
+            if candidates is None:
+                candidates = np.arange(n_candidates)
+            
+            k = min(n_results, n_candidates)
+            for q in range(len(queries)):
+                column = scores[:, q]
+                top = np.argpartition(-column, k - 1)[:k]
+                hits[q].append((column[top], np.full(k, segment_num), candidates[top]))
+        
+        keys = ["ids"] + [key for key in ("documents", "metadatas", "distances") if key in include]
+        results = {key: [] for key in keys}
+        for q in range(len(queries)):
+            if not hits[q]:
+                for key in keys:
+                    results[key].append([])
+                continue
+            similarities, segment_nums, rows = (np.concatenate(parts) for parts in zip(*hits[q]))
+            order = np.argsort(-similarities, kind="stable")[:n_results]
+            found = [(int(segment_nums[i]), int(rows[i])) for i in order]
+            results["ids"].append([segments[s].ids[row] for s, row in found])
+            if "documents" in results:
+                results["documents"].append([segments[s].document(row) for s, row in found])
+            if "metadatas" in results:
+                results["metadatas"].append([segments[s].columns.metadata(row) for s, row in found])
+            if "distances" in results:
+                results["distances"].append([float(1.0 - similarities[i]) for i in order])
+        return results
+    
+    # --- writing ---
+    
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._load()
+        vectors = _normalize(embeddings).astype(np.float16)
+        for i, chunk_id in enumerate(ids):
+            self._pending[chunk_id] = (vectors[i], documents[i] if documents else "",
+                                       dict(metadatas[i]) if metadatas else {})
+            # Hides the older copy on disk, if any
+            self._removed.add(chunk_id)
+        self._view = None
+    
+    def delete(self, ids=None, where=None):
+        if where:
+            ids = self.get(ids=ids, where=where, include=())["ids"]
+        self._load()
+        for chunk_id in ids or []:
+            self._pending.pop(chunk_id, None)
+            self._removed.add(chunk_id)
+        self._view = None
+    
+    def reset(self):
+        """Remove every row (written out by the next persist())"""
+        self._load()
+        self._pending, self._removed = {}, set()
+        self._cleared = True
+        self._view = None
+    
+    def persist(self):
+        """Write pending changes as a new version and swap it in
+        
+        Older segments are kept as they are; only their deleted row numbers
+        are written to the new version.
+        """
+        if not self._dirty():
+            return
+        segments, _ = self._current()
+        written = [segment for segment in segments if segment.path is not None]
+        pending = [segment for segment in segments if segment.path is None]
+        total = sum(len(segment.ids) for segment in segments)
+        live = sum(int(np.count_nonzero(segment.live)) for segment in segments)
+        compact = (len(segments) > MAX_SEGMENTS or total - live > MAX_DELETED_FRACTION * total
+                   # Stores from before segments are rewritten once into the new layout
+                   or any(not segment.path.startswith("segments") for segment in written))
+        
+        version_path = versioned_dir.new_version(self.path)
+        try:
+            entries = []
+            if compact:
+                if live:
+                    entries.append({"path": self._write_segment(segments), "deleted": None})
+            else:
+                for segment in written:
+                    if not segment.live.any():
+                        continue
+                    deleted = None
+                    if not segment.live.all():
+                        deleted = f"deleted_{len(entries)}.npy"
+                        np.save(os.path.join(version_path, deleted),
+                                np.flatnonzero(~segment.live).astype(np.int64))
+                    entries.append({"path": segment.path, "deleted": deleted})
+                if pending:
+                    entries.append({"path": self._write_segment(pending), "deleted": None})
+            
+            dim = next((int(segment.matrix.shape[1]) for segment in segments if len(segment.ids)), 0)
+            with open(os.path.join(version_path, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump({"version": FORMAT_VERSION, "count": live, "dim": dim,
+                           "segments": entries}, f)
+        except BaseException:
+            versioned_dir.discard(version_path)
+            raise
+        
+        # The replaced version stays readable until the next swap, so keep its segments
+        keep = {entry["path"] for entry in entries} | {segment.path for segment in self._base}
+        self._view = None
+        versioned_dir.publish(self.path, version_path)
+        self._remove_segments(keep)
+        
+        self._pending, self._removed = {}, set()
+        self._cleared = False
+        self._base = None
+        self._loaded_version = None
+    
+    def _write_segment(self, segments):
+        """Write the live rows of segments as a new segment; returns its path"""
+        path = os.path.join("segments", f"s{time.time_ns()}_{os.getpid()}")
+        full_path = os.path.join(self.path, path)
+        os.makedirs(full_path)
+        
+        ids, matrices, metadatas = [], [], []
+        offsets = [0]
+        with open(os.path.join(full_path, "documents.bin"), 'wb') as f:
+            for segment in segments:
+                rows = np.flatnonzero(segment.live)
+                if not len(rows):
+                    continue
+                ids.extend(segment.ids[row] for row in rows.tolist())
+                matrices.append(np.asarray(segment.matrix[rows], dtype=np.float16))
+                for row in rows.tolist():
+                    document = segment.document(row).encode('utf-8')
+                    f.write(document)
+                    offsets.append(offsets[-1] + len(document))
+                    metadatas.append(segment.columns.metadata(row))
+        
+        np.save(os.path.join(full_path, "embeddings.npy"), np.ascontiguousarray(np.concatenate(matrices)))
+        np.save(os.path.join(full_path, "doc_offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        arrays, schema = _encode_columns(metadatas)
+        np.savez(os.path.join(full_path, "columns.npz"), **arrays)
+        with open(os.path.join(full_path, "columns.json"), 'w', encoding='utf-8') as f:
+            json.dump(schema, f)
+        with open(os.path.join(full_path, "ids.json"), 'w', encoding='utf-8') as f:
+            json.dump(ids, f)
+        return path
+    
+    def _remove_segments(self, keep):
+        """Delete segment directories that no kept version refers to"""
+        segment_dir = os.path.join(self.path, "segments")
+        if not os.path.isdir(segment_dir):
+            return
+        for name in os.listdir(segment_dir):
+            if os.path.join("segments", name) not in keep:
+                shutil.rmtree(os.path.join(segment_dir, name), ignore_errors=True)
@@ -0,0 +1,60 @@
+# Directories whose contents are replaced as a whole while other processes
+# read them (the BM25 index, the numpy vector store).
+#
+# Every version is written to its own subdirectory and becomes current when
+# the small CURRENT pointer file is atomically replaced, so a reader sees
+# either the old or the new version, never a half-written or missing one.
+# The previous version is kept until the next swap for readers that read
+# the pointer just before it changed.
+
+import os
+import shutil
+import time
+
+POINTER = "CURRENT"
+
+
+def current(path):
+    """Directory of the current version (path itself for the old flat layout)"""
+    try:
+        with open(os.path.join(path, POINTER), 'r', encoding='utf-8') as f:
+            name = f.read().strip()
+    except OSError:
+        return path
+    return os.path.join(path, name) if name else path
+
+
+def new_version(path):
+    """Empty directory for the next version; make it current with publish()"""
+    os.makedirs(path, exist_ok=True)
+    version_path = os.path.join(path, f"v{time.time_ns()}_{os.getpid()}")
+    os.makedirs(version_path)
+    return version_path
+
+
+def publish(path, version_path):
+    """Point CURRENT at version_path, then remove versions older than the previous one"""
+    previous = os.path.basename(current(path)) if os.path.exists(os.path.join(path, POINTER)) else None
+    tmp_path = os.path.join(path, POINTER + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(version_path))
+    os.replace(tmp_path, os.path.join(path, POINTER))
+    
+    keep = {os.path.basename(version_path), previous}
+    for name in os.listdir(path):
+        full_path = os.path.join(path, name)
+        if os.path.isdir(full_path):
+            # Versions named after the previous one may be another writer's, still in progress
+            if name.startswith("v") and name not in keep and (previous is None or name < previous):
+                shutil.rmtree(full_path, ignore_errors=True)
+        elif name != POINTER:
+            # Files of the flat layout used before versions
+            try:
+                os.remove(full_path)
+            except OSError:
+                pass
+
+
+def discard(version_path):
+    """Remove a version that was not published (e.g. after a failed write)"""
+    shutil.rmtree(version_path, ignore_errors=True)
@@ -0,0 +1,102 @@
+# Shared fixtures: src/ on the path, a small deterministic embedder in place
+# of sentence-transformers, and settings that keep every file under tmp_path.
+
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from config import get_config
+
+WORD_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class FakeEmbedder:
+    """Bag-of-words vectors: texts sharing words are close, no model download"""
+    
+    model_name = "fake"
+    max_tokens = 254
+    dim = 64
+    
+    def count_tokens(self, texts):
+        return [len(WORD_PIECE.findall(text)) for text in texts]
+    
+    def encode(self, texts, batch_size=None):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+    
+    def __call__(self, input):
+        return self.encode(input).tolist()
+
+
+@pytest.fixture
+def fake_embedder(monkeypatch):
+    import indexer
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(indexer, "create_embedder", lambda config: embedder)
+    return embedder
+
+
+@pytest.fixture
+def settings(tmp_path, fake_embedder):
+    """Config with the numpy vector store and all paths under tmp_path"""
+    (tmp_path / "pdfs").mkdir()
+    (tmp_path / "json").mkdir()
+    return get_config(overrides=[
+        f'paths.pdf_folder="{tmp_path / "pdfs"}"',
+        f'paths.json_folder="{tmp_path / "json"}"',
+        f'paths.db_path="{tmp_path / "db"}"',
+        f'response_cache.path="{tmp_path / "responses.sqlite"}"',
+        'embedding.vector_backend="numpy"',
+        'parser.use_ocr=false',
+        'parser.extract_tables=false',
+        'ollama.warmup=false'
+    ])
+
+
+def write_pages(json_folder, filename, texts):
+    """Parsed page file for filename with one page per text"""
+    path = Path(json_folder) / filename.replace(".pdf", ".json")
+    pages = [{"page_number": i, "text": text, "extraction_method": "pdfplumber"}
+             for i, text in enumerate(texts, 1)]
+    path.write_text(json.dumps({"filename": filename, "pages": pages}), encoding='utf-8')
+    return path
+
+
+def make_pdf(path, texts):
+    """Minimal PDF with one Helvetica text page per text"""
+    n = len(texts)
+    font_id = 3 + 2 * n
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{kids}] /Count {n} >>".encode()]
+    for i, text in enumerate(texts):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode())
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 11 Tf 50 740 Td ({escaped}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    Path(path).write_bytes(out)
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from api import SearchBatcher
+from async_chatbot import AsyncChatBot
+from conftest import write_pages
+
+
+@pytest.fixture
+def bot(settings):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose.", "Take metformin with meals."])
+    write_pages(json_folder, "b.pdf", ["Warfarin dose follows the INR."])
+    write_pages(json_folder, "c.pdf", ["Lisinopril lowers blood pressure."])
+    bot = AsyncChatBot(settings=settings)
+    bot.indexer.index_documents()
+    yield bot
+    bot.close()
+
+
+def run_with_batcher(bot, body, **batcher_args):
+    """Run body(batcher) on a fresh event loop with a started batcher"""
+    async def main():
+        batcher = SearchBatcher(bot, **batcher_args)
+        batcher.start()
+        try:
+            return await body(batcher)
+        finally:
+            await batcher.stop()
+    return asyncio.run(main())
+
+
+def test_concurrent_searches_share_one_batch(bot, monkeypatch):
+    batches = []
+    search_batch = bot.indexer.search_batch
+    
+    def record(query_embeddings, **kwargs):
+        batches.append(len(query_embeddings))
+        return search_batch(query_embeddings, **kwargs)
+    monkeypatch.setattr(bot.indexer, "search_batch", record)
+    
+    async def body(batcher):
+        return await asyncio.gather(batcher.search("metformin meals", n_results=1),
+                                    batcher.search("warfarin inr", n_results=2),
+                                    batcher.search("glucose", n_results=3))
+    outputs = run_with_batcher(bot, body, max_wait_ms=50)
+    
+    assert batches == [3]
+    assert [len(results["ids"][0]) for results, _, _ in outputs] == [1, 2, 3]
+    assert all(timings["batch_size"] == 3 for _, _, timings in outputs)
+    assert outputs[1][0]["metadatas"][0][0]["filename"] == "b.pdf"
+
+
+def test_repeated_search_is_answered_from_the_cache(bot):
+    async def body(batcher):
+        first, _, _ = await batcher.search("warfarin inr")
+        second, _, timings = await batcher.search("Warfarin  INR")
+        return first, second, timings
+    first, second, timings = run_with_batcher(bot, body)
+    
+    assert timings == {"cached": True}
+    assert second == first
+
+
+def test_failed_batch_fails_its_searches_only(bot, monkeypatch):
+    search_batch = bot.indexer.search_batch
+    calls = []
+    
+    def fail_once(query_embeddings, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("collection unavailable")
+        return search_batch(query_embeddings, **kwargs)
+    monkeypatch.setattr(bot.indexer, "search_batch", fail_once)
+    
+    async def body(batcher):
+        with pytest.raises(RuntimeError, match="collection unavailable"):
+            await batcher.search("warfarin inr")
+        results, _, _ = await batcher.search("warfarin inr")
+        return results
+    results = run_with_batcher(bot, body)
+    
+    assert results["metadatas"][0][0]["filename"] == "b.pdf"
+
+
+def test_stop_fails_waiting_searches_and_finishes_running_batches(bot, monkeypatch):
+    search_batch = bot.indexer.search_batch
+    
+    def slow(query_embeddings, **kwargs):
+        time.sleep(0.2)
+        return search_batch(query_embeddings, **kwargs)
+    monkeypatch.setattr(bot.indexer, "search_batch", slow)
+    
+    async def main():
+        # Stopped while the first search waits for others to join its batch
+        batcher = SearchBatcher(bot, max_wait_ms=1000)
+        batcher.start()
+        waiting = asyncio.create_task(batcher.search("warfarin inr"))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await waiting
+        with pytest.raises(RuntimeError, match="not running"):
+            await batcher.search("glucose")
+        
+        # Stopped while the batch runs: it completes
+        batcher = SearchBatcher(bot, max_wait_ms=1)
+        batcher.start()
+        running = asyncio.create_task(batcher.search("metformin meals"))
+        await asyncio.sleep(0.05)
+        await batcher.stop()
+        results, _, _ = await running
+        return results
+    results = asyncio.run(main())
+    
+    assert results["metadatas"][0][0]["filename"] == "a.pdf"
+
+
+def test_search_rejects_out_of_range_n_results(settings, bot):
+    with TestClient(api.create_app(settings)) as client:
+        assert client.post("/search", json={"query": "dose", "n_results": 0}).status_code == 422
+        too_many = api.MAX_RESULTS + 1
+        assert client.post("/search", json={"query": "dose", "n_results": too_many}).status_code == 422
+        response = client.post("/search", json={"query": "warfarin dose", "n_results": 1})
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 1
+
+
+def test_search_is_rejected_when_the_server_is_full(settings, bot):
+    settings['ollama'].update(max_concurrency=0, max_queue=0)
+    with TestClient(api.create_app(settings)) as client:
+        assert client.post("/search", json={"query": "warfarin dose"}).status_code == 503
@@ -0,0 +1,55 @@
+import cache
+from cache import TTLCache
+from chatbot import ChatBot
+from conftest import write_pages
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = TTLCache(max_size=4, ttl=10)
+    ttl_cache.put("query", [1.0])
+    
+    now[0] += 9
+    assert ttl_cache.get("query") == [1.0]
+    now[0] += 2
+    assert ttl_cache.get("query") is None
+    assert len(ttl_cache) == 0
+    assert ttl_cache.stats()["hits"] == 1
+    assert ttl_cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = TTLCache(max_size=2)
+    ttl_cache.put("a", 1)
+    ttl_cache.put("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.put("c", 3)
+    
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def test_zero_size_cache_stores_nothing():
+    ttl_cache = TTLCache(max_size=0)
+    ttl_cache.put("a", 1)
+    assert ttl_cache.get("a", "missing") == "missing"
+
+
+def test_reindexing_clears_the_query_caches(settings):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose."])
+    bot = ChatBot(settings=settings)
+    bot.indexer.index_documents()
+    
+    first = bot.search("metformin glucose")
+    assert bot.search("Metformin   glucose") is first
+    assert bot.retrieval_cache.stats()["hits"] == 1
+    
+    write_pages(json_folder, "a.pdf", ["Metformin lowers blood glucose in adults."])
+    bot.indexer.index_documents()
+    
+    results = bot.search("metformin glucose")
+    assert results is not first
+    assert results["documents"][0] == ["Metformin lowers blood glucose in adults."]
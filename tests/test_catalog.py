@@ -0,0 +1,96 @@
+import metrics
+from catalog import DocumentCatalog, DocumentProfile, filename_where, find_drugs
+from chatbot import ChatBot
+from conftest import write_pages
+from indexer import EmbeddingIndexer
+
+
+def make_catalog(tmp_path, entries, **settings):
+    catalog = DocumentCatalog(str(tmp_path / "catalog.json"), **settings)
+    catalog.save([{"filename": filename, "drugs": drugs} for filename, drugs in entries.items()])
+    return catalog
+
+
+def test_find_drugs_by_stem_and_by_name():
+    found = find_drugs("Atorvastatin and LISINOPRIL; cholesterol. Warfarin", names={"warfarin"})
+    assert found == {"atorvastatin": 1, "lisinopril": 1, "warfarin": 1}
+
+
+def test_profile_keeps_drugs_mentioned_often_or_in_the_filename():
+    profile = DocumentProfile("metformin_label.pdf", min_mentions=2)
+    profile.add_page({"text": "Metformin Label. Do not combine with lisinopril.",
+                      "extraction_method": "OCR"})
+    profile.add_page({"text": "Atorvastatin twice, atorvastatin.", "extraction_method": "pdfplumber"})
+    profile.add_page({"text": "More atorvastatin.", "extraction_method": "OCR"})
+    
+    entry = profile.entry()
+    assert entry["drugs"] == ["atorvastatin", "metformin"]
+    assert entry["title"] == "Metformin Label."
+    assert entry["pages"] == 3
+    assert entry["extraction_method"] == "OCR"
+
+
+def test_route_narrows_to_documents_about_the_named_drugs(tmp_path):
+    catalog = make_catalog(tmp_path, {"a.pdf": ["metformin"], "b.pdf": ["warfarin"],
+                                      "c.pdf": ["warfarin", "aspirin"]})
+    assert catalog.route("Warfarin dosing in renal failure?") == ["b.pdf", "c.pdf"]
+    assert catalog.route("metformin or aspirin") == ["a.pdf", "c.pdf"]
+    # No cataloged drug named, or every document matches: search everything
+    assert catalog.route("renal dosing") is None
+    assert catalog.route("metformin, warfarin") is None
+
+
+def test_where_clauses(tmp_path):
+    catalog = make_catalog(tmp_path, {"a.pdf": ["metformin"], "b.pdf": ["warfarin"]})
+    assert catalog.where() is None
+    assert catalog.where(filenames=["x.pdf"]) == {"filename": "x.pdf"}
+    assert catalog.where(drugs=["Warfarin"]) == {"filename": "b.pdf"}
+    assert catalog.where(filenames=["a.pdf"], drugs=["warfarin"]) == {"filename": ""}
+    assert filename_where(["b.pdf", "a.pdf", "b.pdf"]) == {"filename": {"$in": ["a.pdf", "b.pdf"]}}
+
+
+def test_settings_key_follows_the_catalog_settings(tmp_path):
+    path = str(tmp_path / "catalog.json")
+    key = DocumentCatalog(path, drug_names=["INR"]).settings_key()
+    assert DocumentCatalog(path, drug_names=["inr"]).settings_key() == key
+    assert DocumentCatalog(path, drug_names=["inr", "cimetidine"]).settings_key() != key
+    assert DocumentCatalog(path, drug_names=["inr"], min_mentions=1).settings_key() != key
+
+
+def test_changed_catalog_settings_rebuild_unchanged_documents(settings):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin Label. Metformin interacts with cimetidine."])
+    
+    def index(**catalog_settings):
+        indexer = EmbeddingIndexer(json_folder=json_folder, db_path=settings['paths']['db_path'],
+                                   config=dict(settings['embedding'], **catalog_settings))
+        indexer.index_documents()
+        return indexer.catalog.load()["a.pdf"]["drugs"]
+    
+    assert index() == ["metformin"]
+    assert index(catalog_drug_names=["cimetidine"], catalog_min_mentions=1) == ["metformin", "cimetidine"]
+    assert index() == ["metformin"]
+
+
+def test_weak_routed_search_falls_back_to_every_document(settings):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "metformin_label.pdf", ["Metformin lowers glucose. Metformin tablets."])
+    write_pages(json_folder, "storage.pdf", ["Store tablets below 25 C away from light."])
+    settings['embedding'].update(route_queries=True, route_max_distance=0.6)
+    bot = ChatBot(settings=settings)
+    bot.indexer.index_documents()
+    
+    def sources(question):
+        trace = metrics.Trace()
+        _, found, _, _, _ = bot.prepare_answer(question, trace=trace)
+        return {source.split(" (")[0] for source in found}, trace.attributes
+    
+    found, attributes = sources("metformin glucose")
+    assert found == {"metformin_label.pdf"}
+    assert attributes["routed_to"] == ["metformin_label.pdf"]
+    assert "route_fallback" not in attributes
+    
+    # Routed to the label, which says nothing about storage
+    found, attributes = sources("metformin storage below 25 C away from light")
+    assert attributes["route_fallback"] is True
+    assert "storage.pdf" in found
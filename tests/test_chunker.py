@@ -0,0 +1,85 @@
+from chunker import Chunker, split_sentences
+
+
+def count_words(texts):
+    return [len(text.split()) for text in texts]
+
+
+def sentence(n, word="word"):
+    """Sentence of n words"""
+    return " ".join([word.capitalize()] + [word] * (n - 2) + ["end."])
+
+
+def test_split_sentences_keeps_abbreviations_together():
+    assert split_sentences("Take it with food, e.g. Breakfast. Then rest! 2 doses?") == [
+        "Take it with food, e.g. Breakfast.", "Then rest!", "2 doses?"]
+    assert split_sentences('He said "stop." Next one.') == ['He said "stop."', "Next one."]
+
+
+def test_chunks_fit_max_tokens_and_overlap_whole_sentences():
+    chunker = Chunker(count_words, max_tokens=20, overlap_tokens=6, min_tokens=0, stitch_pages=False)
+    sentences = [sentence(5, f"s{i}") for i in range(8)]
+    chunks, tail = chunker.chunk_page(chunker.units(" ".join(sentences)), page_num=1)
+    
+    assert tail == []
+    assert all(chunk.tokens <= 20 for chunk in chunks)
+    assert chunks[0].text == " ".join(sentences[:4])
+    # The next chunk opens with the last sentence of the previous one
+    assert chunks[1].text.startswith(sentences[3])
+    assert chunks[-1].text.endswith(sentences[-1])
+
+
+def test_table_is_one_unit_and_never_overlapped():
+    chunker = Chunker(count_words, max_tokens=30, overlap_tokens=10, min_tokens=0, stitch_pages=False)
+    table = "[TABLE]\nDrug | Dose\nMetformin | 500 mg\n[/TABLE]"
+    units = chunker.units(f"{sentence(4)} {table} {sentence(20, 'after')}")
+    
+    assert [unit.table for unit in units] == [False, True, False]
+    assert units[1].text == table
+    chunks, _ = chunker.chunk_page(units, page_num=1)
+    assert chunks[1].text == sentence(20, 'after')
+
+
+def test_oversized_table_is_split_by_row_with_its_header():
+    chunker = Chunker(count_words, max_tokens=12, min_tokens=0, stitch_pages=False)
+    rows = [f"Drug{i} | {i} mg" for i in range(6)]
+    units = chunker.units("[TABLE]\nDrug | Dose\n" + "\n".join(rows) + "\n[/TABLE]")
+    
+    assert len(units) > 1
+    for unit in units:
+        lines = unit.text.splitlines()
+        assert unit.table and unit.tokens <= 12
+        assert lines[:2] == ["[TABLE]", "Drug | Dose"] and lines[-1] == "[/TABLE]"
+    assert [line for unit in units for line in unit.text.splitlines()[2:-1]] == rows
+
+
+def test_oversized_sentence_is_split_on_words():
+    chunker = Chunker(count_words, max_tokens=10, min_tokens=0, stitch_pages=False)
+    units = chunker.units(sentence(25))
+    assert [unit.tokens for unit in units] == [10, 10, 5]
+    assert " ".join(unit.text for unit in units) == sentence(25)
+
+
+def test_unfinished_sentence_is_carried_into_the_next_page():
+    chunker = Chunker(count_words, max_tokens=40, overlap_tokens=0, min_tokens=5)
+    first = chunker.units(f"{sentence(12, 'one')} The dose is")
+    chunks, tail = chunker.chunk_page(first, page_num=1, last_page=False)
+    
+    assert [unit.text for unit in tail] == ["The dose is"]
+    assert chunks[-1].text == sentence(12, 'one')
+    
+    second = chunker.units(f"10 mg daily. {sentence(12, 'two')}")
+    chunks, tail = chunker.chunk_page(second, page_num=2, carry=tail, carry_page=1)
+    assert tail == []
+    assert chunks[0].text.startswith("The dose is 10 mg daily.")
+    assert (chunks[0].page_start, chunks[0].page_end) == (1, 2)
+
+
+def test_short_last_chunk_is_carried_but_not_past_half_a_chunk():
+    chunker = Chunker(count_words, max_tokens=20, overlap_tokens=0, min_tokens=12)
+    units = chunker.units(f"{sentence(18, 'a')} {sentence(18, 'b')} {sentence(5, 'c')}")
+    assert chunker.tail_length(units) == 1
+    
+    # 11 tokens is short of min_tokens but more than half of max_tokens
+    units = chunker.units(f"{sentence(18, 'a')} {sentence(11, 'b')}")
+    assert chunker.tail_length(units) == 0
@@ -0,0 +1,28 @@
+from context_builder import ContextBuilder, merge_overlap
+
+
+def test_merge_overlap_drops_the_repeated_words():
+    assert merge_overlap("take one tablet daily", "tablet daily with food", 50) == \
+        "take one tablet daily with food"
+    assert merge_overlap("take one tablet", "with food", 50) == "take one tablet ... with food"
+
+
+def test_merge_overlap_window_is_measured_in_tokens():
+    first = " ".join(f"word{i}" for i in range(100))
+    second = " ".join(f"word{i}" for i in range(60, 120))
+    # 40 repeated words of ~2 estimated tokens each: past a 50-token overlap, within 100
+    assert len(merge_overlap(first, second, 50).split()) == 161
+    assert merge_overlap(first, second, 100) == " ".join(f"word{i}" for i in range(120))
+
+
+def test_neighbouring_chunks_of_a_page_are_merged():
+    results = {
+        "documents": [["tablet daily with food", "take one tablet daily", "warfarin dose"]],
+        "metadatas": [[{"filename": "a.pdf", "page": 2, "chunk": 1},
+                       {"filename": "a.pdf", "page": 2, "chunk": 0},
+                       {"filename": "b.pdf", "page": 1, "chunk": 0}]]
+    }
+    context, sources, stats = ContextBuilder(chunk_overlap=8).build(results)
+    assert context == "take one tablet daily with food\n\nwarfarin dose"
+    assert sources == ["a.pdf (Page 2)", "b.pdf (Page 1)"]
+    assert stats["sections"] == 2
@@ -0,0 +1,89 @@
+from conftest import write_pages
+from indexer import EmbeddingIndexer
+
+
+def make_indexer(settings):
+    # Without stitching every short page is one chunk of its own
+    return EmbeddingIndexer(json_folder=settings['paths']['json_folder'],
+                            db_path=settings['paths']['db_path'],
+                            config=dict(settings['embedding'], stitch_pages=False))
+
+
+def filenames_in(indexer):
+    return {metadata["filename"] for metadata in indexer.collection.get()["metadatas"]}
+
+
+def count_encoded(monkeypatch, embedder):
+    """List that collects every text embedded from now on"""
+    encoded = []
+    original = embedder.encode
+    
+    def encode(texts, batch_size=None):
+        encoded.extend(texts)
+        return original(texts, batch_size)
+    monkeypatch.setattr(embedder, "encode", encode)
+    return encoded
+
+
+def test_unchanged_documents_are_not_embedded_again(settings, fake_embedder, monkeypatch):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose.", "Take it with meals."])
+    write_pages(json_folder, "b.pdf", ["Warfarin dose follows the INR."])
+    indexer = make_indexer(settings)
+    indexer.index_documents()
+    count = indexer.collection.count()
+    
+    indexer = make_indexer(settings)
+    encoded = count_encoded(monkeypatch, fake_embedder)
+    indexer.index_documents()
+    
+    assert encoded == []
+    assert indexer.collection.count() == count
+
+
+def test_only_changed_pages_are_embedded(settings, fake_embedder, monkeypatch):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose.", "Take it with meals."])
+    make_indexer(settings).index_documents()
+    
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose.", "Take it with breakfast and dinner."])
+    indexer = make_indexer(settings)
+    encoded = count_encoded(monkeypatch, fake_embedder)
+    indexer.index_documents()
+    
+    assert encoded == ["Take it with breakfast and dinner."]
+    documents = indexer.collection.get()["documents"]
+    assert "Take it with meals." not in documents
+    assert "Take it with breakfast and dinner." in documents
+
+
+def test_added_and_removed_documents(settings, fake_embedder):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose."])
+    indexer = make_indexer(settings)
+    indexer.index_documents()
+    assert filenames_in(indexer) == {"a.pdf"}
+    
+    removed = write_pages(json_folder, "b.pdf", ["Warfarin dose follows the INR."])
+    indexer = make_indexer(settings)
+    indexer.index_documents()
+    assert filenames_in(indexer) == {"a.pdf", "b.pdf"}
+    
+    removed.unlink()
+    indexer = make_indexer(settings)
+    indexer.index_documents()
+    assert filenames_in(indexer) == {"a.pdf"}
+    assert [chunk_id for chunk_id, _ in indexer.lexical_index.search("warfarin")] == []
+    assert set(indexer.catalog.load()) == {"a.pdf"}
+
+
+def test_full_rebuild_matches_incremental_index(settings, fake_embedder):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose.", "Take it with meals."])
+    indexer = make_indexer(settings)
+    indexer.index_documents()
+    incremental = sorted(indexer.collection.get()["ids"])
+    
+    indexer = make_indexer(settings)
+    indexer.index_documents(full_rebuild=True)
+    assert sorted(indexer.collection.get()["ids"]) == incremental
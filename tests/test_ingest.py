@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+import pdf_parser
+from conftest import make_pdf
+from ingest import IngestPipeline
+
+
+@pytest.fixture
+def pdf_folder(settings):
+    folder = settings['paths']['pdf_folder']
+    make_pdf(os.path.join(folder, "a.pdf"), [f"Metformin dose {i} mg daily with meals." for i in range(1, 6)])
+    make_pdf(os.path.join(folder, "b.pdf"), ["Warfarin 5 mg daily.", "Check the INR weekly."])
+    return folder
+
+
+def make_pipeline(settings, **ingest):
+    settings['parser']['shard_pages'] = 2
+    settings['ingest'].update(ingest)
+    return IngestPipeline(settings)
+
+
+def parsed_files(monkeypatch):
+    """List that collects the PDFs each run sends to the parser"""
+    parsed = []
+    plan_shards = pdf_parser.AdvancedPDFParser.plan_shards
+    
+    # Patched on the class: the parser instance itself is pickled to the parser processes
+    def record(self, pdf_files, shard_pages):
+        parsed.extend(pdf_file.name for pdf_file in pdf_files)
+        return plan_shards(self, pdf_files, shard_pages)
+    monkeypatch.setattr(pdf_parser.AdvancedPDFParser, "plan_shards", record)
+    return parsed
+
+
+def indexed_files(pipeline):
+    return {metadata["filename"] for metadata in pipeline.indexer.collection.get()["metadatas"]}
+
+
+def test_unchanged_pdfs_are_not_parsed_again(settings, pdf_folder, monkeypatch):
+    pipeline = make_pipeline(settings)
+    assert pipeline.run(workers=1) == {}
+    assert indexed_files(pipeline) == {"a.pdf", "b.pdf"}
+    
+    parsed = parsed_files(monkeypatch)
+    assert pipeline.run(workers=1) == {}
+    assert parsed == []
+    
+    make_pdf(os.path.join(pdf_folder, "c.pdf"), ["Lisinopril 10 mg once daily."])
+    assert pipeline.run(workers=1) == {}
+    assert parsed == ["c.pdf"]
+    assert indexed_files(pipeline) == {"a.pdf", "b.pdf", "c.pdf"}
+
+
+def test_deleted_pdfs_are_removed(settings, pdf_folder):
+    pipeline = make_pipeline(settings)
+    pipeline.run(workers=1)
+    json_folder = settings['paths']['json_folder']
+    assert len(os.listdir(json_folder)) == 2
+    
+    os.remove(os.path.join(pdf_folder, "b.pdf"))
+    pipeline.run(workers=1)
+    
+    assert indexed_files(pipeline) == {"a.pdf"}
+    assert set(pipeline.indexer.catalog.load()) == {"a.pdf"}
+    assert len(os.listdir(json_folder)) == 1
+    # indexer.py does not bring it back from a leftover page file
+    pipeline.indexer.index_documents()
+    assert indexed_files(pipeline) == {"a.pdf"}
+
+
+def test_parse_error_skips_only_that_pdf(settings, pdf_folder, monkeypatch):
+    parse_shard = pdf_parser.AdvancedPDFParser.parse_shard
+    
+    def failing_shard(self, pdf_file, first_page, last_page, ocr_workers=None):
+        if pdf_file.name == "a.pdf" and first_page == 3:
+            raise RuntimeError("corrupt page")
+        return parse_shard(self, pdf_file, first_page, last_page, ocr_workers)
+    # Parser processes look the method up by name
+    failing_shard.__name__ = failing_shard.__qualname__ = "parse_shard"
+    monkeypatch.setattr(pdf_parser.AdvancedPDFParser, "parse_shard", failing_shard)
+    
+    pipeline = make_pipeline(settings)
+    errors = pipeline.run(workers=1)
+    
+    assert list(errors) == ["a.pdf"]
+    assert "pages 3-4: corrupt page" in errors["a.pdf"][0]
+    assert indexed_files(pipeline) == {"b.pdf"}
+    assert len(os.listdir(settings['paths']['json_folder'])) == 1
+    
+    monkeypatch.setattr(pdf_parser.AdvancedPDFParser, "parse_shard", parse_shard)
+    assert pipeline.run(workers=1) == {}
+    assert indexed_files(pipeline) == {"a.pdf", "b.pdf"}
+
+
+def test_indexing_error_is_reported_and_retried(settings, pdf_folder, monkeypatch):
+    pipeline = make_pipeline(settings)
+    # Flush every chunk as it comes so the failure hits the first file's own chunks
+    pipeline.indexer.flush_size = 1
+    flush = pipeline.indexer._flush
+    calls = []
+    
+    def fail_once(ids, documents, metadatas):
+        calls.append(ids)
+        if len(calls) == 1:
+            raise RuntimeError("collection unavailable")
+        return flush(ids, documents, metadatas)
+    monkeypatch.setattr(pipeline.indexer, "_flush", fail_once)
+    
+    errors = pipeline.run(workers=1)
+    
+    assert errors == {"a.pdf": ["indexing: collection unavailable"]}
+    assert set(pipeline.indexer.catalog.load()) == {"b.pdf"}
+    
+    # The failed PDF got no manifest entry, so the next run ingests it again
+    parsed = parsed_files(monkeypatch)
+    assert pipeline.run(workers=1) == {}
+    assert parsed == ["a.pdf"]
+    assert indexed_files(pipeline) == {"a.pdf", "b.pdf"}
+    assert set(pipeline.indexer.catalog.load()) == {"a.pdf", "b.pdf"}
+
+
+def test_documents_ingested_without_page_files_are_kept(settings, pdf_folder):
+    pipeline = make_pipeline(settings, save_pages=False)
+    assert pipeline.run(workers=1) == {}
+    assert os.listdir(settings['paths']['json_folder']) == []
+    
+    pipeline.indexer.index_documents()
+    assert indexed_files(pipeline) == {"a.pdf", "b.pdf"}
@@ -0,0 +1,81 @@
+import os
+
+from lexical_index import BM25Index, tokenize
+
+
+def chunks_of(documents):
+    """read_chunks over {filename: [text, ...]} that records what it read"""
+    read = []
+    
+    def read_chunks(filename):
+        read.append(filename)
+        return [(f"{filename}::c{i}", text) for i, text in enumerate(documents[filename])]
+    return read_chunks, read
+
+
+def ids(hits):
+    return [chunk_id for chunk_id, _ in hits]
+
+
+def test_tokenize_keeps_compounds_and_their_parts():
+    assert tokenize("0.5 mg/kg") == ["0.5", "0", "5", "mg/kg", "mg", "kg"]
+    assert tokenize("Take 5-FU") == ["take", "5-fu", "5", "fu"]
+
+
+def test_search_ranks_the_matching_chunks(tmp_path):
+    documents = {"a.pdf": ["metformin lowers glucose", "take with meals"],
+                 "b.pdf": ["warfarin dose follows the inr"]}
+    index = BM25Index(str(tmp_path))
+    read_chunks, _ = chunks_of(documents)
+    n_chunks, _, n_read = index.update(set(documents), documents, read_chunks)
+    assert (n_chunks, n_read) == (3, 2)
+    
+    assert ids(index.search("warfarin inr")) == ["b.pdf::c0"]
+    assert set(ids(index.search("glucose meals"))) == {"a.pdf::c0", "a.pdf::c1"}
+    assert index.search("aspirin") == []
+
+
+def test_update_rereads_changed_documents_only(tmp_path):
+    documents = {"a.pdf": ["metformin lowers glucose"], "b.pdf": ["warfarin dose"]}
+    index = BM25Index(str(tmp_path))
+    index.update(set(documents), documents, chunks_of(documents)[0])
+    
+    documents["b.pdf"] = ["warfarin dose follows the inr"]
+    read_chunks, read = chunks_of(documents)
+    index.update({"b.pdf"}, documents, read_chunks)
+    
+    assert read == ["b.pdf"]
+    assert ids(index.search("inr")) == ["b.pdf::c0"]
+    assert ids(index.search("metformin")) == ["a.pdf::c0"]
+
+
+def test_removed_documents_leave_the_index(tmp_path):
+    documents = {"a.pdf": ["metformin lowers glucose"], "b.pdf": ["warfarin dose"]}
+    index = BM25Index(str(tmp_path))
+    index.update(set(documents), documents, chunks_of(documents)[0])
+    # A reader that loaded the index before the update
+    reader = BM25Index(str(tmp_path))
+    assert ids(reader.search("warfarin")) == ["b.pdf::c0"]
+    
+    del documents["b.pdf"]
+    read_chunks, read = chunks_of(documents)
+    index.update(set(), documents, read_chunks)
+    
+    assert read == []
+    assert index.search("warfarin") == []
+    assert reader.search("warfarin") == []
+    assert len(os.listdir(index.segment_path)) == 1
+
+
+def test_segments_of_an_older_format_are_rebuilt(tmp_path):
+    old_segments = tmp_path / "segments_v1"
+    old_segments.mkdir()
+    (old_segments / "stale.npz").write_bytes(b"")
+    documents = {"a.pdf": ["metformin lowers glucose"]}
+    index = BM25Index(str(tmp_path))
+    read_chunks, read = chunks_of(documents)
+    index.update(set(), documents, read_chunks)
+    
+    assert read == ["a.pdf"]
+    assert not old_segments.exists()
+    assert ids(index.search("metformin")) == ["a.pdf::c0"]
@@ -0,0 +1,59 @@
+import re
+
+import pytest
+
+from pdf_parser import AdvancedPDFParser
+
+
+@pytest.fixture
+def parser(tmp_path):
+    return AdvancedPDFParser(pdf_folder=str(tmp_path), json_folder=str(tmp_path / "json"), config={})
+
+
+def legacy_clean_text(text):
+    """clean_text before the single-pass rewrite, without its 0 -> O and | -> I
+    replacements (now only made next to letters) and with spaces collapsed"""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[|]{2,}', '', text)
+    text = re.sub(r'_{3,}', '', text)
+    text = re.sub(r'-{3,}', '', text)
+    text = re.sub(r'\s+[^a-zA-Z0-9\s]+\s+', ' ', text)
+    text = re.sub(r'\bPage\s+\d+\b', '', text, flags=re.IGNORECASE)
+    return " ".join(text.split())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", ""),
+    ("Take  two\n\ttablets ", "Take two tablets"),
+    ("Take • two tablets", "Take two tablets"),
+    ("x ---y", "x y"),
+    ("a |||b", "a b"),
+    ("x --- y", "x y"),
+    ("x ___ y", "x y"),
+    ("word--- end", "word end"),
+    ("||| start", "start"),
+    ("Take 10 mg. Page 12 Next", "Take 10 mg. Next"),
+    ("PAGE 3 of the label", "of the label"),
+    ("the d0se |n adults", "the dOse In adults"),
+    ("wa|k", "waIk"),
+    # Doses, NDC codes and table separators are not OCR mistakes
+    ("Take 0.5 mg/kg or 10 mg (NDC 0002-3227-30).", "Take 0.5 mg/kg or 10 mg (NDC 0002-3227-30)."),
+    ("10 mg | q12h | PO", "10 mg | q12h | PO"),
+])
+def test_clean_text(parser, text, expected):
+    assert parser.clean_text(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "Store at 20 to 25 C; excursions permitted. ___________ Page 12",
+    "||  ----- ~ Contraindications: known hypersensitivity.",
+    "Adverse reactions (>= 10%): nausea, headache, dizziness.",
+    "Do not exceed 100 mcg per day.\n\n  * Page 4 *",
+])
+def test_clean_text_matches_the_previous_implementation(parser, text):
+    assert parser.clean_text(text) == legacy_clean_text(text)
+
+
+def test_table_rows_stay_on_their_own_lines(parser):
+    text = "Dosing  table\n[TABLE]\nDrug | Dose\nMetformin   | 500 mg\n\n[/TABLE]\nAfter ---"
+    assert parser.clean_text(text) == "Dosing table\n[TABLE]\nDrug | Dose\nMetformin | 500 mg\n[/TABLE]\nAfter"
@@ -0,0 +1,84 @@
+import metrics
+from chatbot import ChatBot
+from conftest import write_pages
+from response_cache import SemanticResponseCache
+
+
+def results_for(*chunks):
+    """Chroma-shaped results for (chunk_id, content_hash) pairs"""
+    return {"ids": [[chunk_id for chunk_id, _ in chunks]],
+            "metadatas": [[{"content_hash": content_hash} for _, content_hash in chunks]]}
+
+
+def test_context_key_changes_with_chunks_model_and_settings():
+    results = results_for(("a::p1::c0", "h1"), ("a::p2::c0", "h2"))
+    key = SemanticResponseCache.context_key(results, "llama", {"temperature": 0.7})
+    
+    reordered = results_for(("a::p2::c0", "h2"), ("a::p1::c0", "h1"))
+    assert SemanticResponseCache.context_key(reordered, "llama", {"temperature": 0.7}) == key
+    
+    edited = results_for(("a::p1::c0", "h1"), ("a::p2::c0", "h3"))
+    assert SemanticResponseCache.context_key(edited, "llama", {"temperature": 0.7}) != key
+    assert SemanticResponseCache.context_key(results, "mistral", {"temperature": 0.7}) != key
+    assert SemanticResponseCache.context_key(results, "llama", {"temperature": 0.2}) != key
+
+
+def test_lookup_needs_a_similar_query_and_the_same_context(tmp_path):
+    response_cache = SemanticResponseCache(str(tmp_path / "responses.sqlite"), threshold=0.9)
+    response_cache.store("dose?", [1.0, 0.0], "key", "10 mg", ["a.pdf (Page 1)"])
+    
+    assert response_cache.lookup([0.99, 0.05], "key") == ("10 mg", ["a.pdf (Page 1)"])
+    assert response_cache.lookup([0.0, 1.0], "key") is None
+    assert response_cache.lookup([1.0, 0.0], "other key") is None
+    assert response_cache.stats()["hits"] == 1
+    
+    # Answers outlive the process
+    reopened = SemanticResponseCache(str(tmp_path / "responses.sqlite"), threshold=0.9)
+    assert reopened.lookup([1.0, 0.0], "key") == ("10 mg", ["a.pdf (Page 1)"])
+
+
+def test_least_recently_used_answers_are_evicted(tmp_path):
+    response_cache = SemanticResponseCache(str(tmp_path / "responses.sqlite"), max_entries=2)
+    response_cache.store("q1", [1.0, 0.0], "k1", "a1", [])
+    response_cache.store("q2", [1.0, 0.0], "k2", "a2", [])
+    response_cache.lookup([1.0, 0.0], "k1")
+    response_cache.store("q3", [1.0, 0.0], "k3", "a3", [])
+    
+    assert response_cache.lookup([1.0, 0.0], "k2") is None
+    assert response_cache.lookup([1.0, 0.0], "k1") == ("a1", [])
+    assert response_cache.stats()["size"] == 2
+
+
+class FakeOllama:
+    def __init__(self):
+        self.calls = 0
+    
+    def chat(self, model, messages, options=None, keep_alive=None):
+        self.calls += 1
+        return {"message": {"content": f"answer {self.calls}"}}
+
+
+def answer(bot, question):
+    trace = metrics.Trace()
+    text, _ = bot.generate_response(question, trace=trace)
+    return text, trace.attributes.get("cached")
+
+
+def test_answers_are_not_reused_across_edits_or_settings(settings):
+    json_folder = settings['paths']['json_folder']
+    write_pages(json_folder, "a.pdf", ["Metformin lowers glucose."])
+    bot = ChatBot(settings=settings)
+    bot.client = FakeOllama()
+    bot.indexer.index_documents()
+    
+    assert answer(bot, "metformin glucose") == ("answer 1", None)
+    assert answer(bot, "metformin glucose") == ("answer 1", "response")
+    
+    bot.temperature = 0.1
+    assert answer(bot, "metformin glucose") == ("answer 2", None)
+    bot.SYSTEM_PROMPT = "Answer in one sentence."
+    assert answer(bot, "metformin glucose") == ("answer 3", None)
+    
+    write_pages(json_folder, "a.pdf", ["Metformin lowers blood glucose in adults."])
+    bot.indexer.index_documents()
+    assert answer(bot, "metformin glucose") == ("answer 4", None)
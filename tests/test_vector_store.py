@@ -0,0 +1,119 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+import vector_store
+import versioned_dir
+from vector_store import VectorStore
+
+
+def rows(n, filename="a.pdf", first=0):
+    """ids, embeddings, documents, metadatas of n chunks of one file"""
+    ids = [f"{filename}::p{i}::c0" for i in range(first, first + n)]
+    embeddings = np.eye(8, dtype=np.float32)[[i % 8 for i in range(first, first + n)]]
+    documents = [f"{filename} page {i}" for i in range(first, first + n)]
+    metadatas = [{"filename": filename, "page": i, "score": i / 2} for i in range(first, first + n)]
+    return ids, embeddings, documents, metadatas
+
+
+def segment_count(path):
+    with open(os.path.join(versioned_dir.current(path), "meta.json"), encoding='utf-8') as f:
+        return len(json.load(f)["segments"])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = VectorStore(str(tmp_path / "vectors"))
+    store.upsert(*rows(4, "a.pdf"))
+    store.upsert(*rows(3, "b.pdf", first=4))
+    store.persist()
+    return store
+
+
+@pytest.mark.parametrize("where, expected", [
+    ({"filename": "b.pdf"}, {4, 5, 6}),
+    ({"filename": {"$ne": "b.pdf"}}, {0, 1, 2, 3}),
+    ({"filename": {"$in": ["a.pdf", "c.pdf"]}}, {0, 1, 2, 3}),
+    ({"filename": {"$nin": ["a.pdf"]}}, {4, 5, 6}),
+    ({"page": {"$gte": 2, "$lt": 5}}, {2, 3, 4}),
+    ({"score": {"$gt": 2.5}}, {6}),
+    ({"$and": [{"filename": "a.pdf"}, {"page": {"$gt": 1}}]}, {2, 3}),
+    ({"$or": [{"page": 0}, {"filename": "b.pdf"}]}, {0, 4, 5, 6}),
+    ({"filename": ""}, set()),
+])
+def test_where_filters(store, where, expected):
+    assert {m["page"] for m in store.get(where=where)["metadatas"]} == expected
+    hits = store.query(query_embeddings=[np.ones(8)], n_results=10, where=where)
+    assert {m["page"] for m in hits["metadatas"][0]} == expected
+
+
+def test_unsupported_operator_is_rejected(store):
+    with pytest.raises(ValueError, match="\\$regex"):
+        store.get(where={"filename": {"$regex": "a"}})
+
+
+def test_query_returns_nearest_rows_with_cosine_distances(store):
+    query = np.zeros(8)
+    query[5] = 2.0
+    hits = store.query(query_embeddings=[query], n_results=2)
+    assert hits["ids"][0][0] == "b.pdf::p5::c0"
+    assert hits["distances"][0][0] == pytest.approx(0.0, abs=1e-3)
+    assert hits["distances"][0][1] == pytest.approx(1.0, abs=1e-3)
+    assert hits["documents"][0][0] == "b.pdf page 5"
+
+
+def test_get_by_ids_with_a_filter(store):
+    found = store.get(ids=["a.pdf::p1::c0", "b.pdf::p4::c0", "missing"], where={"filename": "b.pdf"})
+    assert found["ids"] == ["b.pdf::p4::c0"]
+
+
+def test_changes_survive_a_reload(store):
+    store.delete(where={"filename": "a.pdf", "page": {"$lt": 2}})
+    ids, embeddings, _, metadatas = rows(1, "b.pdf", first=4)
+    store.upsert(ids, embeddings, ["rewritten"], metadatas)
+    assert store.count() == 5
+    
+    # Unpersisted changes are not visible to other readers
+    assert VectorStore(store.path).count() == 7
+    store.persist()
+    
+    reloaded = VectorStore(store.path)
+    assert reloaded.count() == 5
+    assert reloaded.get(ids=["b.pdf::p4::c0"])["documents"] == ["rewritten"]
+    assert reloaded.get(ids=["a.pdf::p0::c0"])["ids"] == []
+    assert reloaded.get(ids=["a.pdf::p2::c0"], include=("embeddings",))["embeddings"][0][2] == 1.0
+
+
+def test_persist_appends_segments_until_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "MAX_SEGMENTS", 3)
+    store = VectorStore(str(tmp_path / "vectors"))
+    for batch in range(3):
+        store.upsert(*rows(10, f"{batch}.pdf", first=10 * batch))
+        store.persist()
+        assert segment_count(store.path) == batch + 1
+    
+    # A fourth segment merges everything into one
+    store.upsert(*rows(10, "3.pdf", first=30))
+    store.persist()
+    assert segment_count(store.path) == 1
+    assert VectorStore(store.path).count() == 40
+    # The merged segment plus those of the previous version, for its readers
+    assert len(os.listdir(os.path.join(store.path, "segments"))) == 4
+
+
+def test_many_deletions_compact_the_store(store):
+    store.delete(ids=[f"a.pdf::p{i}::c0" for i in range(3)])
+    store.persist()
+    assert segment_count(store.path) == 1
+    assert sorted(VectorStore(store.path).get()["ids"]) == [
+        "a.pdf::p3::c0", "b.pdf::p4::c0", "b.pdf::p5::c0", "b.pdf::p6::c0"]
+
+
+def test_reset_empties_the_store(store):
+    store.reset()
+    assert store.count() == 0
+    store.persist()
+    assert VectorStore(store.path).count() == 0
+    assert VectorStore(store.path).query(query_embeddings=[np.ones(8)])["ids"] == [[]]